@@ -1,11 +1,32 @@
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, Group
 from django.db.models.fields.files import ImageField
 import pyotp
 import phonenumbers
 
+PRO_GROUP_NAME = "pro"
+
+_pro_group_id = None
+
+
+def bootstrap_pro_group(using="default"):
+    """ Create the pro Group if needed and cache its id for this process.
+        Runs once after migrate instead of on every new DB connection.
+    """
+    global _pro_group_id
+    pro_group, created = Group.objects.using(using).get_or_create(name=PRO_GROUP_NAME)
+    _pro_group_id = pro_group.id
+    return _pro_group_id
+
+
+def get_pro_group_id():
+    if _pro_group_id is None:
+        return bootstrap_pro_group()
+    return _pro_group_id
+
+
 class CustomUser(AbstractUser):
     email = models.EmailField(_('email address'))
     phone = models.CharField(max_length=255, unique=True)
@@ -14,6 +35,12 @@ class CustomUser(AbstractUser):
     sms_key = models.CharField(max_length=100, blank=True)
     REQUIRED_FIELDS = ['phone', 'email']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(fields=['sms_key'], name='user_sms_key_idx',
+                         condition=~models.Q(sms_key='')),
+        ]
+
     def clean(self):
         super().clean()
         try:
@@ -29,7 +56,7 @@ class CustomUser(AbstractUser):
         super().save(*args, **kwargs)
 
     def is_pro(self):
-        return self.groups.filter(name="pro").exists()
+        return self.groups.filter(id=get_pro_group_id()).exists()
 
     def __str__(self):
         return self.email
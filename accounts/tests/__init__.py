@@ -1 +1,2 @@
+from .groups import *
 from .login import *
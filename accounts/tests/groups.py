@@ -0,0 +1,23 @@
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.db.backends.signals import connection_created
+from rest_framework.test import APITransactionTestCase
+
+from accounts.models import PRO_GROUP_NAME, get_pro_group_id
+from .factories import CustomUserFactory
+
+
+class ProGroupTests(APITransactionTestCase):
+    def test_pro_group_is_bootstrapped(self):
+        self.assertEqual(Group.objects.get(name=PRO_GROUP_NAME).id, get_pro_group_id())
+
+    def test_is_pro(self):
+        user = CustomUserFactory.create()
+        self.assertFalse(user.is_pro())
+
+        user.groups.add(get_pro_group_id())
+        self.assertTrue(user.is_pro())
+
+    def test_connection_created_does_no_queries(self):
+        with self.assertNumQueries(0):
+            connection_created.send(sender=connection.__class__, connection=connection)
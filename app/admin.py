@@ -16,12 +16,14 @@ from app.models import (
     ProBusiness,
     SupplyHouse,
     MaterialList,
+    SlackMessage,
+    StoredObject,
+    UploadSession,
 )
 
 admin.site.site_header = 'HomeBreeze Administration'
 admin.site.register(Address, SimpleHistoryAdmin)
 admin.site.register(Customer, SimpleHistoryAdmin)
-admin.site.register(CustomerPhoto, SimpleHistoryAdmin)
 admin.site.register(ProBusiness, SimpleHistoryAdmin)
 admin.site.register(SupplyHouse, SimpleHistoryAdmin)
 admin.site.register(Pro, SimpleHistoryAdmin)
@@ -29,19 +31,55 @@ admin.site.register(JobIssue, SimpleHistoryAdmin)
 admin.site.register(JobNote, SimpleHistoryAdmin)
 
 
+class CustomerPhotoAdmin(SimpleHistoryAdmin):
+    list_display = ('id', 'customer', 'thumbnail', 'variants_status')
+    list_filter = ('variants_status',)
+    readonly_fields = ('thumbnail', 'variants', 'variants_status', 'variants_attempts')
+
+
+admin.site.register(CustomerPhoto, CustomerPhotoAdmin)
+
+
 class JobPhotoInline(admin.TabularInline):
     model = JobPhoto
     extra = 1
-    readonly_fields = ('thumbnail',)
+    readonly_fields = ('thumbnail', 'variants_status')
+    exclude = ('variants', 'variants_attempts')
 
 
 class JobAdmin(admin.ModelAdmin):
     inlines = [
         JobPhotoInline
     ]
+    readonly_fields = ('completed_at', 'stage', 'flags')
+    list_filter = ('stage',)
 
 
 admin.site.register(Job, JobAdmin)
 admin.site.register(JobType, SimpleHistoryAdmin)
 admin.site.register(Appointment, SimpleHistoryAdmin)
 admin.site.register(MaterialList, SimpleHistoryAdmin)
+
+
+class SlackMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'channel', 'status', 'attempts', 'created_at', 'sent_at')
+    list_filter = ('status', 'channel')
+
+
+admin.site.register(SlackMessage, SlackMessageAdmin)
+
+
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'owner', 'target', 'object_id', 'size', 'status', 'created_at')
+    list_filter = ('status', 'target')
+
+
+admin.site.register(UploadSession, UploadSessionAdmin)
+
+
+class StoredObjectAdmin(admin.ModelAdmin):
+    list_display = ('name', 'size', 'refcount', 'created_at')
+    search_fields = ('name', 'sha256')
+
+
+admin.site.register(StoredObject, StoredObjectAdmin)
@@ -1,6 +1,8 @@
 from django.apps import AppConfig
 import analytics
 from django.conf import settings
+from django.core.signals import request_finished, request_started
+from django.db.models.signals import post_migrate
 
 
 class AppConfig(AppConfig):
@@ -8,3 +10,13 @@ class AppConfig(AppConfig):
 
     def ready(self):
         analytics.write_key = settings.SEGMENT_WRITE_KEY
+
+        from app.signals import on_post_migrate
+        post_migrate.connect(on_post_migrate, sender=self,
+                             dispatch_uid="bootstrap_pro_group")
+
+        from backend.db.health import check_connections, mark_connections_idle
+        request_started.connect(check_connections,
+                                dispatch_uid="check_db_connections")
+        request_finished.connect(mark_connections_idle,
+                                 dispatch_uid="mark_db_connections_idle")
@@ -0,0 +1,151 @@
+import hashlib
+import os
+from typing import Iterable
+
+from django.db import connection, models, transaction
+from django.db.models import F
+
+
+def content_hash(content) -> str:
+    """ sha256 of a file, taken from the upload handler when it hashed the
+        file while streaming, else read in chunks.
+    """
+    digest = getattr(content, 'sha256', None)
+    if digest is not None:
+        return digest
+
+    sha256 = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks() if hasattr(content, 'chunks') else iter(lambda: content.read(65536), b''):
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+def content_name(directory: str, digest: str, filename: str) -> str:
+    _, extension = os.path.splitext(filename)
+    return f'{directory}/{digest}{extension.lower()}'
+
+
+def lock_name(name: str) -> None:
+    """ Serialize acquire() and the deferred delete of release() on a
+        stored name until the current transaction ends.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))', [name])
+
+
+def acquire(storage, directory: str, content, filename: str) -> str:
+    """ Store `content` under its content address in `directory` unless an
+        identical file is already there, and take a reference on it.
+
+    Returns:
+        the stored name
+    """
+    from app.models import StoredObject
+
+    digest = content_hash(content)
+    name = content_name(directory, digest, filename)
+    with transaction.atomic():
+        lock_name(name)
+        stored, created = StoredObject.objects.select_for_update().get_or_create(
+            name=name, defaults={'sha256': digest, 'size': content.size})
+        # A file left behind by a rolled back upload is the same content
+        if created and not storage.exists(name):
+            content.seek(0)
+            saved = storage.save(name, content)
+            if saved != name:
+                raise ValueError(f'Storage saved {name} as {saved}.')
+        StoredObject.objects.filter(pk=stored.pk).update(refcount=F('refcount') + 1)
+    return name
+
+
+def release(storage, name: str, extra_names: Iterable[str] = ()) -> None:
+    """ Drop a reference on a stored file, deleting it and `extra_names`
+        once the last reference is gone and the transaction commits. Files
+        stored before content addressing are left alone.
+    """
+    from app.models import StoredObject
+
+    with transaction.atomic():
+        stored = StoredObject.objects.select_for_update().filter(name=name).first()
+        if stored is None:
+            return
+        if stored.refcount > 1:
+            StoredObject.objects.filter(pk=stored.pk).update(refcount=F('refcount') - 1)
+            return
+        stored.delete()
+
+    def delete_files():
+        # An acquire between this commit and now found the file in storage
+        # and kept it rather than writing it again. The lock keeps one from
+        # starting until the files are gone
+        with transaction.atomic():
+            lock_name(name)
+            if StoredObject.objects.filter(name=name).exists():
+                return
+            for file_name in [name, *extra_names]:
+                storage.delete(file_name)
+    transaction.on_commit(delete_files)
+
+
+class ContentAddressedImageField(models.ImageField):
+    """ ImageField storing each file as <directory>/<sha256><extension>,
+        where directory is the one `upload_to` picks. Identical images in
+        the same directory share one stored object.
+    """
+
+    def pre_save(self, model_instance, add):
+        file = getattr(model_instance, self.attname)
+        if file and not file._committed:
+            directory = os.path.dirname(self.generate_filename(model_instance, file.name))
+            file.name = acquire(file.storage, directory, file.file, file.name)
+            file._committed = True
+        return file
+
+
+def dedupe_photo(photo) -> int:
+    """ Move a photo stored before content addressing to its content
+        address, sharing the stored object of an identical photo in the
+        same directory. The old file and its variants are deleted once
+        the transaction commits, the variants are reused from an identical
+        photo or generated again.
+
+    Returns:
+        bytes freed, the size of the photo when it was a duplicate, 0 when
+        it was replaced in the meantime
+    """
+    from app.models import StoredObject
+
+    field_file = photo.photo
+    storage = field_file.storage
+    old_name, old_variants = field_file.name, list(photo.variants.values())
+
+    with storage.open(old_name, 'rb') as file:
+        file.sha256 = content_hash(file)
+        name = content_name(os.path.dirname(old_name), file.sha256, old_name)
+
+        with transaction.atomic():
+            # The photo may have been replaced since it was read
+            if not type(photo).objects.select_for_update().filter(pk=photo.pk, photo=old_name).exists():
+                return 0
+            freed = file.size if StoredObject.objects.filter(name=name).exists() else 0
+            acquire(storage, os.path.dirname(old_name), file, old_name)
+
+            sibling = type(photo).objects.filter(
+                photo=name, variants_status=type(photo).VariantStatus.Done).first()
+            type(photo).objects.filter(pk=photo.pk).update(
+                photo=name,
+                variants=sibling.variants if sibling else {},
+                variants_status=sibling.variants_status if sibling else type(photo).VariantStatus.Pending,
+                variants_attempts=0,
+                dedupe_failed_at=None,
+            )
+
+            if not type(photo).objects.filter(photo=old_name).exists():
+                def delete_files():
+                    for file_name in [old_name, *old_variants]:
+                        storage.delete(file_name)
+                transaction.on_commit(delete_files)
+
+    return freed
@@ -0,0 +1,152 @@
+import copy
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+from simple_history.models import HistoricalRecords
+from simple_history.signals import post_create_historical_record, pre_create_historical_record
+from simple_history.utils import get_change_reason_from_object
+
+_local = threading.local()
+
+
+class HistoryBuffer(object):
+    """ Historical records captured inside buffered_history(), grouped by
+        history model, with the instance each one was taken from.
+    """
+
+    def __init__(self):
+        self.records = defaultdict(list)
+
+    def add(self, instance, history_instance) -> None:
+        self.records[type(history_instance)].append((instance, history_instance))
+
+    def flush(self, using: Optional[str] = None) -> int:
+        """ Write the records, then send post_create_historical_record for
+            each of them as HistoricalRecords does after its save().
+        """
+        written = 0
+        for history_model, records in self.records.items():
+            history_model._default_manager.using(using).bulk_create(
+                [history_instance for _, history_instance in records], batch_size=500)
+            for instance, history_instance in records:
+                post_create_historical_record.send(
+                    sender=history_model,
+                    instance=instance,
+                    history_instance=history_instance,
+                    history_date=history_instance.history_date,
+                    history_user=history_instance.history_user,
+                    history_change_reason=history_instance.history_change_reason,
+                    using=using,
+                )
+            written += len(records)
+        self.records.clear()
+        return written
+
+
+def get_history_buffer() -> Optional[HistoryBuffer]:
+    return getattr(_local, 'buffer', None)
+
+
+@contextmanager
+def buffered_history(using: Optional[str] = None):
+    """ Collect the historical records of every BufferedHistoricalRecords
+        model saved in the block and write them with one bulk_create per
+        history model when the block exits. Use it inside the transaction
+        of the writes, the records are dropped if the block raises.
+        Nested blocks join the outermost one.
+    """
+    if get_history_buffer() is not None:
+        yield get_history_buffer()
+        return
+
+    buffer = _local.buffer = HistoryBuffer()
+    try:
+        yield buffer
+        _local.buffer = None
+        buffer.flush(using)
+    finally:
+        _local.buffer = None
+
+
+class BufferedHistoricalRecords(HistoricalRecords):
+    """ HistoricalRecords that defers its INSERTs to buffered_history()
+        blocks. With HISTORY_DIFF, updates that leave every tracked field
+        as it was loaded write no history row.
+
+        Buffered records get the same signals as saved ones:
+        pre_create_historical_record when they are taken and
+        post_create_historical_record once flushed. Historical models are
+        saved with bulk_create, their own save() is not called.
+    """
+
+    def finalize(self, sender, **kwargs):
+        super().finalize(sender, **kwargs)
+        if sender is self.cls:
+            models.signals.post_init.connect(
+                self.take_snapshot, sender=sender, weak=False)
+
+    def take_snapshot(self, instance, **kwargs) -> None:
+        if not settings.HISTORY_DIFF:
+            return
+        # Only fields already loaded, reading a deferred field would query.
+        # Lists and dicts (ArrayField, JSONField) are copied, they may be
+        # changed in place
+        instance._history_snapshot = {
+            field.attname: (copy.deepcopy(instance.__dict__[field.attname])
+                            if isinstance(instance.__dict__[field.attname], (list, dict))
+                            else instance.__dict__[field.attname])
+            for field in self.fields_included(instance)
+            if field.attname in instance.__dict__
+        }
+
+    def has_changed(self, instance) -> bool:
+        snapshot = getattr(instance, '_history_snapshot', None)
+        if snapshot is None:
+            return True
+        fields = self.fields_included(instance)
+        if len(snapshot) != len(fields):
+            return True
+        return any(snapshot[field.attname] != getattr(instance, field.attname)
+                   for field in fields)
+
+    def build_historical_record(self, instance, history_type: str):
+        manager = getattr(instance, self.manager_name)
+        attrs = {field.attname: getattr(instance, field.attname)
+                 for field in self.fields_included(instance)}
+        if getattr(manager.model, 'history_relation', None) is not None:
+            attrs['history_relation'] = instance
+
+        history_instance = manager.model(
+            history_date=getattr(instance, '_history_date', timezone.now()),
+            history_type=history_type,
+            history_user=self.get_history_user(instance),
+            history_change_reason=get_change_reason_from_object(instance),
+            **attrs
+        )
+        pre_create_historical_record.send(
+            sender=manager.model,
+            instance=instance,
+            history_date=history_instance.history_date,
+            history_user=history_instance.history_user,
+            history_change_reason=history_instance.history_change_reason,
+            history_instance=history_instance,
+            using=None,
+        )
+        return history_instance
+
+    def create_historical_record(self, instance, history_type, *args, **kwargs):
+        if settings.HISTORY_DIFF and history_type == '~' and not self.has_changed(instance):
+            return
+
+        buffer = get_history_buffer()
+        if buffer is None:
+            super().create_historical_record(instance, history_type, *args, **kwargs)
+        else:
+            buffer.add(instance, self.build_historical_record(instance, history_type))
+
+        self.take_snapshot(instance)
@@ -0,0 +1,130 @@
+import logging
+import os
+from io import BytesIO
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
+def variant_key(variant: str, extension: str) -> str:
+    return f'{variant}.{extension}'
+
+
+def variant_name(name: str, variant: str, extension: str) -> str:
+    """ Path of a variant next to its original,
+        uploads/<hash>/<stamp>-photo.jpg gives uploads/<hash>/<stamp>-photo.thumb.webp
+    """
+    root, _ = os.path.splitext(name)
+    return f'{root}.{variant}.{extension}'
+
+
+def render_variant(image: Image.Image, size: int, extension: str) -> ContentFile:
+    resized = image.copy()
+    resized.thumbnail((size, size), Image.LANCZOS)
+    buffer = BytesIO()
+    resized.save(buffer, format=extension.upper(), quality=settings.PHOTO_VARIANT_QUALITY, optimize=True)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(field_file) -> Dict[str, str]:
+    """ Render every PHOTO_VARIANTS size in every PHOTO_VARIANT_FORMATS
+        format and store it next to the original.
+
+    Returns:
+        variant key, such as 'thumb.webp', to stored name
+    """
+    storage = field_file.storage
+    names = {
+        variant_key(variant, extension): variant_name(field_file.name, variant, extension)
+        for variant in settings.PHOTO_VARIANTS for extension in settings.PHOTO_VARIANT_FORMATS
+    }
+    # Variants are named after their original, a content addressed
+    # original shared by several photos only renders them once
+    missing = [key for key, name in names.items() if not storage.exists(name)]
+    if not missing:
+        return names
+
+    with storage.open(field_file.name, 'rb') as original:
+        image = Image.open(original)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+
+    for key in missing:
+        variant, extension = key.split('.')
+        storage.save(names[key], render_variant(image, settings.PHOTO_VARIANTS[variant], extension))
+    return names
+
+
+def claim_pending_variants(model, batch_size: int = 20) -> List:
+    """ Lease up to `batch_size` pending photos of `model` to this worker
+        for PHOTO_VARIANT_LEASE seconds, in a short transaction. Rows are
+        locked with SKIP LOCKED only while they are claimed, photos of a
+        worker that died are claimed again once the lease runs out.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        photos = list(
+            model.objects
+            .select_for_update(skip_locked=True)
+            .filter(variants_status=model.VariantStatus.Pending)
+            .filter(Q(variants_leased_until__isnull=True) | Q(variants_leased_until__lte=now))
+            .order_by('id')[:batch_size]
+        )
+        model.objects.filter(id__in=[photo.id for photo in photos]).update(
+            variants_leased_until=now + timedelta(seconds=settings.PHOTO_VARIANT_LEASE))
+    return photos
+
+
+def generate_pending_variants(model, batch_size: int = 20) -> Tuple[int, int]:
+    """ Generate the variants of one batch of pending photos of `model`.
+
+        The batch is claimed first, then rendered and stored with no
+        transaction or row lock held, so several workers can run side by
+        side and saves of the photos are not blocked. Results are only
+        written to photos that still have the file they were rendered
+        from. Files that are not images fail at once, storage errors are
+        retried until PHOTO_VARIANT_MAX_ATTEMPTS.
+
+    Returns:
+        (done, failed): number of photos processed and given up on
+    """
+    Status = model.VariantStatus
+    done = failed = 0
+
+    photos = claim_pending_variants(model, batch_size)
+    for photo in photos:
+        photo.variants_attempts += 1
+        try:
+            photo.variants = generate_variants(photo.photo)
+            photo.variants_status = Status.Done
+            done += 1
+        except (UnidentifiedImageError, ValueError) as error:
+            photo.variants_status = Status.Failed
+            logger.error(f'{model.__name__} {photo.id} is not a usable image: {error}')
+            failed += 1
+        except Exception as error:
+            if photo.variants_attempts >= settings.PHOTO_VARIANT_MAX_ATTEMPTS:
+                photo.variants_status = Status.Failed
+                failed += 1
+            logger.exception(f'Variants of {model.__name__} {photo.id} failed: {error}')
+
+    with transaction.atomic():
+        for photo in photos:
+            model.objects.filter(pk=photo.pk, photo=photo.photo.name, variants_status=Status.Pending).update(
+                variants=photo.variants,
+                variants_status=photo.variants_status,
+                variants_attempts=photo.variants_attempts,
+                variants_leased_until=None,
+            )
+
+    return done, failed
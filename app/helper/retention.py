@@ -0,0 +1,321 @@
+import gzip
+import logging
+import os
+import time
+from datetime import date, datetime, timezone as dt_timezone
+from typing import Iterator, List, Optional, Tuple
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FIELDS = {'history_id', 'history_date', 'history_change_reason', 'history_type', 'history_user'}
+
+
+def get_history_models(labels: Optional[List[str]] = None) -> list:
+    """ Historical models of the registered models, optionally restricted
+        to model labels such as 'app.Job'.
+    """
+    history_models = []
+    for model in apps.get_models():
+        attribute = getattr(model._meta, 'simple_history_manager_attribute', None)
+        if attribute is None:
+            continue
+        if labels is not None and model._meta.label not in labels:
+            continue
+        history_models.append(getattr(model, attribute).model)
+    return history_models
+
+
+def get_tracked_columns(history_model) -> List[str]:
+    return [field.column for field in history_model._meta.concrete_fields
+            if field.name not in HISTORY_FIELDS and field.name != 'id']
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def month_bounds(month: date) -> Tuple[datetime, datetime]:
+    """ Start and end of the month in UTC, the partition boundaries. """
+    end = add_months(month, 1)
+    return (datetime(month.year, month.month, 1, tzinfo=dt_timezone.utc),
+            datetime(end.year, end.month, 1, tzinfo=dt_timezone.utc))
+
+
+def get_retention_cutoff(months: Optional[int] = None) -> date:
+    """ First day of the oldest month that is kept. """
+    months = settings.HISTORY_RETENTION_MONTHS if months is None else months
+    return add_months(month_start(timezone.now().date()), -months)
+
+
+def quote(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f'{table}_p{month:%Y%m}'
+
+
+def is_partitioned(table: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [table])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def get_monthly_partitions(table: str) -> List[Tuple[str, date]]:
+    """ (name, month) of the monthly partitions of `table`, oldest first. """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+        """, [table])
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        suffix = name[len(table) + 2:]
+        if name.startswith(f'{table}_p') and len(suffix) == 6 and suffix.isdigit():
+            partitions.append((name, date(int(suffix[:4]), int(suffix[4:]), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def create_monthly_partition(table: str, month: date) -> bool:
+    name = partition_name(table, month)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [name])
+        if cursor.fetchone()[0]:
+            return False
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} PARTITION OF {quote(table)} FOR VALUES FROM (%s) TO (%s)",
+            list(month_bounds(month)))
+    return True
+
+
+def partition_table(history_model, months_ahead: int = 3) -> List[str]:
+    """ Turn the history table into one range partitioned on history_date.
+
+        The existing table is renamed to <table>_legacy and attached as the
+        partition of everything before next month, so no rows are copied.
+        Its CHECK constraint and the (history_id, history_date) index are
+        built before the swap, the swap itself only holds the ACCESS
+        EXCLUSIVE lock for the renames. Monthly partitions are created for
+        the next `months_ahead` months and a default partition catches
+        anything else, run it monthly so rows never land there. The
+        history_user foreign key is not recreated on the new table.
+
+    Returns:
+        names of the tables created
+    """
+    table = history_model._meta.db_table
+    created = []
+    if not is_partitioned(table):
+        legacy = f'{table}_legacy'
+        # Next month, writes in between still pass the CHECK constraint
+        _, cutover = month_bounds(month_start(timezone.now().date()))
+        with connection.cursor() as cursor:
+            # Both run outside the swap: the index is built concurrently and
+            # a NOT VALID constraint is validated without blocking writes
+            cursor.execute(
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {quote(f'{table}_history_pk')} "
+                f"ON {quote(table)} (history_id, history_date)")
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} DROP CONSTRAINT IF EXISTS {quote(f'{table}_legacy_range')}")
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(f'{table}_legacy_range')} "
+                f"CHECK (history_date < %s) NOT VALID", [cutover])
+            cursor.execute(
+                f"ALTER TABLE {quote(table)} VALIDATE CONSTRAINT {quote(f'{table}_legacy_range')}")
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute(f"LOCK TABLE {quote(table)} IN ACCESS EXCLUSIVE MODE")
+                cursor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(legacy)}")
+                cursor.execute(
+                    f"CREATE TABLE {quote(table)} (LIKE {quote(legacy)} INCLUDING DEFAULTS) "
+                    f"PARTITION BY RANGE (history_date)")
+                cursor.execute(
+                    "SELECT pg_get_serial_sequence(%s, 'history_id')", [legacy])
+                cursor.execute(
+                    f"ALTER SEQUENCE {cursor.fetchone()[0]} OWNED BY {quote(table)}.history_id")
+                cursor.execute(
+                    f"ALTER TABLE {quote(table)} ADD PRIMARY KEY (history_id, history_date)")
+                # Same columns as the indexes Django created on the old
+                # table, which ATTACH reuses instead of building new ones
+                for field in history_model._meta.concrete_fields:
+                    if field.db_index and not field.primary_key:
+                        cursor.execute(
+                            f"CREATE INDEX {quote(f'{table}_{field.column}_part')} "
+                            f"ON {quote(table)} ({quote(field.column)})")
+                cursor.execute(
+                    f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(legacy)} "
+                    f"FOR VALUES FROM (MINVALUE) TO (%s)", [cutover])
+                cursor.execute(
+                    f"CREATE TABLE {quote(f'{table}_default')} PARTITION OF {quote(table)} DEFAULT")
+        created += [table, f'{table}_default']
+
+    current = month_start(timezone.now().date())
+    for months in range(1, months_ahead + 1):
+        month = add_months(current, months)
+        if create_monthly_partition(table, month):
+            created.append(partition_name(table, month))
+    return created
+
+
+def get_archive_path(output_dir: str, table: str, label: str) -> str:
+    """ A file name that is not taken yet, a rerun after a partial delete
+        never overwrites the rows archived earlier.
+    """
+    directory = os.path.join(output_dir, table)
+    os.makedirs(directory, exist_ok=True)
+    path, n = os.path.join(directory, f'{table}_{label}.csv.gz'), 1
+    while os.path.exists(path):
+        path, n = os.path.join(directory, f'{table}_{label}_{n}.csv.gz'), n + 1
+    return path
+
+
+def export_rows(query: str, params: list, path: str) -> None:
+    with connection.cursor() as cursor:
+        statement = cursor.mogrify(query, params).decode()
+        with gzip.open(path, 'wb') as file:
+            cursor.copy_expert(f"COPY ({statement}) TO STDOUT WITH CSV HEADER", file)
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def delete_in_batches(table: str, start: datetime, end: datetime, batch_size: int, pause: float = 0) -> int:
+    deleted = 0
+    while True:
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                DELETE FROM {quote(table)} WHERE history_id IN (
+                    SELECT history_id FROM {quote(table)}
+                    WHERE history_date >= %s AND history_date < %s LIMIT %s
+                )
+            """, [start, end, batch_size])
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+        time.sleep(pause)
+
+
+def get_expired_months(table: str, cutoff: date) -> Iterator[date]:
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(history_date) FROM {quote(table)} WHERE history_date < %s",
+                       [month_bounds(cutoff)[0]])
+        oldest = cursor.fetchone()[0]
+    if oldest is None:
+        return
+    month = month_start(oldest.astimezone(dt_timezone.utc).date())
+    while month < cutoff:
+        yield month
+        month = add_months(month, 1)
+
+
+def archive_table(history_model, output_dir: str, cutoff: date, batch_size: int = 1000,
+                  pause: float = 0, dry_run: bool = False) -> List[Tuple[str, int]]:
+    """ Export the history rows older than `cutoff` to gzipped CSV files
+        under `output_dir`, one per month, then remove them.
+
+        Expired monthly partitions are detached and dropped whole. Older
+        rows left in the legacy or default partition, or in tables that
+        are not partitioned, are deleted in batches of `batch_size` once
+        their month is on disk.
+
+    Returns:
+        (file, rows) for every month archived
+    """
+    table = history_model._meta.db_table
+    archived = []
+
+    for name, month in get_monthly_partitions(table):
+        if add_months(month, 1) > cutoff:
+            continue
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM {quote(name)}")
+            rows = cursor.fetchone()[0]
+        if dry_run:
+            archived.append((name, rows))
+            continue
+        path = get_archive_path(output_dir, table, f'{month:%Y%m}')
+        export_rows(f"SELECT * FROM {quote(name)}", [], path)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+            cursor.execute(f"DROP TABLE {quote(name)}")
+        archived.append((path, rows))
+        logger.info(f'Archived {rows} rows of {name} to {path}')
+
+    for month in get_expired_months(table, cutoff):
+        start, end = month_bounds(month)
+        query = f"SELECT * FROM {quote(table)} WHERE history_date >= %s AND history_date < %s"
+        with connection.cursor() as cursor:
+            cursor.execute(f"SELECT count(*) FROM ({query}) expired", [start, end])
+            rows = cursor.fetchone()[0]
+        if not rows:
+            continue
+        if dry_run:
+            archived.append((f'{table} {month:%Y-%m}', rows))
+            continue
+        path = get_archive_path(output_dir, table, f'{month:%Y%m}')
+        export_rows(f"{query} ORDER BY history_id", [start, end], path)
+        delete_in_batches(table, start, end, batch_size, pause)
+        archived.append((path, rows))
+        logger.info(f'Archived {rows} rows of {table} to {path}')
+
+    return archived
+
+
+def compact_table(history_model, batch_size: int = 1000, pause: float = 0, dry_run: bool = False) -> int:
+    """ Delete '~' records that repeat the previous record of the same
+        object field for field, keeping the first of each run. Records
+        with a change reason are kept. Works through the object ids in
+        ranges of `batch_size`, each range in its own statement.
+
+    Returns:
+        number of records deleted, or that would be with `dry_run`
+    """
+    table = history_model._meta.db_table
+    columns = get_tracked_columns(history_model)
+    unchanged = ' AND '.join(
+        f"{quote(column)} IS NOT DISTINCT FROM lag({quote(column)}) OVER object_history"
+        for column in columns) or 'TRUE'
+    duplicates = f"""
+        SELECT history_id FROM (
+            SELECT history_id, history_type, history_change_reason,
+                   lag(history_type) OVER object_history AS previous_type,
+                   {unchanged} AS unchanged
+            FROM {quote(table)}
+            WHERE id >= %s AND id < %s
+            WINDOW object_history AS (PARTITION BY id ORDER BY history_date, history_id)
+        ) versions
+        WHERE history_type = '~' AND previous_type IN ('+', '~')
+          AND history_change_reason IS NULL AND unchanged
+    """
+    statement = f"SELECT count(*) FROM ({duplicates}) noop" if dry_run else \
+        f"DELETE FROM {quote(table)} WHERE history_id IN ({duplicates})"
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(id), max(id) FROM {quote(table)}")
+        first_id, last_id = cursor.fetchone()
+    if first_id is None:
+        return 0
+
+    removed = 0
+    for start in range(first_id, last_id + 1, batch_size):
+        with connection.cursor() as cursor:
+            cursor.execute(statement, [start, start + batch_size])
+            removed += cursor.fetchone()[0] if dry_run else cursor.rowcount
+        if not dry_run:
+            time.sleep(pause)
+    return removed
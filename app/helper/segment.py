@@ -0,0 +1,123 @@
+import atexit
+import logging
+import threading
+import time
+
+import analytics
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+
+class IdentifyPipeline(object):
+    """ Coalesces Customer saves into batched Segment identify calls.
+
+        Saves only record the customer id after the transaction commits.
+        A background thread picks up ids that have been quiet for
+        SEGMENT_IDENTIFY_WINDOW seconds, loads them with one query and
+        hands them to the analytics client, so repeated saves of the same
+        customer produce a single identify.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._thread = None
+        self.queued = 0
+        self.coalesced = 0
+        self.flushed = 0
+        self.dropped = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'queued': self.queued,
+                'coalesced': self.coalesced,
+                'flushed': self.flushed,
+                'dropped': self.dropped,
+            }
+
+    def queue(self, customer_id: int) -> None:
+        transaction.on_commit(lambda: self.add(customer_id))
+
+    def add(self, customer_id: int) -> None:
+        with self._lock:
+            if customer_id in self._pending:
+                self._pending[customer_id] = time.monotonic()
+                self.coalesced += 1
+                return
+            if len(self._pending) >= settings.SEGMENT_IDENTIFY_MAX_PENDING:
+                self.dropped += 1
+                logger.warning(f'Segment identify for customer {customer_id} dropped, queue is full.')
+                return
+            self._pending[customer_id] = time.monotonic()
+            self.queued += 1
+        self.start()
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self.run, name='segment-identify', daemon=True)
+                self._thread.start()
+
+    def take(self, force: bool = False) -> list:
+        deadline = time.monotonic() - settings.SEGMENT_IDENTIFY_WINDOW
+        with self._lock:
+            customer_ids = [customer_id for customer_id, queued_at in self._pending.items()
+                            if force or queued_at <= deadline][:settings.SEGMENT_IDENTIFY_BATCH_SIZE]
+            for customer_id in customer_ids:
+                del self._pending[customer_id]
+        return customer_ids
+
+    def flush(self, force: bool = False) -> int:
+        from app.models import Customer
+
+        flushed = 0
+        while True:
+            customer_ids = self.take(force=force)
+            if not customer_ids:
+                return flushed
+
+            customers = Customer.objects.select_related(
+                'address', 'lead').filter(id__in=customer_ids, lead__isnull=False)
+            batch = 0
+            for customer in customers:
+                analytics.identify(
+                    anonymous_id=customer.lead.url_token,
+                    user_id=customer.id,
+                    traits=customer.__identify__()
+                )
+                batch += 1
+
+            # Customers deleted or unlinked from their lead since the save
+            with self._lock:
+                self.flushed += batch
+                self.dropped += len(customer_ids) - batch
+            flushed += batch
+
+    def run(self) -> None:
+        while True:
+            time.sleep(settings.SEGMENT_IDENTIFY_WINDOW)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Segment identify flush failed.')
+            finally:
+                connections.close_all()
+
+
+identify_pipeline = IdentifyPipeline()
+
+
+@atexit.register
+def flush_identify_pipeline():
+    try:
+        identify_pipeline.flush(force=True)
+        analytics.flush()
+    except Exception:
+        logger.exception('Segment identify flush at exit failed.')
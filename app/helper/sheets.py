@@ -0,0 +1,61 @@
+import csv
+import os
+from typing import Iterable, Iterator, List
+
+from gspread.utils import numericise
+
+
+def get_extension(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in ('.csv', '.xlsx'):
+        raise ValueError(f'Unsupported sheet file {path}, expected .csv or .xlsx')
+    return extension
+
+
+def iter_rows(path: str) -> Iterator[List]:
+    """ Stream the rows of a .csv file or the first worksheet of a .xlsx
+        file without loading the whole sheet into memory.
+    """
+    if get_extension(path) == '.csv':
+        with open(path, newline='', encoding='utf-8') as file:
+            yield from csv.reader(file)
+        return
+
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_records(path: str) -> Iterator[dict]:
+    """ File equivalent of gspread's Worksheet.get_all_records(): the first
+        row is the header and string cells are numericised the same way.
+    """
+    rows = iter_rows(path)
+    header = next(rows, None)
+    if header is None:
+        return
+
+    for row in rows:
+        row = list(row) + [''] * (len(header) - len(row))
+        yield dict(zip(header, [numericise(value) if isinstance(value, str) else value for value in row]))
+
+
+def write_snapshot(path: str, rows: Iterable[List]) -> None:
+    """ Write the raw values of a worksheet (Worksheet.get_all_values())
+        so imports can be replayed with iter_records.
+    """
+    if get_extension(path) == '.csv':
+        with open(path, 'w', newline='', encoding='utf-8') as file:
+            csv.writer(file).writerows(rows)
+        return
+
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet()
+    for row in rows:
+        worksheet.append(row)
+    workbook.save(path)
@@ -1,15 +1,120 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
 import requests
 from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
 
+logger = logging.getLogger(__name__)
 
-def post_to_customers_and_active_jobs(text):
+SLACK_WEBHOOK_SETTINGS = {
+    'customers_and_active_jobs': 'SLACK_CUSTOMER_AND_JOBS_WEBHOOK',
+    'boom': 'SLACK_BOOM',
+}
+
+
+def send_to_slack(channel, text):
     return requests.post(
-        settings.SLACK_CUSTOMER_AND_JOBS_WEBHOOK,
+        getattr(settings, SLACK_WEBHOOK_SETTINGS[channel]),
         json={"text": text},
+        timeout=settings.SLACK_TIMEOUT,
     )
 
+
+def queue_to_slack(channel, text):
+    """ Store the message in the SlackMessage outbox, in the caller's
+        transaction, for the send_slack_messages worker to deliver.
+        Falls back to a blocking post when SLACK_OUTBOX is off.
+    """
+    if not settings.SLACK_OUTBOX:
+        return send_to_slack(channel, text)
+
+    from app.models import SlackMessage
+    return SlackMessage.objects.create(channel=channel, text=text)
+
+
+def post_to_customers_and_active_jobs(text):
+    return queue_to_slack('customers_and_active_jobs', text)
+
+
 def post_to_boom(text):
-    return requests.post(
-        settings.SLACK_BOOM,
-        json={"text": text},
-    )
\ No newline at end of file
+    return queue_to_slack('boom', text)
+
+
+def get_retry_delay(attempts):
+    return timedelta(seconds=min(settings.SLACK_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.SLACK_RETRY_MAX_DELAY))
+
+
+def deliver(message):
+    try:
+        response = send_to_slack(message.channel, message.text)
+        response.raise_for_status()
+        return None
+    except requests.RequestException as error:
+        return str(error)
+
+
+def claim_slack_messages(batch_size=50):
+    """ Lease up to `batch_size` due SlackMessages to this worker by moving
+        their next attempt SLACK_LEASE seconds ahead, in a short
+        transaction. Rows are locked with SKIP LOCKED only while they are
+        claimed, a worker that dies with a lease leaves its messages to be
+        claimed again once it runs out.
+    """
+    from app.models import SlackMessage
+
+    with transaction.atomic():
+        messages = list(
+            SlackMessage.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=SlackMessage.Status.Pending, next_attempt_at__lte=timezone.now())
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        SlackMessage.objects.filter(id__in=[message.id for message in messages]).update(
+            next_attempt_at=timezone.now() + timedelta(seconds=settings.SLACK_LEASE))
+    return messages
+
+
+def send_pending_slack_messages(batch_size=50, workers=4):
+    """ Deliver one batch of due SlackMessages.
+
+        The batch is claimed first, then posted with no transaction or row
+        lock held, so several workers can drain the outbox side by side.
+        Failed posts are retried with exponential backoff until
+        SLACK_MAX_ATTEMPTS, then marked as failed.
+
+    Returns:
+        (sent, failed): number of messages delivered and given up on
+    """
+    from app.models import SlackMessage
+
+    messages = claim_slack_messages(batch_size)
+    if not messages:
+        return 0, 0
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        errors = list(executor.map(deliver, messages))
+
+    now = timezone.now()
+    sent = failed = 0
+    for message, error in zip(messages, errors):
+        message.attempts += 1
+        if error is None:
+            message.status = SlackMessage.Status.Sent
+            message.sent_at = now
+            sent += 1
+        elif message.attempts >= settings.SLACK_MAX_ATTEMPTS:
+            message.status = SlackMessage.Status.Failed
+            message.last_error = error
+            failed += 1
+            logger.error(f'Slack message {message.id} failed: {error}')
+        else:
+            message.last_error = error
+            message.next_attempt_at = now + get_retry_delay(message.attempts)
+
+    SlackMessage.objects.bulk_update(
+        messages, ['status', 'attempts', 'sent_at', 'last_error', 'next_attempt_at'])
+
+    return sent, failed
@@ -0,0 +1,245 @@
+import hashlib
+import os
+import tempfile
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousOperation
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import transaction
+from django.utils import timezone
+
+PHOTO_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/webp', 'image/heic']
+RECEIPT_CONTENT_TYPES = ['application/pdf']
+
+
+class UploadRejected(SuspiciousOperation):
+    pass
+
+
+def detect_content_type(head: bytes) -> Optional[str]:
+    """ Content type from the first bytes of a file, the client supplied
+        one is not trusted.
+    """
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[4:8] == b'ftyp' and head[8:12] in (b'heic', b'heix', b'heif', b'mif1', b'msf1'):
+        return 'image/heic'
+    if head.startswith(b'%PDF-'):
+        return 'application/pdf'
+    return None
+
+
+def check_upload(head: bytes, size: int, content_types: Optional[Iterable[str]] = None) -> Optional[str]:
+    """ Raise UploadRejected when `size` bytes are over MAX_UPLOAD_SIZE or
+        `head` is not one of `content_types`, any type passes without them.
+    """
+    if size > settings.MAX_UPLOAD_SIZE:
+        raise UploadRejected(f'Uploads are limited to {settings.MAX_UPLOAD_SIZE} bytes.')
+    content_type = detect_content_type(head)
+    if content_types is not None and content_type not in content_types:
+        raise UploadRejected(f"Expected {', '.join(content_types)}, got {content_type or 'an unknown type'}.")
+    return content_type
+
+
+class StreamingUploadHandler(TemporaryFileUploadHandler):
+    """ Spools every uploaded file to disk, whatever its size, and checks
+        it while it streams in: the first chunk against `content_types` and
+        the running total against MAX_UPLOAD_SIZE. A request never holds
+        more than one chunk of a file in memory. The sha256 of the file is
+        taken on the way, for content addressed storage.
+    """
+    content_types = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > settings.MAX_UPLOAD_SIZE + settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+            raise UploadRejected(f'Uploads are limited to {settings.MAX_UPLOAD_SIZE} bytes.')
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.detected_content_type = None
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if start == 0:
+            self.detected_content_type = check_upload(raw_data, len(raw_data), self.content_types)
+        elif start + len(raw_data) > settings.MAX_UPLOAD_SIZE:
+            raise UploadRejected(f'Uploads are limited to {settings.MAX_UPLOAD_SIZE} bytes.')
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.content_type = self.detected_content_type or file.content_type
+        file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class PhotoUploadHandler(StreamingUploadHandler):
+    content_types = PHOTO_CONTENT_TYPES
+
+
+class ReceiptUploadHandler(StreamingUploadHandler):
+    content_types = RECEIPT_CONTENT_TYPES
+
+
+def part_name(session_id, index: int) -> str:
+    return f'uploads/parts/{session_id}/{index:05d}'
+
+
+def spool_stream(stream, limit: int):
+    """ Copy `stream` to a temporary file in UPLOAD_CHUNK_SIZE reads,
+        raising UploadRejected past `limit` bytes.
+    """
+    spooled = tempfile.TemporaryFile()
+    size = 0
+    while True:
+        chunk = stream.read(settings.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > limit:
+            spooled.close()
+            raise UploadRejected(f'Part is larger than the {limit} bytes expected.')
+        spooled.write(chunk)
+    spooled.seek(0)
+    return spooled
+
+
+def save_part(session_id, index: int, file) -> str:
+    name = part_name(session_id, index)
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, File(file))
+
+
+def assemble_parts(session_id, count: int):
+    """ The parts of an upload joined in a temporary file on disk, read
+        back from storage one chunk at a time, and their sha256.
+    """
+    assembled = tempfile.NamedTemporaryFile(suffix='.upload')
+    sha256 = hashlib.sha256()
+    for index in range(count):
+        with default_storage.open(part_name(session_id, index), 'rb') as part:
+            for chunk in iter(lambda: part.read(settings.UPLOAD_CHUNK_SIZE), b''):
+                sha256.update(chunk)
+                assembled.write(chunk)
+    assembled.flush()
+    assembled.seek(0)
+    return assembled, sha256.hexdigest()
+
+
+def delete_parts(session_id, count: int) -> None:
+    for index in range(count):
+        default_storage.delete(part_name(session_id, index))
+
+
+def get_upload_target(user, target: str, object_id: int):
+    """ The job, customer or material list an upload is for, when `user`
+        may add files to it. Staff may upload to anything, pros to the
+        jobs of their business and customers to themselves.
+    """
+    from app.models import Customer, Job, MaterialList, UploadSession
+
+    querysets = {
+        UploadSession.Target.JobPhoto: Job.objects.filter(pro_business__pro__user=user),
+        UploadSession.Target.CustomerPhoto: Customer.objects.filter(user=user),
+        UploadSession.Target.Receipt: MaterialList.objects.filter(job__pro_business__pro__user=user),
+    }
+    queryset = querysets[target]
+    if user.is_staff:
+        queryset = queryset.model.objects.all()
+    return queryset.filter(pk=object_id).first()
+
+
+def store_upload(session, target, upload) -> str:
+    """ Save the assembled file under its final name, outside any
+        transaction. Photos are stored by content and take a StoredObject
+        reference, receipts are saved next to the other receipts.
+    """
+    from app.helper.blobs import acquire
+    from app.models import CustomerPhoto, JobPhoto, MaterialList, UploadSession
+
+    if session.target == UploadSession.Target.Receipt:
+        field = MaterialList._meta.get_field('receipt')
+        return field.storage.save(field.generate_filename(target, session.filename), upload)
+
+    if session.target == UploadSession.Target.JobPhoto:
+        photo = JobPhoto(job=target)
+    else:
+        photo = CustomerPhoto(customer=target)
+    field = photo._meta.get_field('photo')
+    directory = os.path.dirname(field.generate_filename(photo, session.filename))
+    return acquire(field.storage, directory, upload, session.filename)
+
+
+def discard_upload(session, name: str) -> None:
+    from app.helper.blobs import release
+    from app.models import MaterialList, UploadSession
+
+    if session.target == UploadSession.Target.Receipt:
+        MaterialList._meta.get_field('receipt').storage.delete(name)
+    else:
+        release(default_storage, name)
+
+
+def complete_upload(session) -> None:
+    """ Join the parts of `session`, check the result and save it to its
+        target, then mark the session complete and remove the parts.
+
+        The session must have been moved to Completing by the caller. The
+        parts are read and the file stored with no transaction open, only
+        the JobPhoto, CustomerPhoto or MaterialList row and the session are
+        written in one, and only while the session is still this
+        completion's.
+    """
+    from app.models import CustomerPhoto, JobPhoto, UploadSession
+
+    target = get_upload_target(session.owner, session.target, session.object_id)
+    if target is None:
+        raise UploadRejected('The upload target no longer exists.')
+
+    content_types = RECEIPT_CONTENT_TYPES if session.target == UploadSession.Target.Receipt else PHOTO_CONTENT_TYPES
+    assembled, digest = assemble_parts(session.id, session.part_count)
+    with assembled:
+        size = assembled.seek(0, 2)
+        if size != session.size:
+            raise UploadRejected(f'Received {size} bytes, expected {session.size}.')
+        assembled.seek(0)
+        session.content_type = check_upload(assembled.read(16), size, content_types)
+        assembled.seek(0)
+
+        upload = File(assembled, name=session.filename)
+        upload.sha256 = digest
+        name = store_upload(session, target, upload)
+
+    try:
+        with transaction.atomic():
+            locked = UploadSession.objects.select_for_update().get(pk=session.pk)
+            if locked.status != UploadSession.Status.Completing or locked.completing_until != session.completing_until:
+                raise UploadRejected('The upload was completed or aborted meanwhile.')
+
+            if session.target == UploadSession.Target.JobPhoto:
+                result = JobPhoto.objects.create(job=target, photo=name)
+            elif session.target == UploadSession.Target.CustomerPhoto:
+                result = CustomerPhoto.objects.create(customer=target, photo=name)
+            else:
+                target.receipt = name
+                target.save(update_fields=['receipt'])
+                result = target
+
+            session.result_id = result.id
+            session.status = UploadSession.Status.Complete
+            session.completing_until = None
+            session.completed_at = timezone.now()
+            session.save(update_fields=['content_type', 'status', 'result_id', 'completing_until', 'completed_at'])
+            transaction.on_commit(lambda: delete_parts(session.id, session.part_count))
+    except Exception:
+        discard_upload(session, name)
+        raise
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.helper.retention import archive_table, get_history_models, get_retention_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Export history older than the retention period to gzipped CSV files, then delete it.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', metavar='LABEL',
+                            help='Model labels such as app.Job, defaults to every model with history.')
+        parser.add_argument('--months', type=int, default=None,
+                            help='Months of history to keep, defaults to HISTORY_RETENTION_MONTHS.')
+        parser.add_argument('--output-dir', default=None,
+                            help='Where to write the archives, defaults to HISTORY_ARCHIVE_DIR.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows deleted per statement outside of whole partitions.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between delete batches.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the rows that would be archived.')
+
+    def handle(self, *args, **options):
+        cutoff = get_retention_cutoff(options['months'])
+        output_dir = options['output_dir'] or settings.HISTORY_ARCHIVE_DIR
+        self.stdout.write(f'Archiving history before {cutoff}')
+
+        for history_model in get_history_models(options['models']):
+            archived = archive_table(history_model, output_dir, cutoff, batch_size=options['batch_size'],
+                                     pause=options['sleep'], dry_run=options['dry_run'])
+            for name, rows in archived:
+                self.stdout.write(f'{name}: {rows} rows')
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery
+
+from app.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Set Job.completed_at from the first finished history record, in one UPDATE.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the jobs missing completed_at.')
+
+    def handle(self, *args, **options):
+        jobs = Job.objects.filter(is_pro_finished=True, completed_at__isnull=True)
+        if options['dry_run']:
+            self.stdout.write(f'{jobs.count()} jobs to backfill')
+            return
+
+        first_finished = (
+            Job.history
+            .filter(id=OuterRef('pk'), is_pro_finished=True)
+            .order_by('history_date')
+            .values('history_date')[:1]
+        )
+        updated = jobs.update(completed_at=Subquery(first_finished))
+        self.stdout.write(f'{updated} jobs backfilled')
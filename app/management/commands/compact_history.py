@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from app.helper.retention import compact_table, get_history_models
+
+
+class Command(BaseCommand):
+    help = 'Delete history records that repeat the previous version of their object unchanged.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', metavar='LABEL',
+                            help='Model labels such as app.Job, defaults to every model with history.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Object ids handled per statement.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the records that would be deleted.')
+
+    def handle(self, *args, **options):
+        for history_model in get_history_models(options['models']):
+            removed = compact_table(history_model, batch_size=options['batch_size'],
+                                    pause=options['sleep'], dry_run=options['dry_run'])
+            verb = 'to compact' if options['dry_run'] else 'compacted'
+            self.stdout.write(f'{history_model._meta.db_table}: {removed} records {verb}')
@@ -0,0 +1,58 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.helper.blobs import dedupe_photo
+from app.models import CustomerPhoto, JobPhoto, StoredObject
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Move photos stored before content addressing to their content address, sharing identical files.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=None,
+                            help='Stop after this many photos, to spread the work over several runs.')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Try the photos earlier runs could not move again.')
+
+    def handle(self, *args, **options):
+        remaining = options['limit']
+        for model in (JobPhoto, CustomerPhoto):
+            photos = (
+                model.objects
+                .exclude(photo='')
+                .exclude(photo__in=StoredObject.objects.values('name'))
+                .order_by('id')
+            )
+            if not options['retry_failed']:
+                photos = photos.filter(dedupe_failed_at__isnull=True)
+            if remaining is not None:
+                photos = photos[:remaining]
+
+            moved = duplicates = saved = failed = 0
+            for photo in photos.iterator():
+                # Each photo commits on its own, an interrupted run resumes
+                # with the photos left
+                try:
+                    freed = dedupe_photo(photo)
+                except Exception as error:
+                    # A missing or unreadable file must not hold up the rest,
+                    # it is skipped by later runs until --retry-failed
+                    logger.exception(f'Could not dedupe {model.__name__} {photo.id} ({photo.photo.name}): {error}')
+                    model.objects.filter(pk=photo.pk).update(dedupe_failed_at=timezone.now())
+                    failed += 1
+                    continue
+                if freed:
+                    duplicates += 1
+                    saved += freed
+                moved += 1
+
+            self.stdout.write(f'{model.__name__}: {moved} moved, {duplicates} duplicates, '
+                              f'{saved} bytes freed, {failed} failed')
+            if remaining is not None:
+                remaining -= moved + failed
+                if remaining <= 0:
+                    return
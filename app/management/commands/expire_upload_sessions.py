@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from app.helper.uploads import delete_parts
+from app.models import UploadSession
+
+
+class Command(BaseCommand):
+    help = ('Abort resumable uploads left open, or with an abandoned completion, longer than '
+            'UPLOAD_SESSION_MAX_AGE and delete their parts.')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        unfinished = Q(status=UploadSession.Status.Open) | Q(
+            status=UploadSession.Status.Completing, completing_until__lt=now)
+        sessions = UploadSession.objects.filter(unfinished, created_at__lt=now - settings.UPLOAD_SESSION_MAX_AGE)
+
+        expired = 0
+        for session in sessions.iterator():
+            # Aborted first, a completion that starts now finds it aborted
+            if not UploadSession.objects.filter(unfinished, pk=session.pk).update(
+                    status=UploadSession.Status.Aborted, completing_until=None):
+                continue
+            delete_parts(session.id, session.part_count)
+            expired += 1
+        self.stdout.write(f'{expired} upload sessions expired')
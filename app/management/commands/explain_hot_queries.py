@@ -0,0 +1,71 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand
+
+EXECUTION_TIME = re.compile(r'Execution Time: ([\d.]+) ms')
+
+
+def get_hot_queries():
+    """ Querysets of the hot lookups, with parameters taken from existing
+        rows so the plans reflect real data.
+    """
+    from accounts.models import CustomUser
+    from app.models import Customer, Job
+    from booking.models import CalendlyInvitee, ProductCatalog, ProductCriteria
+
+    invitee_uuid = CalendlyInvitee.objects.values_list('uuid', flat=True).first() or ''
+    sms_key = CustomUser.objects.exclude(sms_key='').values_list(
+        'sms_key', flat=True).first() or 'missing'
+    product_criteria = ProductCriteria.objects.first() or ProductCriteria()
+
+    return {
+        'customer_by_invitee_uuid': Customer.objects.filter(lead__calendly_invitee__uuid=invitee_uuid),
+        'user_by_sms_key': CustomUser.objects.filter(sms_key=sms_key),
+        'products_from_criteria': ProductCatalog.criteria_queryset(product_criteria),
+        'open_jobs': Job.get_all_open(),
+        'completed_jobs': Job.get_all_completed(),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Capture EXPLAIN ANALYZE plans of the hot booking and job lookups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', metavar='FILE',
+            help='Write the plans as JSON to FILE, to compare runs before and after a change.')
+        parser.add_argument(
+            '--compare', metavar='FILE',
+            help='Compare the execution times against plans written earlier with --output.')
+
+    def handle(self, *args, **kwargs):
+        plans = {}
+        for name, queryset in get_hot_queries().items():
+            plan = queryset.explain(analyze=True, buffers=True)
+            execution_time = EXECUTION_TIME.search(plan)
+            plans[name] = {
+                'execution_ms': float(execution_time.group(1)) if execution_time else None,
+                'plan': plan,
+            }
+
+        if kwargs.get('output'):
+            with open(kwargs.get('output'), 'w') as file:
+                json.dump(plans, file, indent=2)
+
+        if not kwargs.get('compare'):
+            if not kwargs.get('output'):
+                for name, result in plans.items():
+                    self.stdout.write(f"{name}\n{result['plan']}\n")
+            return
+
+        with open(kwargs.get('compare')) as file:
+            before = json.load(file)
+
+        for name, result in plans.items():
+            before_ms = before.get(name, {}).get('execution_ms')
+            after_ms = result['execution_ms']
+            line = f'{name}: {before_ms} ms -> {after_ms} ms'
+            if before_ms and after_ms:
+                line += f' ({before_ms / after_ms:.1f}x)'
+            self.stdout.write(line)
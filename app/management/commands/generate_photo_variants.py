@@ -0,0 +1,31 @@
+import time
+from django.core.management.base import BaseCommand
+
+from app.helper.images import generate_pending_variants
+from app.models import CustomerPhoto, JobPhoto
+
+
+class Command(BaseCommand):
+    help = 'Generate the resized variants of pending JobPhotos and CustomerPhotos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new photos instead of exiting once none are pending.')
+        parser.add_argument('--interval', type=float, default=5,
+                            help='Seconds to sleep between polls when no photo is pending.')
+
+    def handle(self, *args, **options):
+        while True:
+            busy = False
+            for model in (JobPhoto, CustomerPhoto):
+                done, failed = generate_pending_variants(model, batch_size=options['batch_size'])
+                if done or failed:
+                    self.stdout.write(f'{model.__name__}: {done} done, {failed} failed')
+                    busy = True
+            if busy:
+                continue
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -1,10 +1,11 @@
 from __future__ import print_function
-import os.path
+import os
 from django.conf import settings
 from django.core.management.base import BaseCommand
 import gspread
 from gspread import Client
 
+from app.helper.sheets import iter_records, write_snapshot
 from app.models import (JobType, SupplyHouse, SupplyHouseAddress)
 from pro.helper.phone import get_formatted_phone
 
@@ -14,10 +15,18 @@ class Command(BaseCommand):
             settings.BASE_DIR, settings.GS_CREDENTIALS_PATH)
         return gspread.service_account(filename=credentialsPath)
 
+    def get_supply_house_worksheet(self, account: Client):
+        return account.open_by_key(settings.GSHEET_ID).get_worksheet_by_id(0)
+
+    def get_job_types_worksheet(self, account: Client):
+        return account.open_by_key(settings.G_JOBTYPES_SHEET_ID).worksheet(
+            'Untitled Database b90766ddaf164c0b8c41d9c14b8e0ab3')
+
     def import_supply_house(self, account: Client):
-        sheet = account.open_by_key(settings.GSHEET_ID).get_worksheet_by_id(0)
-        records = sheet.get_all_records()
+        self.import_supply_house_records(
+            self.get_supply_house_worksheet(account).get_all_records())
 
+    def import_supply_house_records(self, records):
         results = []
         duplicated = []
         for record in records:
@@ -47,10 +56,10 @@ class Command(BaseCommand):
         return "Tankless Installation"
 
     def import_job_types(self, account: Client):
-        sheet = account.open_by_key(settings.G_JOBTYPES_SHEET_ID).worksheet(
-            'Untitled Database b90766ddaf164c0b8c41d9c14b8e0ab3')
-        records = sheet.get_all_records()
+        self.import_job_types_records(
+            self.get_job_types_worksheet(account).get_all_records())
 
+    def import_job_types_records(self, records):
         results = []
         duplicated = []
         for record in records:
@@ -74,12 +83,44 @@ class Command(BaseCommand):
             results.append(job_type)
         print(f'{len(results)} job types ({len(duplicated)} duplicates) imported!')
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--job-types-source', metavar='FILE',
+            help='Import job types from a .csv/.xlsx snapshot instead of the live Google Sheet.')
+        parser.add_argument(
+            '--supply-houses-source', metavar='FILE',
+            help='Import supply houses from a .csv/.xlsx snapshot instead of the live Google Sheet.')
+        parser.add_argument(
+            '--snapshot-dir', metavar='DIR',
+            help='Write both live Google Sheets as job_types.csv and supply_houses.csv to DIR and exit.')
+
     def handle(self, *args, **kwargs):
-        account = self.authorize()
-        if not account:
-            print('Authorization Failed.')
+        job_types_source = kwargs.get('job_types_source')
+        supply_houses_source = kwargs.get('supply_houses_source')
+
+        account = None
+        if kwargs.get('snapshot_dir') or not (job_types_source and supply_houses_source):
+            account = self.authorize()
+            if not account:
+                print('Authorization Failed.')
+                return
+            print('Authorized.')
+
+        snapshot_dir = kwargs.get('snapshot_dir')
+        if snapshot_dir:
+            write_snapshot(os.path.join(snapshot_dir, 'job_types.csv'),
+                           self.get_job_types_worksheet(account).get_all_values())
+            write_snapshot(os.path.join(snapshot_dir, 'supply_houses.csv'),
+                           self.get_supply_house_worksheet(account).get_all_values())
+            print(f'Snapshots written to {snapshot_dir}')
             return
-        print('Authorized.')
 
-        self.import_job_types(account)
-        self.import_supply_house(account)
+        if job_types_source:
+            self.import_job_types_records(iter_records(job_types_source))
+        else:
+            self.import_job_types(account)
+
+        if supply_houses_source:
+            self.import_supply_house_records(iter_records(supply_houses_source))
+        else:
+            self.import_supply_house(account)
@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.helper.retention import get_history_models, partition_table
+
+
+class Command(BaseCommand):
+    help = 'Range partition the large history tables by month and create the coming monthly partitions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', nargs='+', metavar='LABEL',
+                            help='Model labels such as app.Job, defaults to HISTORY_PARTITIONED_MODELS.')
+        parser.add_argument('--months-ahead', type=int, default=3,
+                            help='Monthly partitions to keep created in advance.')
+
+    def handle(self, *args, **options):
+        for history_model in get_history_models(options['models'] or settings.HISTORY_PARTITIONED_MODELS):
+            created = partition_table(history_model, months_ahead=options['months_ahead'])
+            self.stdout.write(f"{history_model._meta.db_table}: {', '.join(created) or 'up to date'}")
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+
+from app.helper.slack import send_pending_slack_messages
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued SlackMessages to their Slack webhooks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Max concurrent webhook posts.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling the outbox instead of exiting once it is drained.')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='Seconds to sleep between polls when the outbox is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_pending_slack_messages(
+                batch_size=options['batch_size'], workers=options['workers'])
+            if sent or failed:
+                self.stdout.write(f'{sent} sent, {failed} failed')
+                continue
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from app.models import Job
+
+
+class Command(BaseCommand):
+    help = 'Recompute Job.stage and Job.flags from the workflow booleans, in one UPDATE.'
+
+    def handle(self, *args, **options):
+        updated = Job.objects.sync_lifecycle()
+        self.stdout.write(f'{updated} jobs synced')
@@ -1,27 +1,59 @@
 from __future__ import annotations
 from datetime import datetime
+from typing import List
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import models
-from django.db.models import Q
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, Value, When
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce
 from django.db.models.query import QuerySet
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.html import mark_safe
 from django.utils.translation import gettext_lazy as _
 from libcst import Add
+from app.helper.segment import identify_pipeline
 from app.helper.slack import post_to_customers_and_active_jobs, post_to_boom
 import auto_prefetch
 import pytz
 from ckeditor.fields import RichTextField
 from django.core.validators import FileExtensionValidator
 from booking.models import CustomerLead
-from simple_history.models import HistoricalRecords
+from app.helper.blobs import ContentAddressedImageField, release
+from app.helper.history import BufferedHistoricalRecords
 import hashlib
+import uuid
 import analytics
 
 
+class SlackMessage(auto_prefetch.Model):
+    class Status(models.TextChoices):
+        Pending = "PENDING", _("Pending")
+        Sent = "SENT", _("Sent")
+        Failed = "FAILED", _("Failed")
+
+    channel = models.CharField(max_length=255)
+    text = models.TextField()
+    status = models.CharField(
+        max_length=8, choices=Status.choices, default=Status.Pending)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.id} {self.channel} {self.status}"
+
+
 class Address(auto_prefetch.Model):
     owner = auto_prefetch.ForeignKey(
         get_user_model(), on_delete=models.CASCADE, null=True)
@@ -32,7 +64,7 @@ class Address(auto_prefetch.Model):
     zip_code = models.CharField(max_length=30)
     country = models.CharField(max_length=255, default="US")
     gate_code = models.CharField(max_length=255, blank=True)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def __str__(self):
         return f"{self.id} {self.line1} {self.line2} {self.city} {self.state} {self.country}"
@@ -65,7 +97,7 @@ class Customer(auto_prefetch.Model):
     lead = auto_prefetch.ForeignKey(CustomerLead, null=True,
                                     blank=True, on_delete=models.CASCADE)
     email = models.EmailField(_('email address'), blank=True)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def get_customer_by_invitee_uuid(uuid):
         return Customer.objects.filter(lead__calendly_invitee__uuid=uuid).first()
@@ -93,7 +125,11 @@ class Customer(auto_prefetch.Model):
 
 @receiver(post_save, sender=Customer, dispatch_uid="emit_identify_to_segment")
 def post_customer_saved(sender, instance, created, update_fields, **kwargs):
-    if not instance.lead:
+    if not instance.lead_id:
+        return
+
+    if settings.SEGMENT_IDENTIFY_PIPELINE:
+        identify_pipeline.queue(instance.id)
         return
 
     analytics.identify(
@@ -108,9 +144,99 @@ def customer_photo_path(instance, filename):
     return f"uploads/{hashlib.shake_256(directory_name).hexdigest(10)}/{datetime.now().strftime('%Y%m%d-%H%M%S')}-{filename}"
 
 
-class CustomerPhoto(auto_prefetch.Model):
+class StoredObject(auto_prefetch.Model):
+    """ A content addressed file in storage and the number of rows that
+        reference it, see ContentAddressedImageField.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    sha256 = models.CharField(max_length=64, db_index=True)
+    size = models.BigIntegerField()
+    refcount = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.name} ({self.refcount})"
+
+
+class VariantPhoto(auto_prefetch.Model):
+    """ A photo with resized WebP/JPEG variants, generated in the
+        background by the generate_photo_variants worker and stored next
+        to the original. Saving a new file queues its variants again and
+        releases the previous file.
+    """
+    class VariantStatus(models.TextChoices):
+        Pending = "PENDING", _("Pending")
+        Done = "DONE", _("Done")
+        Failed = "FAILED", _("Failed")
+
+    variants = models.JSONField(default=dict, blank=True)
+    variants_status = models.CharField(
+        max_length=10, choices=VariantStatus.choices, default=VariantStatus.Pending)
+    variants_attempts = models.PositiveSmallIntegerField(default=0)
+    # Claimed by a generate_photo_variants worker until then
+    variants_leased_until = models.DateTimeField(null=True, blank=True)
+    # Set by dedupe_photos when the original could not be moved
+    dedupe_failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(auto_prefetch.Model.Meta):
+        abstract = True
+        indexes = [
+            models.Index(fields=['id'], name='%(class)s_variants_pending_idx',
+                         condition=Q(variants_status='PENDING')),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'photo' in instance.__dict__:
+            instance._loaded_photo = instance.photo.name
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_photo, loaded_variants = getattr(self, '_loaded_photo', None), self.variants
+        # A new upload takes a reference even when its content is unchanged
+        replaced = bool(loaded_photo) and (not self.photo._committed or self.photo.name != loaded_photo)
+        if self.photo.name != loaded_photo:
+            self.variants = {}
+            self.variants_status = self.VariantStatus.Pending
+            self.variants_attempts = 0
+            self.variants_leased_until = None
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {
+                    *kwargs['update_fields'], 'variants', 'variants_status', 'variants_attempts',
+                    'variants_leased_until'}
+        super().save(*args, **kwargs)
+        if replaced:
+            release(self.photo.storage, loaded_photo, loaded_variants.values())
+        self._loaded_photo = self.photo.name
+
+    def get_variant_name(self, width: int = None, extension: str = 'webp') -> str:
+        """ Stored name of the smallest variant at least `width` pixels
+            wide, or of the original while there is none.
+        """
+        fitting = [(size, variant) for variant, size in settings.PHOTO_VARIANTS.items()
+                   if width is None or size >= width]
+        for size, variant in sorted(fitting):
+            name = self.variants.get(f'{variant}.{extension}')
+            if name:
+                return name
+        return self.photo.name
+
+    def url(self, width: int = None, extension: str = 'webp') -> str:
+        return f'{settings.GCP_BASE_URL}{self.get_variant_name(width, extension)}'
+
+    def thumbnail(self):
+        if self.photo != '':
+            size = settings.PHOTO_VARIANTS['thumb']
+            return mark_safe(
+                f'<picture><source srcset="{self.url(size)}" type="image/webp" />'
+                f'<img src="{self.url(size, "jpeg")}" width="{size}" height="{size}" '
+                f'style="object-fit: contain" loading="lazy" /></picture>')
+
+
+class CustomerPhoto(VariantPhoto):
     customer = auto_prefetch.ForeignKey(Customer, on_delete=models.CASCADE)
-    photo = models.ImageField(upload_to=customer_photo_path)
+    photo = ContentAddressedImageField(upload_to=customer_photo_path)
 
 
 class ProBusiness(auto_prefetch.Model):
@@ -122,7 +248,7 @@ class ProBusiness(auto_prefetch.Model):
     url = models.CharField(max_length=255, blank=True)
     logo = models.ImageField(
         upload_to="pro_business_logos/", null=True, blank=True)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def get_pro_business_by_user_id(user_id):
         return ProBusiness.objects.filter(pro__user__id=user_id).first()
@@ -134,7 +260,7 @@ class Pro(auto_prefetch.Model):
     user = models.OneToOneField(
         get_user_model(), on_delete=models.CASCADE, null=True)
     business = auto_prefetch.ForeignKey(ProBusiness, on_delete=models.CASCADE)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def __str__(self):
         return f"{self.id} {self.user.first_name} {self.user.last_name} {self.business.name} {self.user.phone}"
@@ -144,7 +270,12 @@ class Pro(auto_prefetch.Model):
 
 class Appointment(auto_prefetch.Model):
     date = models.DateTimeField(default=timezone.now)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
+
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            models.Index(fields=['date'], name='appointment_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return f"{self.id} {self.date}"
@@ -163,6 +294,103 @@ class JobType(auto_prefetch.Model):
     def __str__(self):
         return f"{self.name}"
 
+# Job workflow flags in the order they are normally set, bit i of Job.flags
+# mirrors JOB_LIFECYCLE_FLAGS[i]
+JOB_LIFECYCLE_FLAGS = (
+    'is_customer_confirmed',
+    'is_customer_email_confirmation_sent',
+    'is_plumber_confirmed',
+    'is_parts_ordered',
+    'is_plumber_details_sent',
+    'is_job_customer_approved',
+    'is_payment_received',
+    'is_warranty_info_sent',
+    'is_customer_review_requested',
+    'is_hb_approved',
+    'is_started',
+    'is_pro_finished',
+)
+
+
+class JobStage(models.IntegerChoices):
+    """ First workflow flag a job is waiting on, Finished once the pro is done. """
+    AwaitingCustomerConfirmation = 0, _("Awaiting Customer Confirmation")
+    AwaitingConfirmationEmail = 1, _("Awaiting Confirmation Email")
+    AwaitingPlumberConfirmation = 2, _("Awaiting Plumber Confirmation")
+    AwaitingParts = 3, _("Awaiting Parts")
+    AwaitingPlumberDetails = 4, _("Awaiting Plumber Details")
+    AwaitingCustomerApproval = 5, _("Awaiting Customer Approval")
+    AwaitingPayment = 6, _("Awaiting Payment")
+    AwaitingWarrantyInfo = 7, _("Awaiting Warranty Info")
+    AwaitingReviewRequest = 8, _("Awaiting Review Request")
+    AwaitingHBApproval = 9, _("Awaiting HB Approval")
+    AwaitingStart = 10, _("Awaiting Start")
+    AwaitingFinish = 11, _("Awaiting Finish")
+    Finished = 12, _("Finished")
+
+
+def get_job_flags(values: dict) -> int:
+    return sum(1 << i for i, name in enumerate(JOB_LIFECYCLE_FLAGS) if values[name])
+
+
+def get_job_stage(values: dict) -> int:
+    if values['is_pro_finished']:
+        return JobStage.Finished
+    return next(i for i, name in enumerate(JOB_LIFECYCLE_FLAGS) if not values[name])
+
+
+def job_flags_expression():
+    """ SQL equivalent of get_job_flags, for set based updates. """
+    return sum((Case(When(**{name: True}, then=Value(1 << i)), default=Value(0), output_field=IntegerField())
+                for i, name in enumerate(JOB_LIFECYCLE_FLAGS)), Value(0))
+
+
+def job_stage_expression():
+    """ SQL equivalent of get_job_stage, for set based updates. """
+    return Case(
+        When(is_pro_finished=True, then=Value(JobStage.Finished)),
+        *[When(**{name: False}, then=Value(i)) for i, name in enumerate(JOB_LIFECYCLE_FLAGS)],
+        output_field=IntegerField(),
+    )
+
+
+class JobQuerySet(auto_prefetch.QuerySet):
+    def at_stage(self, *stages: JobStage) -> JobQuerySet:
+        return self.filter(stage__in=stages)
+
+    def awaiting(self, flag: str) -> JobQuerySet:
+        """ Jobs whose next step is `flag`, e.g. awaiting('is_parts_ordered'). """
+        return self.filter(stage=JOB_LIFECYCLE_FLAGS.index(flag))
+
+    def unfinished(self) -> JobQuerySet:
+        return self.filter(stage__lt=JobStage.Finished)
+
+    def with_flags(self, *flags: str) -> JobQuerySet:
+        """ Jobs with all of `flags` set, in any stage. """
+        mask = get_job_flags({name: name in flags for name in JOB_LIFECYCLE_FLAGS})
+        return self.annotate(masked_flags=F('flags').bitand(mask)).filter(masked_flags=mask)
+
+    def sync_lifecycle(self) -> int:
+        """ Recompute stage and flags after updates that bypass Job.save. """
+        return self.update(stage=job_stage_expression(), flags=job_flags_expression())
+
+
+class ArraySubquery(Subquery):
+    """ ARRAY(subquery), django.contrib.postgres.expressions.ArraySubquery
+        only ships with Django 4.0.
+    """
+    template = 'ARRAY(%(subquery)s)'
+
+
+def count_subquery(queryset: QuerySet, field: str) -> Coalesce:
+    """ Row count of a queryset filtered on `field` = OuterRef, without
+        joining it into the outer query.
+    """
+    return Coalesce(Subquery(
+        queryset.order_by().values(field).annotate(count=Count('pk')).values('count'),
+        output_field=IntegerField()), 0)
+
+
 class Job(auto_prefetch.Model):
     customer = auto_prefetch.ForeignKey(Customer, on_delete=models.CASCADE)
     address = auto_prefetch.ForeignKey(JobAddress, on_delete=models.CASCADE, null=True)
@@ -186,18 +414,99 @@ class Job(auto_prefetch.Model):
     is_hb_approved = models.BooleanField(default=False)
     is_started = models.BooleanField(default=False)
     is_pro_finished = models.BooleanField(default=False)
-    history = HistoricalRecords()
+    completed_at = models.DateTimeField(null=True, blank=True)
+    # Derived from the workflow flags above on every save
+    stage = models.SmallIntegerField(
+        choices=JobStage.choices, default=JobStage.AwaitingCustomerConfirmation)
+    flags = models.IntegerField(default=0)
+    history = BufferedHistoricalRecords()
+
+    objects = auto_prefetch.Manager.from_queryset(JobQuerySet)()
+
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            # get_all_open only ever reads unfinished jobs
+            models.Index(fields=['appointment'], name='job_open_appointment_idx',
+                         condition=Q(is_pro_finished=False)),
+            # get_all_completed, newest first, read backwards
+            models.Index(fields=['completed_at', 'id'], name='job_completed_at_idx',
+                         condition=Q(is_pro_finished=True)),
+            # Ops dashboards and sweepers only look at jobs still in progress
+            models.Index(fields=['stage', 'appointment'], name='job_stage_idx',
+                         condition=Q(stage__lt=JobStage.Finished)),
+        ]
+
+    def save(self, *args, **kwargs):
+        # completed_at, stage and flags follow the workflow flags however
+        # the job is saved
+        changed = []
+        if self.sync_completed_at():
+            changed.append('completed_at')
+        if self.sync_lifecycle():
+            changed.extend(['stage', 'flags'])
+        if changed and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *changed}
+        super().save(*args, **kwargs)
+
+    def sync_lifecycle(self) -> bool:
+        values = {name: getattr(self, name) for name in JOB_LIFECYCLE_FLAGS}
+        stage, flags = get_job_stage(values), get_job_flags(values)
+        if (stage, flags) == (self.stage, self.flags):
+            return False
+        self.stage, self.flags = stage, flags
+        return True
+
+    def sync_completed_at(self) -> bool:
+        """ Stamp or clear completed_at to match is_pro_finished, returns
+            whether it changed.
+        """
+        if self.is_pro_finished and self.completed_at is None:
+            self.completed_at = timezone.now()
+            return True
+        if not self.is_pro_finished and self.completed_at is not None:
+            self.completed_at = None
+            return True
+        return False
 
     def __str__(self):
         return f"{self.id} - {self.customer.first_name} {self.customer.last_name} @ {self.address.city} - {self.type} - {self.pro_business.name if self.pro_business else 'None'}"
 
+    @staticmethod
+    def with_summaries(queryset: QuerySet[Job]) -> QuerySet[Job]:
+        """ Annotate photo_count, first_photos (the first
+            JOB_LIST_PHOTO_COUNT photo paths), first_photo_thumbs (their
+            thumb variants, or the originals until generated),
+            material_list_count and material_list_order_numbers, each as a
+            correlated subquery so a job list stays one query however many
+            jobs it has.
+        """
+        photos = JobPhoto.objects.filter(job=OuterRef('pk'))
+        material_lists = MaterialList.objects.filter(job=OuterRef('pk'))
+
+        return queryset.annotate(
+            photo_count=count_subquery(photos, 'job'),
+            first_photos=ArraySubquery(
+                photos.order_by('id').values('photo')[:settings.JOB_LIST_PHOTO_COUNT],
+                output_field=ArrayField(models.CharField())),
+            first_photo_thumbs=ArraySubquery(
+                photos.order_by('id').annotate(
+                    thumb=Coalesce(KeyTextTransform('thumb.webp', 'variants'), 'photo',
+                                   output_field=models.CharField())
+                ).values('thumb')[:settings.JOB_LIST_PHOTO_COUNT],
+                output_field=ArrayField(models.CharField())),
+            material_list_count=count_subquery(material_lists, 'job'),
+            material_list_order_numbers=ArraySubquery(
+                material_lists.exclude(order_number='').order_by('id').values('order_number'),
+                output_field=ArrayField(models.CharField())),
+        )
+
     @staticmethod
     def get_all_completed(user_id: int = 0) -> QuerySet[Job]:
-        queryset = (
+        queryset = Job.with_summaries(
             Job.objects
             .select_related("type")
             .filter(is_pro_finished=True)
-            .order_by("appointment__date")
+            .order_by("-completed_at", "-id")
         )
 
         if user_id != 0:
@@ -207,7 +516,7 @@ class Job(auto_prefetch.Model):
 
     @staticmethod
     def get_all_open(user_id: int = 0) -> QuerySet[Job]:
-        queryset = (
+        queryset = Job.with_summaries(
             Job.objects
             .select_related(
                 "type",
@@ -241,11 +550,24 @@ class Job(auto_prefetch.Model):
         return queryset.get(pk=pk)
 
     def has_photos(self):
+        if hasattr(self, 'photo_count'):
+            return self.photo_count > 0
         return JobPhoto.objects.filter(job=self).exists()
 
+    def first_photo_urls(self, thumbnails: bool = False) -> List[str]:
+        annotation = 'first_photo_thumbs' if thumbnails else 'first_photos'
+        if hasattr(self, annotation):
+            return [f'{settings.GCP_BASE_URL}{photo}' for photo in getattr(self, annotation)]
+        photos = JobPhoto.objects.filter(job=self).order_by('id')[:settings.JOB_LIST_PHOTO_COUNT]
+        return [photo.url(settings.PHOTO_VARIANTS['thumb']) if thumbnails
+                else f'{settings.GCP_BASE_URL}{photo.photo}' for photo in photos]
+
     def completion_date(self) -> str:
+        if self.completed_at is not None:
+            return str(self.completed_at.replace(tzinfo=None))
+        # Not backfilled yet, see `manage.py backfill_job_completed_at`
         try:
-            return str(self.history.filter(Q(id=self.id) & Q(is_pro_finished=True)).order_by("id").first().history_date.replace(tzinfo=None))
+            return str(self.history.filter(Q(id=self.id) & Q(is_pro_finished=True)).order_by("history_date").first().history_date.replace(tzinfo=None))
         except:
             return str(datetime.now().replace(tzinfo=None))
 
@@ -258,7 +580,8 @@ class Job(auto_prefetch.Model):
 
         self.is_pro_finished = True
         self.is_started = True
-        self.save(update_fields=['is_pro_finished', 'is_started'])
+        self.completed_at = timezone.now()
+        self.save(update_fields=['is_pro_finished', 'is_started', 'completed_at'])
 
 
 @receiver(post_save, sender=Job, dispatch_uid="post_job_to_slack")
@@ -292,7 +615,7 @@ class JobIssue(auto_prefetch.Model):
     issue = models.IntegerField(choices=IssueType.choices)
     notes = models.TextField(max_length=255, null=True, blank=True)
     date = models.DateTimeField(default=timezone.now)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
 
 @receiver(post_save, sender=JobIssue, dispatch_uid="post_job_issue_to_slack")
@@ -314,7 +637,7 @@ class JobNote(auto_prefetch.Model):
     note = RichTextField(blank=True, null=True)
     job = auto_prefetch.ForeignKey(
         Job, on_delete=models.CASCADE, related_name='job_notes')
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def __str__(self):
         return f"{self.id} {self.note}"
@@ -324,10 +647,10 @@ def job_photo_path(instance, filename):
     return f"uploads/{hashlib.shake_256(directory_name).hexdigest(10)}/{datetime.now().strftime('%Y%m%d-%H%M%S')}-{filename}"
 
 
-class JobPhoto(auto_prefetch.Model):
+class JobPhoto(VariantPhoto):
     job = auto_prefetch.ForeignKey(Job, on_delete=models.CASCADE,
                                    related_name='job_photos')
-    photo = models.ImageField(upload_to=job_photo_path)
+    photo = ContentAddressedImageField(upload_to=job_photo_path)
 
     def __str__(self) -> str:
         return f"id: {self.id} job: {self.job}"
@@ -341,9 +664,12 @@ class JobPhoto(auto_prefetch.Model):
     def remove_photo_by_id(photoId):
         JobPhoto.objects.filter(id=photoId).delete()
 
-    def thumbnail(self):
-        if self.photo != '':
-            return mark_safe('<img src="%s%s" width="150" height="150" />' % (f'{settings.GCP_BASE_URL}', self.photo))
+
+@receiver(post_delete, sender=CustomerPhoto, dispatch_uid="release_deleted_customer_photo")
+@receiver(post_delete, sender=JobPhoto, dispatch_uid="release_deleted_job_photo")
+def post_photo_deleted(sender, instance, **kwargs):
+    if instance.photo:
+        release(instance.photo.storage, instance.photo.name, instance.variants.values())
 
 
 def post_news_photos(new_photo_urls, job=Job):
@@ -372,7 +698,7 @@ class SupplyHouse(auto_prefetch.Model):
     url = models.CharField(max_length=255, null=True)
     logo = models.ImageField(
         upload_to="supplier_logos/", blank=True, null=True)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def __str__(self):
         return f"id: {self.id} name: {self.name} address: {self.address}"
@@ -396,3 +722,56 @@ class  MaterialListIssue(auto_prefetch.Model):
     material_list = auto_prefetch.ForeignKey(MaterialList, on_delete=models.CASCADE,  null=True)
     date = models.DateTimeField(default=timezone.now)
     user = auto_prefetch.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+
+
+class UploadSession(auto_prefetch.Model):
+    """ A resumable upload, sent as numbered parts of `part_size` bytes
+        that are kept in storage until the upload is completed.
+    """
+    class Target(models.TextChoices):
+        JobPhoto = "JOB_PHOTO", _("Job photo")
+        CustomerPhoto = "CUSTOMER_PHOTO", _("Customer photo")
+        Receipt = "RECEIPT", _("Material list receipt")
+
+    class Status(models.TextChoices):
+        Open = "OPEN", _("Open")
+        Completing = "COMPLETING", _("Completing")
+        Complete = "COMPLETE", _("Complete")
+        Aborted = "ABORTED", _("Aborted")
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = auto_prefetch.ForeignKey(get_user_model(), on_delete=models.CASCADE)
+    target = models.CharField(max_length=20, choices=Target.choices)
+    object_id = models.PositiveIntegerField()
+    filename = models.CharField(max_length=255)
+    size = models.PositiveIntegerField()
+    part_size = models.PositiveIntegerField()
+    parts = ArrayField(models.PositiveIntegerField(), default=list, blank=True)
+    content_type = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.Open)
+    result_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # A completion in progress, a retry after this time takes it over
+    completing_until = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            models.Index(fields=['created_at'], name='upload_open_idx',
+                         condition=Q(status='OPEN')),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.id} {self.target} {self.object_id} {self.status}"
+
+    @property
+    def part_count(self) -> int:
+        return max(1, -(-self.size // self.part_size))
+
+    def expected_part_size(self, index: int) -> int:
+        if index < self.part_count - 1:
+            return self.part_size
+        return self.size - self.part_size * (self.part_count - 1)
+
+    def missing_parts(self) -> List[int]:
+        return sorted(set(range(self.part_count)) - set(self.parts))
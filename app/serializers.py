@@ -0,0 +1,21 @@
+from django.conf import settings
+from rest_framework import serializers
+
+from app.models import UploadSession
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    missing_parts = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'target', 'object_id', 'filename', 'size', 'part_size', 'parts',
+                  'missing_parts', 'content_type', 'status', 'result_id']
+        read_only_fields = ['id', 'part_size', 'parts', 'content_type', 'status', 'result_id']
+
+    def validate_size(self, size: int) -> int:
+        if size < 1:
+            raise serializers.ValidationError('Uploads cannot be empty.')
+        if size > settings.MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(f'Uploads are limited to {settings.MAX_UPLOAD_SIZE} bytes.')
+        return size
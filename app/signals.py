@@ -1,9 +1,5 @@
-from django.dispatch import receiver
-from django.db.backends.signals import connection_created
-from django.contrib.auth.models import Group
+from accounts.models import bootstrap_pro_group
 
 
-@receiver(connection_created)
-def on_connection_created(sender, connection, **kwargs):
-    pro_group, created = Group.objects.get_or_create(name="pro")
-    
\ No newline at end of file
+def on_post_migrate(sender, using="default", **kwargs):
+    bootstrap_pro_group(using=using)
@@ -2,8 +2,10 @@ import logging
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.management import call_command
-from django.contrib.auth.models import Group
+from django.db import transaction
 
+from accounts.models import get_pro_group_id
+from app.helper.history import buffered_history
 from app.models import (
     JobType,
     Pro,
@@ -32,7 +34,7 @@ def insert_products_from_catalog():
 
 def insert_test_users():
     us1 = Faker(["en_US"])
-    pro, pro_created = Group.objects.get_or_create(name="pro")
+    pro_group_id = get_pro_group_id()
 
     pro_user = (
         get_user_model().objects.filter(username="test-hb+pro@homebreeze.com").first()
@@ -48,7 +50,7 @@ def insert_test_users():
         if pro_user:
             pro_user.set_password(settings.TEST_PW)
             pro_user.save()
-            pro_user.groups.add(pro)
+            pro_user.groups.add(pro_group_id)
 
     pro = Pro.objects.filter(user__last_name="McHanderson").first()
 
@@ -66,36 +68,37 @@ def insert_test_users():
 
 
 def insert_test_data():
-    pro_business = ProBusiness.objects.get(name="Pipes N'at")
-    for i in range(20):
-        customer_lead = CustomerLeadFactory.create()
-        ProductCriteriaFactory.create(customer_lead=customer_lead)
-
-        product_catalog = ProductCatalog.objects.order_by('?').first()
-        selected_product = SelectedProductFactory.create(
-            customer_lead=customer_lead, product_catalog=product_catalog)
-        customer_address = CustomerAddressFactory.create()
-        appointment = AppointmentFactory.create()
-        customer = CustomerFactory.create(address=customer_address, lead=customer_lead)
-        job_address = JobAddressFactory.create(**(CustomerAddressSerializer(customer_address).data))
-
-        job = JobFactory.create(
-            customer=customer, address=job_address, appointment=appointment,
-            type=None, scope=None, pro_business=None, is_pro_finished=False, job_created__no_invoice=True)
-        order = OrderFactory.create(
-            customer=customer, appointment=appointment, selected_product=selected_product)
-
-        if(i > 5):
-            job_type = JobType.objects.order_by('?').first()
-            supply_house = SupplyHouse.objects.order_by('?').first()
-
-            job.type = job_type
-            job.scope = job_type.scope
-            job.save()
-            if(i > 10):
-                MaterialListFactory.create(job=job, supply_house=supply_house)
-                job.pro_business = pro_business
+    with transaction.atomic(), buffered_history():
+        pro_business = ProBusiness.objects.get(name="Pipes N'at")
+        for i in range(20):
+            customer_lead = CustomerLeadFactory.create()
+            ProductCriteriaFactory.create(customer_lead=customer_lead)
+
+            product_catalog = ProductCatalog.objects.order_by('?').first()
+            selected_product = SelectedProductFactory.create(
+                customer_lead=customer_lead, product_catalog=product_catalog)
+            customer_address = CustomerAddressFactory.create()
+            appointment = AppointmentFactory.create()
+            customer = CustomerFactory.create(address=customer_address, lead=customer_lead)
+            job_address = JobAddressFactory.create(**(CustomerAddressSerializer(customer_address).data))
+
+            job = JobFactory.create(
+                customer=customer, address=job_address, appointment=appointment,
+                type=None, scope=None, pro_business=None, is_pro_finished=False, job_created__no_invoice=True)
+            order = OrderFactory.create(
+                customer=customer, appointment=appointment, selected_product=selected_product)
+
+            if(i > 5):
+                job_type = JobType.objects.order_by('?').first()
+                supply_house = SupplyHouse.objects.order_by('?').first()
+
+                job.type = job_type
+                job.scope = job_type.scope
                 job.save()
-                if(i > 15):
-                    job.is_pro_finished = True
+                if(i > 10):
+                    MaterialListFactory.create(job=job, supply_house=supply_house)
+                    job.pro_business = pro_business
                     job.save()
+                    if(i > 15):
+                        job.is_pro_finished = True
+                        job.save()
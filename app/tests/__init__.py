@@ -1 +1,8 @@
 from .base import *
+from .blobs import *
+from .history import *
+from .jobs import *
+from .photos import *
+from .segment import *
+from .slack import *
+from .uploads import *
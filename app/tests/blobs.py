@@ -0,0 +1,124 @@
+from io import StringIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+
+from app.helper.blobs import dedupe_photo
+from app.models import JobPhoto, StoredObject, job_photo_path
+from pro.tests.factories import JobFactory
+
+PHOTO = b'\xff\xd8\xff\xe0 the same photo bytes'
+
+
+class ContentAddressedPhotoTests(TestCase):
+    def setUp(self):
+        self.job = JobFactory.create()
+
+    def test_identical_uploads_share_one_stored_object(self):
+        first = JobPhoto.add_photo(self.job, SimpleUploadedFile('IMG_1.JPG', PHOTO))
+        second = JobPhoto.add_photo(self.job, SimpleUploadedFile('IMG_1 (1).JPG', PHOTO))
+
+        self.assertEqual(first.photo.name, second.photo.name)
+        self.assertTrue(first.photo.name.endswith('.jpg'))
+        self.assertEqual(StoredObject.objects.get(name=first.photo.name).refcount, 2)
+
+        other_job_photo = JobPhoto.add_photo(JobFactory.create(), SimpleUploadedFile('IMG_1.JPG', PHOTO))
+        self.assertNotEqual(other_job_photo.photo.name, first.photo.name)
+
+    def test_file_is_deleted_with_its_last_reference(self):
+        first = JobPhoto.add_photo(self.job, SimpleUploadedFile('photo.jpg', PHOTO))
+        second = JobPhoto.add_photo(self.job, SimpleUploadedFile('photo.jpg', PHOTO))
+        name = first.photo.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            JobPhoto.remove_photo_by_id(first.id)
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(StoredObject.objects.get(name=name).refcount, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(StoredObject.objects.filter(name=name).exists())
+
+    def test_file_acquired_again_before_commit_is_kept(self):
+        photo = JobPhoto.add_photo(self.job, SimpleUploadedFile('photo.jpg', PHOTO))
+        name = photo.photo.name
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            photo.delete()
+        self.assertFalse(StoredObject.objects.filter(name=name).exists())
+
+        again = JobPhoto.add_photo(self.job, SimpleUploadedFile('photo.jpg', PHOTO))
+        self.assertEqual(again.photo.name, name)
+        for callback in callbacks:
+            callback()
+
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(StoredObject.objects.get(name=name).refcount, 1)
+
+    def test_replacing_a_photo_releases_the_old_file(self):
+        photo = JobPhoto.add_photo(self.job, SimpleUploadedFile('photo.jpg', PHOTO))
+        name = photo.photo.name
+
+        photo.photo = SimpleUploadedFile('photo.jpg', PHOTO + b' edited')
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.save()
+
+        self.assertNotEqual(photo.photo.name, name)
+        self.assertFalse(default_storage.exists(name))
+
+    def test_existing_duplicates_are_merged(self):
+        legacy_names = [
+            default_storage.save(job_photo_path(JobPhoto(job=self.job), f'photo-{i}.jpg'), ContentFile(PHOTO))
+            for i in range(2)
+        ]
+        photos = [JobPhoto.objects.create(job=self.job, photo=name) for name in legacy_names]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('dedupe_photos', stdout=StringIO())
+
+        names = {photo.photo.name for photo in JobPhoto.objects.filter(pk__in=[photo.pk for photo in photos])}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertEqual(StoredObject.objects.get(name=name).refcount, 2)
+        self.assertTrue(default_storage.exists(name))
+        for legacy_name in legacy_names:
+            self.assertFalse(default_storage.exists(legacy_name))
+
+    def test_photo_replaced_during_the_dedupe_is_left_alone(self):
+        legacy_name = default_storage.save(job_photo_path(JobPhoto(job=self.job), 'photo.jpg'), ContentFile(PHOTO))
+        photo = JobPhoto.objects.create(job=self.job, photo=legacy_name)
+        stale = JobPhoto.objects.get(pk=photo.pk)
+
+        photo.photo = SimpleUploadedFile('photo.jpg', PHOTO + b' edited')
+        photo.save()
+
+        self.assertEqual(dedupe_photo(stale), 0)
+        photo.refresh_from_db()
+        self.assertNotEqual(photo.photo.name, legacy_name)
+        self.assertEqual(StoredObject.objects.get().name, photo.photo.name)
+        self.assertEqual(StoredObject.objects.get().refcount, 1)
+
+    def test_missing_files_do_not_stop_the_dedupe(self):
+        missing = JobPhoto.objects.create(job=self.job, photo='uploads/missing/photo.jpg')
+        legacy_name = default_storage.save(job_photo_path(JobPhoto(job=self.job), 'photo.jpg'), ContentFile(PHOTO))
+        photo = JobPhoto.objects.create(job=self.job, photo=legacy_name)
+
+        stdout = StringIO()
+        with self.assertLogs('app.management.commands.dedupe_photos', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('dedupe_photos', stdout=stdout)
+
+        self.assertIn('JobPhoto: 1 moved, 0 duplicates, 0 bytes freed, 1 failed', stdout.getvalue())
+        missing.refresh_from_db()
+        photo.refresh_from_db()
+        self.assertEqual(missing.photo.name, 'uploads/missing/photo.jpg')
+        self.assertIsNotNone(missing.dedupe_failed_at)
+        self.assertTrue(StoredObject.objects.filter(name=photo.photo.name).exists())
+
+        stdout = StringIO()
+        call_command('dedupe_photos', limit=1, stdout=stdout)
+        self.assertIn('JobPhoto: 0 moved, 0 duplicates, 0 bytes freed, 0 failed', stdout.getvalue())
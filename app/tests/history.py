@@ -0,0 +1,147 @@
+import csv
+import gzip
+import os
+import tempfile
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from simple_history.signals import post_create_historical_record, pre_create_historical_record
+
+from app.helper.history import buffered_history, get_history_buffer
+from app.helper.retention import archive_table, compact_table, get_retention_cutoff
+from app.models import Appointment
+from booking.tests.factories import ProductFactory
+
+
+class BufferedHistoryTests(TestCase):
+    def test_records_are_written_in_one_insert(self):
+        with CaptureQueriesContext(connection) as queries, buffered_history():
+            appointments = [Appointment.objects.create() for _ in range(5)]
+            self.assertEqual(Appointment.history.count(), 0)
+
+        history_inserts = [query for query in queries.captured_queries
+                           if query['sql'].startswith('INSERT INTO "app_historicalappointment"')]
+        self.assertEqual(len(history_inserts), 1)
+        self.assertEqual(Appointment.history.filter(history_type='+').count(), 5)
+        self.assertEqual(
+            set(Appointment.history.values_list('id', flat=True)),
+            {appointment.id for appointment in appointments})
+
+    def test_records_are_dropped_when_the_block_raises(self):
+        with self.assertRaises(ValueError), transaction.atomic(), buffered_history():
+            Appointment.objects.create()
+            raise ValueError()
+
+        self.assertIsNone(get_history_buffer())
+        self.assertEqual(Appointment.history.count(), 0)
+
+    def test_nested_blocks_share_the_outer_buffer(self):
+        with buffered_history() as outer:
+            with buffered_history() as inner:
+                Appointment.objects.create()
+            self.assertIs(inner, outer)
+            self.assertEqual(Appointment.history.count(), 0)
+
+        self.assertEqual(Appointment.history.count(), 1)
+
+    def test_buffered_records_send_the_history_signals(self):
+        received = []
+
+        def receiver(signal, history_instance, **kwargs):
+            received.append((signal, history_instance.pk))
+
+        pre_create_historical_record.connect(receiver)
+        post_create_historical_record.connect(receiver)
+        self.addCleanup(pre_create_historical_record.disconnect, receiver)
+        self.addCleanup(post_create_historical_record.disconnect, receiver)
+
+        with buffered_history():
+            Appointment.objects.create()
+            self.assertEqual(received, [(pre_create_historical_record, None)])
+
+        self.assertEqual(received[1], (post_create_historical_record, Appointment.history.get().pk))
+
+    def test_saves_outside_a_block_write_immediately(self):
+        Appointment.objects.create()
+
+        self.assertEqual(Appointment.history.count(), 1)
+
+
+@override_settings(HISTORY_DIFF=True)
+class HistoryDiffTests(TestCase):
+    def test_unchanged_save_writes_no_record(self):
+        appointment = Appointment.objects.create()
+        appointment.save()
+
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.save()
+
+        self.assertEqual(list(Appointment.history.values_list('history_type', flat=True)), ['+'])
+
+    def test_changed_save_writes_a_record(self):
+        appointment = Appointment.objects.create()
+        appointment.date += timedelta(days=1)
+        appointment.save()
+        appointment.save()
+
+        self.assertEqual(Appointment.history.filter(history_type='~').count(), 1)
+
+    def test_in_place_changes_are_recorded(self):
+        product = ProductFactory.create(bathroom_coverages=[1, 2])
+        product = type(product).objects.get(pk=product.pk)
+        product.bathroom_coverages.append(3)
+        product.save()
+
+        self.assertEqual(product.history.filter(history_type='~').count(), 1)
+
+    def test_deferred_instances_are_always_recorded(self):
+        appointment = Appointment.objects.create()
+
+        Appointment.objects.only('id').get(pk=appointment.pk).save()
+
+        self.assertEqual(Appointment.history.filter(history_type='~').count(), 1)
+
+
+class HistoryRetentionTests(TestCase):
+    def test_compaction_keeps_the_first_of_unchanged_versions(self):
+        appointment = Appointment.objects.create()
+        appointment.save()
+        appointment.save()
+        appointment.date += timedelta(days=1)
+        appointment.save()
+        appointment.save()
+
+        self.assertEqual(compact_table(Appointment.history.model, dry_run=True), 3)
+        self.assertEqual(compact_table(Appointment.history.model, batch_size=1), 3)
+
+        self.assertEqual(
+            list(Appointment.history.order_by('history_date').values_list('history_type', flat=True)),
+            ['+', '~'])
+
+    def test_compaction_keeps_versions_with_a_change_reason(self):
+        appointment = Appointment.objects.create()
+        appointment._change_reason = 'Rescheduled by phone'
+        appointment.save()
+
+        self.assertEqual(compact_table(Appointment.history.model), 0)
+
+    def test_expired_history_is_exported_then_deleted(self):
+        expired, kept = Appointment.objects.create(), Appointment.objects.create()
+        cutoff = get_retention_cutoff(12)
+        Appointment.history.filter(id=expired.id).update(history_date=timezone.now() - timedelta(days=800))
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            archived = archive_table(Appointment.history.model, output_dir, cutoff)
+
+            self.assertEqual(len(archived), 1)
+            path, rows = archived[0]
+            self.assertEqual(rows, 1)
+            with gzip.open(path, 'rt') as file:
+                records = list(csv.DictReader(file))
+            self.assertEqual([int(record['id']) for record in records], [expired.id])
+            self.assertTrue(path.startswith(os.path.join(output_dir, 'app_historicalappointment')))
+
+        self.assertEqual(list(Appointment.history.values_list('id', flat=True)), [kept.id])
@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from app.management.commands.explain_hot_queries import get_hot_queries
+from app.models import JOB_LIFECYCLE_FLAGS, Job, JobPhoto, JobStage, MaterialList
+from pro.tests.factories import JobFactory
+
+
+@override_settings(SLACK_OUTBOX=True)
+class JobCompletedAtTests(TestCase):
+    def test_complete_sets_completed_at(self):
+        job = JobFactory.create(is_pro_finished=False)
+        self.assertIsNone(job.completed_at)
+
+        job.complete()
+
+        job.refresh_from_db()
+        self.assertIsNotNone(job.completed_at)
+        self.assertEqual(job.completion_date(), str(job.completed_at.replace(tzinfo=None)))
+
+    def test_reopening_clears_completed_at(self):
+        job = JobFactory.create(is_pro_finished=False)
+        job.complete()
+
+        job.is_pro_finished = False
+        job.save(update_fields=['is_pro_finished'])
+
+        job.refresh_from_db()
+        self.assertIsNone(job.completed_at)
+
+    def test_completed_list_is_newest_first(self):
+        jobs = JobFactory.create_batch(3, is_pro_finished=False)
+        for job in jobs:
+            job.complete()
+
+        self.assertEqual(list(Job.get_all_completed()), jobs[::-1])
+
+    def test_completed_list_reads_the_completed_at_index(self):
+        JobFactory.create(is_pro_finished=False).complete()
+
+        with connection.cursor() as cursor:
+            # The test tables are small enough for a sequential scan
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = get_hot_queries()['completed_jobs'].explain()
+
+        self.assertIn('job_completed_at_idx', plan)
+        self.assertNotIn('Sort Key: app_job.completed_at', plan)
+
+    def test_backfill_from_history(self):
+        job = JobFactory.create(is_pro_finished=False)
+        job.complete()
+        finished_at = job.history.filter(is_pro_finished=True).order_by('history_date').first().history_date
+        Job.objects.filter(id=job.id).update(completed_at=None)
+
+        with self.assertNumQueries(1):
+            call_command('backfill_job_completed_at', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual(job.completed_at, finished_at)
+
+
+@override_settings(JOB_LIST_PHOTO_COUNT=2, GCP_BASE_URL="https://storage.test/")
+class JobSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for photo_count in range(3):
+            job = JobFactory.create(is_pro_finished=False)
+            for i in range(photo_count):
+                JobPhoto.objects.create(job=job, photo=f"uploads/{job.id}-{i}.jpg")
+            MaterialList.objects.create(job=job, order_number=f"PO-{job.id}")
+
+    def test_job_board_queries_are_constant(self):
+        with self.assertNumQueries(2):
+            jobs = list(Job.get_all_open())
+            summaries = [(job.has_photos(), job.first_photo_urls(), job.material_list_count)
+                         for job in jobs]
+
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(sorted(job.photo_count for job in jobs), [0, 1, 2])
+        for job, (has_photos, photo_urls, material_list_count) in zip(jobs, summaries):
+            self.assertEqual(has_photos, job.photo_count > 0)
+            self.assertEqual(photo_urls, [f"https://storage.test/uploads/{job.id}-{i}.jpg"
+                                          for i in range(job.photo_count)])
+            self.assertEqual(material_list_count, 1)
+            self.assertEqual(job.material_list_order_numbers, [f"PO-{job.id}"])
+
+
+@override_settings(SLACK_OUTBOX=True)
+class JobLifecycleTests(TestCase):
+    def test_stage_follows_flags(self):
+        job = JobFactory.create(**{name: False for name in JOB_LIFECYCLE_FLAGS})
+        self.assertEqual(job.stage, JobStage.AwaitingCustomerConfirmation)
+
+        job.is_customer_confirmed = True
+        job.is_customer_email_confirmation_sent = True
+        job.save(update_fields=['is_customer_confirmed', 'is_customer_email_confirmation_sent'])
+
+        job.refresh_from_db()
+        self.assertEqual(job.stage, JobStage.AwaitingPlumberConfirmation)
+        self.assertEqual(job.flags, 0b11)
+        self.assertEqual(list(Job.objects.awaiting('is_plumber_confirmed')), [job])
+        self.assertEqual(list(Job.objects.with_flags('is_customer_confirmed')), [job])
+
+        job.complete()
+        job.refresh_from_db()
+        self.assertEqual(job.stage, JobStage.Finished)
+        self.assertFalse(Job.objects.unfinished().exists())
+
+    def test_sync_after_queryset_update(self):
+        job = JobFactory.create(**{name: False for name in JOB_LIFECYCLE_FLAGS})
+        Job.objects.filter(id=job.id).update(is_customer_confirmed=True, is_parts_ordered=True)
+
+        Job.objects.sync_lifecycle()
+
+        job.refresh_from_db()
+        self.assertEqual(job.stage, JobStage.AwaitingConfirmationEmail)
+        self.assertEqual(job.flags, 0b1001)
@@ -0,0 +1,112 @@
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from app.helper.images import generate_pending_variants
+from app.models import Job, JobPhoto
+from pro.tests.factories import JobFactory
+
+
+def image_upload(name='photo.jpg', size=(1600, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, format='JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(PHOTO_VARIANTS={'thumb': 150, 'medium': 800}, GCP_BASE_URL='https://storage.test/')
+class PhotoVariantTests(TestCase):
+    def setUp(self):
+        self.job = JobFactory.create()
+
+    def test_variants_are_stored_next_to_the_original(self):
+        photo = JobPhoto.add_photo(self.job, image_upload())
+        self.assertEqual(photo.variants_status, JobPhoto.VariantStatus.Pending)
+
+        self.assertEqual(generate_pending_variants(JobPhoto), (1, 0))
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants_status, JobPhoto.VariantStatus.Done)
+        self.assertEqual(set(photo.variants), {'thumb.webp', 'thumb.jpeg', 'medium.webp', 'medium.jpeg'})
+        root = photo.photo.name.rsplit('.', 1)[0]
+        self.assertEqual(photo.variants['thumb.webp'], f'{root}.thumb.webp')
+        with photo.photo.storage.open(photo.variants['thumb.jpeg']) as file:
+            self.assertEqual(Image.open(file).size, (150, 75))
+
+    def test_smallest_fitting_variant_is_served(self):
+        photo = JobPhoto.add_photo(self.job, image_upload())
+        self.assertEqual(photo.url(100), f'https://storage.test/{photo.photo.name}')
+
+        generate_pending_variants(JobPhoto)
+        photo.refresh_from_db()
+
+        self.assertEqual(photo.url(100), f"https://storage.test/{photo.variants['thumb.webp']}")
+        self.assertEqual(photo.url(400, 'jpeg'), f"https://storage.test/{photo.variants['medium.jpeg']}")
+        self.assertEqual(photo.url(2000), f'https://storage.test/{photo.photo.name}')
+
+    def test_job_lists_annotate_thumbnails(self):
+        photo = JobPhoto.add_photo(self.job, image_upload())
+        generate_pending_variants(JobPhoto)
+        photo.refresh_from_db()
+
+        job = Job.with_summaries(Job.objects.filter(pk=self.job.pk)).get()
+
+        self.assertEqual(job.first_photo_urls(thumbnails=True),
+                         [f"https://storage.test/{photo.variants['thumb.webp']}"])
+        self.assertEqual(self.job.first_photo_urls(thumbnails=True), job.first_photo_urls(thumbnails=True))
+
+    def test_new_file_queues_variants_again(self):
+        photo = JobPhoto.add_photo(self.job, image_upload())
+        generate_pending_variants(JobPhoto)
+        photo.refresh_from_db()
+
+        photo.save()
+        self.assertEqual(photo.variants_status, JobPhoto.VariantStatus.Done)
+
+        photo.photo = image_upload('other.jpg', size=(800, 400))
+        photo.save()
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants_status, JobPhoto.VariantStatus.Pending)
+        self.assertEqual(photo.variants, {})
+
+    def test_photo_replaced_while_rendering_keeps_its_new_file(self):
+        photo = JobPhoto.add_photo(self.job, image_upload())
+
+        def replace(field_file):
+            JobPhoto.objects.filter(pk=photo.pk).update(photo='uploads/replaced.jpg')
+            return {}
+
+        with mock.patch('app.helper.images.generate_variants', replace):
+            generate_pending_variants(JobPhoto)
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.photo.name, 'uploads/replaced.jpg')
+        self.assertEqual(photo.variants_status, JobPhoto.VariantStatus.Pending)
+        self.assertEqual(photo.variants_attempts, 0)
+
+    def test_claimed_photos_are_skipped_by_other_workers(self):
+        photo = JobPhoto.add_photo(self.job, image_upload())
+        concurrent = []
+
+        def generate(field_file):
+            concurrent.append(generate_pending_variants(JobPhoto))
+            return {}
+
+        with mock.patch('app.helper.images.generate_variants', generate):
+            self.assertEqual(generate_pending_variants(JobPhoto), (1, 0))
+
+        self.assertEqual(concurrent, [(0, 0)])
+        photo.refresh_from_db()
+        self.assertIsNone(photo.variants_leased_until)
+
+    def test_files_that_are_not_images_fail(self):
+        photo = JobPhoto.add_photo(self.job, SimpleUploadedFile('photo.jpg', b'not an image'))
+
+        self.assertEqual(generate_pending_variants(JobPhoto), (0, 1))
+
+        photo.refresh_from_db()
+        self.assertEqual(photo.variants_status, JobPhoto.VariantStatus.Failed)
+        self.assertEqual(photo.url(100), f'https://storage.test/{photo.photo.name}')
@@ -0,0 +1,31 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+
+from app.helper.segment import IdentifyPipeline
+from booking.tests.factories import CustomerLeadFactory
+from pro.tests.factories import CustomerFactory
+
+
+@override_settings(SEGMENT_IDENTIFY_PIPELINE=True, SEGMENT_IDENTIFY_WINDOW=60)
+class IdentifyPipelineTests(TestCase):
+    @mock.patch('app.helper.segment.analytics')
+    def test_saves_are_coalesced_into_one_identify(self, analytics):
+        pipeline = IdentifyPipeline()
+        customer = CustomerFactory.create(lead=CustomerLeadFactory.create())
+
+        with mock.patch('app.helper.segment.IdentifyPipeline.start'):
+            with self.captureOnCommitCallbacks(execute=True):
+                pipeline.queue(customer.id)
+                pipeline.queue(customer.id)
+
+        self.assertEqual(pipeline.take(), [])
+
+        with self.assertNumQueries(1):
+            self.assertEqual(pipeline.flush(force=True), 1)
+
+        analytics.identify.assert_called_once_with(
+            anonymous_id=customer.lead.url_token,
+            user_id=customer.id,
+            traits=customer.__identify__())
+        self.assertEqual(pipeline.stats(), {
+            'pending': 0, 'queued': 1, 'coalesced': 1, 'flushed': 1, 'dropped': 0})
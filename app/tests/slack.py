@@ -0,0 +1,53 @@
+import responses
+from django.test import TestCase, override_settings
+
+from app.helper.slack import post_to_boom, send_pending_slack_messages
+from app.models import SlackMessage
+
+
+@override_settings(SLACK_OUTBOX=True, SLACK_BOOM="https://hooks.slack.com/services/boom", SLACK_MAX_ATTEMPTS=2)
+class SlackOutboxTests(TestCase):
+    @responses.activate
+    def test_post_is_queued_then_sent(self):
+        post_to_boom(text="New online booking!")
+
+        self.assertEqual(len(responses.calls), 0)
+        self.assertEqual(SlackMessage.objects.get().status, SlackMessage.Status.Pending)
+
+        responses.post("https://hooks.slack.com/services/boom", body="ok")
+        sent, failed = send_pending_slack_messages()
+
+        self.assertEqual((sent, failed), (1, 0))
+        self.assertEqual(responses.calls[0].request.body, b'{"text": "New online booking!"}')
+        self.assertEqual(SlackMessage.objects.get().status, SlackMessage.Status.Sent)
+
+    @responses.activate
+    def test_failed_post_is_retried_with_backoff(self):
+        message = post_to_boom(text="New online booking!")
+        responses.post("https://hooks.slack.com/services/boom", status=500)
+
+        self.assertEqual(send_pending_slack_messages(), (0, 0))
+        message.refresh_from_db()
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.status, SlackMessage.Status.Pending)
+        self.assertEqual(send_pending_slack_messages(), (0, 0))
+
+        SlackMessage.objects.update(next_attempt_at=message.created_at)
+        self.assertEqual(send_pending_slack_messages(), (0, 1))
+        self.assertEqual(SlackMessage.objects.get().status, SlackMessage.Status.Failed)
+
+    @responses.activate
+    def test_claimed_messages_are_not_sent_twice(self):
+        post_to_boom(text="New online booking!")
+        concurrent = []
+
+        def callback(request):
+            # Another worker polling while this one is posting
+            concurrent.append(send_pending_slack_messages())
+            return (200, {}, "ok")
+
+        responses.add_callback(responses.POST, "https://hooks.slack.com/services/boom", callback=callback)
+
+        self.assertEqual(send_pending_slack_messages(), (1, 0))
+        self.assertEqual(concurrent, [(0, 0)])
+        self.assertEqual(len(responses.calls), 1)
@@ -0,0 +1,149 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.tests.factories import CustomUserFactory, ProUserFactory
+from app.helper.uploads import PhotoUploadHandler, UploadRejected, detect_content_type, part_name
+from app.models import JobPhoto, UploadSession
+from pro.tests.factories import JobFactory
+
+JPEG = b'\xff\xd8\xff\xe0\x00\x10JFIF\x00' + bytes(range(256)) * 10
+
+
+@override_settings(UPLOAD_PART_SIZE=1024, UPLOAD_CHUNK_SIZE=100)
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        self.pro = ProUserFactory.create()
+        self.job = JobFactory.create(pro_business=self.pro.business)
+        self.client = APIClient()
+        self.client.force_authenticate(self.pro.user)
+
+    def start(self, data=JPEG, **kwargs):
+        response = self.client.post('/api/uploads/', {
+            'target': UploadSession.Target.JobPhoto, 'object_id': self.job.id,
+            'filename': 'photo.jpg', 'size': len(data), **kwargs}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def put_part(self, session, index, data):
+        return self.client.put(f"/api/uploads/{session['id']}/parts/{index}", data,
+                               content_type='application/octet-stream')
+
+    def test_parts_sent_in_any_order_are_joined(self):
+        session = self.start()
+        self.assertEqual(session['missing_parts'], [0, 1, 2])
+
+        self.put_part(session, 2, JPEG[2048:])
+        self.put_part(session, 0, JPEG[:1024])
+        # Retried after a dropped connection
+        self.put_part(session, 0, JPEG[:1024])
+        response = self.client.post(f"/api/uploads/{session['id']}/complete")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['missing_parts'], [1])
+
+        self.assertEqual(self.put_part(session, 1, JPEG[1024:2048]).data['missing_parts'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/uploads/{session['id']}/complete")
+
+        self.assertEqual(response.status_code, 201)
+        photo = JobPhoto.objects.get(pk=response.data['result_id'], job=self.job)
+        with photo.photo.open('rb') as file:
+            self.assertEqual(file.read(), JPEG)
+        self.assertEqual(response.data['content_type'], 'image/jpeg')
+        self.assertFalse(default_storage.exists(part_name(session['id'], 0)))
+
+        replay = self.client.post(f"/api/uploads/{session['id']}/complete")
+        self.assertEqual(replay.data['result_id'], photo.id)
+        self.assertEqual(JobPhoto.objects.filter(job=self.job).count(), 1)
+
+    def test_completion_in_progress_is_not_repeated(self):
+        session = self.start(data=JPEG[:1024])
+        self.put_part(session, 0, JPEG[:1024])
+        UploadSession.objects.filter(pk=session['id']).update(
+            status=UploadSession.Status.Completing, completing_until=timezone.now() + timedelta(minutes=1))
+
+        response = self.client.post(f"/api/uploads/{session['id']}/complete")
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(JobPhoto.objects.exists())
+
+        # The first completion died, its lease ran out
+        UploadSession.objects.filter(pk=session['id']).update(completing_until=timezone.now() - timedelta(minutes=1))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/api/uploads/{session['id']}/complete")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(UploadSession.objects.get(pk=session['id']).status, UploadSession.Status.Complete)
+
+    def test_rejected_completion_reopens_the_session(self):
+        session = self.start(data=JPEG[:1024])
+        self.put_part(session, 0, JPEG[:1024])
+        self.job.delete()
+
+        response = self.client.post(f"/api/uploads/{session['id']}/complete")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(UploadSession.objects.get(pk=session['id']).status, UploadSession.Status.Open)
+
+    def test_parts_of_the_wrong_size_or_type_are_rejected(self):
+        session = self.start()
+
+        self.assertEqual(self.put_part(session, 1, JPEG[:1025]).status_code, 400)
+        self.assertEqual(self.put_part(session, 1, JPEG[:1000]).status_code, 400)
+        self.assertEqual(self.put_part(session, 0, b'%PDF-1.4' + JPEG[8:1024]).status_code, 400)
+        self.assertEqual(UploadSession.objects.get(pk=session['id']).parts, [])
+
+    def test_uploads_to_other_jobs_are_refused(self):
+        other_job = JobFactory.create()
+
+        response = self.client.post('/api/uploads/', {
+            'target': UploadSession.Target.JobPhoto, 'object_id': other_job.id,
+            'filename': 'photo.jpg', 'size': len(JPEG)}, format='json')
+
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(MAX_UPLOAD_SIZE=2048)
+    def test_oversized_uploads_are_refused(self):
+        response = self.client.post('/api/uploads/', {
+            'target': UploadSession.Target.JobPhoto, 'object_id': self.job.id,
+            'filename': 'photo.jpg', 'size': len(JPEG)}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_sessions_belong_to_their_owner(self):
+        session = self.start()
+        self.client.force_authenticate(CustomUserFactory.create())
+
+        self.assertEqual(self.client.get(f"/api/uploads/{session['id']}").status_code, 404)
+        self.assertEqual(self.put_part(session, 0, JPEG[:1024]).status_code, 404)
+
+
+class StreamingUploadHandlerTests(TestCase):
+    def post(self, handler_class, upload):
+        request = RequestFactory().post('/', {'file': upload})
+        request.upload_handlers = [handler_class(request)]
+        return request.FILES['file']
+
+    def test_files_are_spooled_to_disk_with_their_detected_type(self):
+        upload = self.post(PhotoUploadHandler, SimpleUploadedFile('photo.png', JPEG, content_type='image/png'))
+
+        self.assertTrue(hasattr(upload, 'temporary_file_path'))
+        self.assertEqual(upload.content_type, 'image/jpeg')
+        self.assertEqual(upload.read(), JPEG)
+
+    def test_unexpected_types_are_rejected_while_streaming(self):
+        with self.assertRaises(UploadRejected):
+            self.post(PhotoUploadHandler, SimpleUploadedFile('receipt.jpg', b'%PDF-1.4 receipt'))
+
+    @override_settings(MAX_UPLOAD_SIZE=1024)
+    def test_oversized_files_are_rejected_while_streaming(self):
+        with self.assertRaises(UploadRejected):
+            self.post(PhotoUploadHandler, SimpleUploadedFile('photo.jpg', JPEG))
+
+    def test_content_type_detection(self):
+        self.assertEqual(detect_content_type(b'%PDF-1.7'), 'application/pdf')
+        self.assertEqual(detect_content_type(b'RIFF\x00\x00\x00\x00WEBPVP8 '), 'image/webp')
+        self.assertEqual(detect_content_type(b'\x00\x00\x00\x18ftypheic'), 'image/heic')
+        self.assertIsNone(detect_content_type(b'<svg'))
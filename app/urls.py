@@ -2,6 +2,11 @@ from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
 
-urlpatterns = [
+from app import views
 
+urlpatterns = [
+    path('uploads/', views.UploadSessionListView.as_view(), name='upload_sessions'),
+    path('uploads/<uuid:pk>', views.UploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:pk>/parts/<int:index>', views.UploadPartView.as_view(), name='upload_part'),
+    path('uploads/<uuid:pk>/complete', views.UploadCompleteView.as_view(), name='upload_complete'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
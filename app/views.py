@@ -0,0 +1,135 @@
+from django.conf import settings
+from django.db import transaction
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from app.helper.uploads import (PHOTO_CONTENT_TYPES, RECEIPT_CONTENT_TYPES, UploadRejected, check_upload,
+                                complete_upload, delete_parts, get_upload_target, save_part, spool_stream)
+from app.models import UploadSession
+from app.serializers import UploadSessionSerializer
+
+
+class UploadSessionListView(APIView):
+    """ Start a resumable upload. The client then PUTs the file in parts of
+        `part_size` bytes, in any order and retrying as needed, and POSTs
+        to complete once no part is missing.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        serializer = UploadSessionSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        if get_upload_target(request.user, data['target'], data['object_id']) is None:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        session = serializer.save(owner=request.user, part_size=settings.UPLOAD_PART_SIZE)
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+
+class UploadSessionView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        session = get_object_or_404(UploadSession, pk=pk, owner=request.user)
+        return Response(UploadSessionSerializer(session).data)
+
+    def delete(self, request, pk, *args, **kwargs):
+        with transaction.atomic():
+            session = get_object_or_404(
+                UploadSession.objects.select_for_update(), pk=pk, owner=request.user, status=UploadSession.Status.Open)
+            session.status = UploadSession.Status.Aborted
+            session.save(update_fields=['status'])
+            transaction.on_commit(lambda: delete_parts(session.id, session.part_count))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadPartView(APIView):
+    """ Store one part, read from the request body in chunks straight to a
+        temporary file, so the body is never held in memory.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, pk, index, *args, **kwargs):
+        session = get_object_or_404(UploadSession, pk=pk, owner=request.user, status=UploadSession.Status.Open)
+        if index >= session.part_count:
+            return Response({'index': [f'The upload has {session.part_count} parts.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        expected = session.expected_part_size(index)
+        if int(request.META.get('CONTENT_LENGTH') or 0) > expected:
+            return Response({'part': [f'Part {index} is {expected} bytes.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            part = spool_stream(request, expected)
+        except UploadRejected as error:
+            return Response({'part': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        with part:
+            size = part.seek(0, 2)
+            if size != expected:
+                return Response({'part': [f'Received {size} bytes, expected {expected}.']},
+                                status=status.HTTP_400_BAD_REQUEST)
+            if index == 0:
+                content_types = (RECEIPT_CONTENT_TYPES if session.target == UploadSession.Target.Receipt
+                                 else PHOTO_CONTENT_TYPES)
+                part.seek(0)
+                try:
+                    check_upload(part.read(16), session.size, content_types)
+                except UploadRejected as error:
+                    return Response({'part': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+            part.seek(0)
+            save_part(session.id, index, part)
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().get(pk=session.pk)
+            if index not in session.parts:
+                session.parts = sorted([*session.parts, index])
+                session.save(update_fields=['parts'])
+
+        return Response(UploadSessionSerializer(session).data)
+
+
+class UploadCompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, pk, *args, **kwargs):
+        # The session is claimed in a short transaction, the parts are
+        # joined and stored by complete_upload without one
+        with transaction.atomic():
+            session = get_object_or_404(UploadSession.objects.select_for_update(), pk=pk, owner=request.user)
+            # A retried completion replays the first one
+            if session.status == UploadSession.Status.Complete:
+                return Response(UploadSessionSerializer(session).data)
+            if session.status == UploadSession.Status.Completing and session.completing_until > timezone.now():
+                return Response({'status': ['The upload is being completed.']}, status=status.HTTP_409_CONFLICT)
+            if session.status == UploadSession.Status.Aborted:
+                return Response({'status': ['The upload was aborted.']}, status=status.HTTP_409_CONFLICT)
+            if session.missing_parts():
+                return Response({'missing_parts': session.missing_parts()}, status=status.HTTP_409_CONFLICT)
+
+            session.status = UploadSession.Status.Completing
+            session.completing_until = timezone.now() + settings.UPLOAD_COMPLETE_LEASE
+            session.save(update_fields=['status', 'completing_until'])
+
+        try:
+            complete_upload(session)
+        except UploadRejected as error:
+            self.reopen(session)
+            return Response({'file': [str(error)]}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception:
+            self.reopen(session)
+            raise
+
+        return Response(UploadSessionSerializer(session).data, status=status.HTTP_201_CREATED)
+
+    def reopen(self, session):
+        UploadSession.objects.filter(
+            pk=session.pk, status=UploadSession.Status.Completing, completing_until=session.completing_until,
+        ).update(status=UploadSession.Status.Open, completing_until=None)
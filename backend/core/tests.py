@@ -1,9 +1,83 @@
+from django.test import SimpleTestCase
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 
+from backend.db.pool import ConnectionPool
+
 
 class WarmUpTests(APITransactionTestCase):
     def test_warmup(self):
         response = self.client.get("/_ah/warmup")
 
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+
+class DatabasePoolViewTests(APITransactionTestCase):
+    def test_requires_admin(self):
+        response = self.client.get("/_ah/db-pool")
+
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+
+class FakeConnection(object):
+    def __init__(self):
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.rolled_back = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rolled_back = True
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def get_pool(self, max_size=2, timeout=0.05):
+        return ConnectionPool("test", FakeConnection, max_size=max_size,
+                              timeout=timeout, health_check_interval=30)
+
+    def test_reuses_released_connection(self):
+        pool = self.get_pool()
+
+        connection = pool.acquire()
+        pool.release(connection)
+
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(pool.stats()["created"], 1)
+        self.assertEqual(pool.stats()["in_use"], 1)
+        self.assertEqual(pool.stats()["idle"], 0)
+
+    def test_rolls_back_open_transaction_on_release(self):
+        pool = self.get_pool()
+
+        connection = pool.acquire()
+        connection.status = TRANSACTION_STATUS_INERROR
+        pool.release(connection)
+
+        self.assertTrue(connection.rolled_back)
+        self.assertEqual(pool.stats()["idle"], 1)
+
+    def test_discards_closed_connection(self):
+        pool = self.get_pool()
+
+        connection = pool.acquire()
+        connection.closed = 1
+        pool.release(connection)
+
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertEqual(pool.stats()["closed"], 1)
+
+    def test_times_out_when_exhausted(self):
+        pool = self.get_pool(max_size=1)
+        pool.acquire()
+
+        with self.assertRaises(OperationalError):
+            pool.acquire()
+        self.assertEqual(pool.stats()["in_use"], 1)
@@ -1,9 +1,11 @@
 from django.urls import path
 
 from .views import (
+    DatabasePoolView,
     WarmUpView,
 )
 
 urlpatterns = [
     path("_ah/warmup", WarmUpView.as_view()),
+    path("_ah/db-pool", DatabasePoolView.as_view()),
 ]
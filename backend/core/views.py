@@ -1,8 +1,22 @@
+from django.conf import settings
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from backend.db.pool import get_pool_stats
+
 
 class WarmUpView(APIView):
     def get(self, request, *args, **kwargs):
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class DatabasePoolView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({
+            "mode": settings.DB_CONNECTION_MODE,
+            "pools": get_pool_stats(),
+        })
@@ -0,0 +1,59 @@
+import psycopg2.extras
+from django.db.backends.postgresql.base import Database
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+from django.utils.asyncio import async_unsafe
+
+from backend.db.pool import get_pool
+
+POOL_DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 10,
+    'HEALTH_CHECK_INTERVAL': 30,
+}
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    """ PostgreSQL backend that borrows connections from a process wide pool
+        and gives them back on close(), instead of opening a new connection
+        per request. Use it with CONN_MAX_AGE = 0 so every request returns
+        its connection. Pool options live in DATABASES[alias]["POOL"].
+    """
+
+    pool = None
+
+    def get_pool_options(self):
+        return {**POOL_DEFAULTS, **self.settings_dict.get('POOL', {})}
+
+    def create_connection(self, conn_params):
+        connection = Database.connect(**conn_params)
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        if isolation_level is not None and isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        options = self.get_pool_options()
+        key = (self.alias, tuple(sorted((name, str(value))
+               for name, value in conn_params.items())))
+        self.pool = get_pool(
+            key,
+            name=f"{self.alias}:{conn_params.get('database')}",
+            connect=lambda: self.create_connection(conn_params),
+            max_size=options['MAX_SIZE'],
+            timeout=options['TIMEOUT'],
+            health_check_interval=options['HEALTH_CHECK_INTERVAL'],
+        )
+
+        connection = self.pool.acquire()
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level)
+        return connection
+
+    @async_unsafe
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                return self.pool.release(self.connection)
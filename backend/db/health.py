@@ -0,0 +1,35 @@
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def mark_connections_idle(**kwargs):
+    """ request_finished receiver: remember when each persistent connection
+        went idle.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is not None:
+            connection.idle_since = now
+
+
+def check_connections(**kwargs):
+    """ request_started receiver: persistent connections (CONN_MAX_AGE > 0)
+        that sat idle longer than DB_HEALTH_CHECK_INTERVAL seconds are
+        pinged, and dropped if the server went away, so the request opens
+        a fresh connection instead of failing on a dead one.
+    """
+    deadline = time.monotonic() - settings.DB_HEALTH_CHECK_INTERVAL
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if getattr(connection, 'idle_since', deadline) > deadline:
+            continue
+        if not connection.is_usable():
+            logger.info(f'Dropping dead database connection {connection.alias}.')
+            connection.close()
+        connection.idle_since = time.monotonic()
@@ -0,0 +1,156 @@
+import collections
+import logging
+import threading
+import time
+from typing import Callable, List
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_UNKNOWN)
+
+logger = logging.getLogger(__name__)
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool(object):
+    """ Thread safe pool of psycopg2 connections shared by every thread
+        (WSGI threads or ASGI sync_to_async workers) of the process.
+
+        Idle connections are handed out most recently used first and are
+        checked with a `SELECT 1` when they sat idle longer than
+        health_check_interval seconds.
+    """
+
+    def __init__(self, name: str, connect: Callable, max_size: int, timeout: float, health_check_interval: float):
+        self.name = name
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._condition = threading.Condition()
+        self._idle = collections.deque()
+        self.in_use = 0
+        self.created = 0
+        self.closed = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def is_alive(self, connection) -> bool:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def reset(self, connection) -> bool:
+        if connection.closed:
+            return False
+        try:
+            status = connection.get_transaction_status()
+            if status == TRANSACTION_STATUS_UNKNOWN:
+                return False
+            if status != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def discard(self, connection) -> None:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self.closed += 1
+
+    def acquire(self):
+        started_at = time.monotonic()
+        with self._condition:
+            while not self._idle and self.in_use >= self.max_size:
+                remaining = self.timeout - (time.monotonic() - started_at)
+                if remaining <= 0:
+                    raise OperationalError(
+                        f'Connection pool {self.name} exhausted: {self.in_use} connections in use.')
+                self._condition.wait(remaining)
+
+            waited = time.monotonic() - started_at
+            if waited > 0.001:
+                self.waits += 1
+                self.wait_time += waited
+                self.max_wait_time = max(self.max_wait_time, waited)
+
+            self.in_use += 1
+            item = self._idle.pop() if self._idle else None
+
+        try:
+            if item is not None:
+                connection, released_at = item
+                if time.monotonic() - released_at <= self.health_check_interval or self.is_alive(connection):
+                    return connection
+                logger.info(f'Connection pool {self.name} dropped a dead connection.')
+                self.discard(connection)
+
+            connection = self.connect()
+            with self._condition:
+                self.created += 1
+            return connection
+        except Exception:
+            with self._condition:
+                self.in_use -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, connection) -> None:
+        reusable = self.reset(connection)
+        with self._condition:
+            self.in_use -= 1
+            if reusable:
+                self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+        if not reusable:
+            self.discard(connection)
+
+    def close_idle(self) -> None:
+        with self._condition:
+            idle, self._idle = list(self._idle), collections.deque()
+        for connection, released_at in idle:
+            self.discard(connection)
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                'name': self.name,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+                'created': self.created,
+                'closed': self.closed,
+                'waits': self.waits,
+                'wait_time_ms': round(self.wait_time * 1000, 2),
+                'max_wait_time_ms': round(self.max_wait_time * 1000, 2),
+            }
+
+
+def get_pool(key, name: str, connect: Callable, max_size: int, timeout: float, health_check_interval: float) -> ConnectionPool:
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(
+                name, connect, max_size, timeout, health_check_interval)
+        return _pools[key]
+
+
+def get_pool_stats() -> List[dict]:
+    return [pool.stats() for pool in list(_pools.values())]
+
+
+def close_pools() -> None:
+    for pool in list(_pools.values()):
+        pool.close_idle()
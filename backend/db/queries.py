@@ -0,0 +1,150 @@
+import logging
+import os
+import sys
+import time
+from collections import Counter, namedtuple
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+Query = namedtuple('Query', ['alias', 'sql', 'params', 'params_key', 'duration', 'call_site'])
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def get_call_site() -> str:
+    """ First frame of project code that led to the query, skipping Django,
+        third party packages and this module.
+    """
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and 'site-packages' not in filename
+                and filename != __file__):
+            return f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryRecorder(object):
+    """ Database execute wrapper that records every query run on the
+        current thread while record() is active.
+
+        Call sites and parameters are only kept with QUERY_CALL_SITES (DEBUG
+        and tests), walking the stack and holding every parameter is too
+        costly for production. N+1 statements are then grouped by SQL
+        alone, duplicates are still found from a hash of the parameters.
+    """
+
+    def __init__(self, call_sites: Optional[bool] = None):
+        self.queries: List[Query] = []
+        self.call_sites = settings.QUERY_CALL_SITES if call_sites is None else call_sites
+
+    def __call__(self, execute, sql, params, many, context):
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append(Query(
+                context['connection'].alias, sql,
+                params if self.call_sites else None, hash(repr(params)),
+                time.perf_counter() - started_at,
+                get_call_site() if self.call_sites else 'unknown'))
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def summary(self) -> Dict:
+        """ Returns:
+                queries: number of queries
+                duplicates: queries repeating an earlier query with the same parameters
+                time_ms: time spent in the database
+                n_plus_one: the same statement run QUERY_N_PLUS_ONE_THRESHOLD
+                    times or more from one call site, most repeated first
+        """
+        identical = Counter((query.sql, query.params_key)
+                            for query in self.queries)
+        similar = Counter((query.sql, query.call_site)
+                          for query in self.queries)
+
+        return {
+            'queries': len(self.queries),
+            'duplicates': sum(count - 1 for count in identical.values()),
+            'time_ms': round(sum(query.duration for query in self.queries) * 1000, 2),
+            'n_plus_one': [
+                {'sql': sql[:300], 'call_site': call_site, 'count': count}
+                for (sql, call_site), count in similar.most_common()
+                if count >= settings.QUERY_N_PLUS_ONE_THRESHOLD
+            ],
+        }
+
+
+def get_budget(name: str) -> Dict:
+    return {**settings.QUERY_BUDGET_DEFAULT, **settings.QUERY_BUDGETS.get(name, {})}
+
+
+def check_budget(name: str, summary: Dict) -> List[str]:
+    """ Describe every limit of the budget for the URL name that the
+        summary goes over. None means no limit.
+    """
+    budget = get_budget(name)
+    violations = []
+    if budget['queries'] is not None and summary['queries'] > budget['queries']:
+        violations.append(f"{summary['queries']} queries, budget is {budget['queries']}")
+    if budget['duplicates'] is not None and summary['duplicates'] > budget['duplicates']:
+        violations.append(f"{summary['duplicates']} duplicate queries, budget is {budget['duplicates']}")
+    if budget['n_plus_one'] is not None and len(summary['n_plus_one']) > budget['n_plus_one']:
+        violations.extend(
+            f"N+1: {entry['count']} x {entry['sql']} at {entry['call_site']}"
+            for entry in summary['n_plus_one'])
+    return violations
+
+
+def enforce_budget(name: str, summary: Dict) -> Optional[List[str]]:
+    """ Log the violations of the budget for the URL name. Under tests
+        they raise, but only for URL names with their own QUERY_BUDGETS
+        entry, routes on the default budget are logged.
+    """
+    violations = check_budget(name, summary)
+    if not violations:
+        return None
+
+    message = f"{name} is over its query budget ({summary['time_ms']} ms in the database): " + '; '.join(violations)
+    if settings.QUERY_BUDGET_RAISE and name in settings.QUERY_BUDGETS:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return violations
+
+
+class QueryBudgetMiddleware(object):
+    """ Counts the queries, duplicate queries and database time of each
+        request and checks them against QUERY_BUDGETS for the matched URL
+        name. Over budget requests are logged, or raise QueryBudgetExceeded
+        when QUERY_BUDGET_RAISE is set (under tests).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.QUERY_BUDGET_ENABLED:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+
+        if request.resolver_match is not None:
+            enforce_budget(request.resolver_match.view_name, recorder.summary())
+        return response
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.urls import URLPattern
+
+from backend.db.queries import QueryRecorder, check_budget, get_budget
+
+
+class QueryBudgetTestMixin(object):
+    """ TestCase helpers for the per URL name query budgets in QUERY_BUDGETS. """
+
+    @contextmanager
+    def assertQueryBudget(self, name):
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+
+        summary = recorder.summary()
+        violations = check_budget(name, summary)
+        if violations:
+            self.fail(f'{name} is over its query budget {get_budget(name)}: ' + '; '.join(violations))
+
+    def assertRoutesHaveBudgets(self, urlpatterns):
+        """ Every named route has a budget in QUERY_BUDGETS and a
+            test_<URL name> method on this TestCase exercising it.
+        """
+        for pattern in urlpatterns:
+            if not isinstance(pattern, URLPattern):
+                continue
+            self.assertIsNotNone(pattern.name, f'{pattern.pattern} has no URL name')
+            self.assertIn(pattern.name, settings.QUERY_BUDGETS,
+                          f'{pattern.name} has no query budget')
+            self.assertTrue(hasattr(self, f'test_{pattern.name}'),
+                            f'{pattern.name} has no query budget test')
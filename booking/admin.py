@@ -1,10 +1,13 @@
 from django.contrib import admin
 from simple_history.admin import SimpleHistoryAdmin
 
+from booking.catalog import catalog_version
+
 from booking.models import (
     ProductCatalog,
     Product,
     ProductCriteria,
+    TypeformDelivery,
     TypeformResponse,
     Order
 )
@@ -13,7 +16,25 @@ import locale
 locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
 
 
-class ProductCatalogAdmin(SimpleHistoryAdmin):
+class CatalogVersionAdmin(SimpleHistoryAdmin):
+    """ Bumps the shared catalog version on every admin edit so all instances
+        drop their product match index and product selection cache.
+    """
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        catalog_version.bump()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        catalog_version.bump()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        catalog_version.bump()
+
+
+class ProductCatalogAdmin(CatalogVersionAdmin):
     list_display = ('product_title',)
     search_fields = ('product_title', 'base_price',)
 
@@ -21,7 +42,7 @@ class ProductCatalogAdmin(SimpleHistoryAdmin):
         return obj.product.title
 
 
-class ProductAdmin(SimpleHistoryAdmin):
+class ProductAdmin(CatalogVersionAdmin):
     list_display = ('title', 'tank_type')
     search_fields = ('title', 'description', 'tank_type', 'home_type')
 
@@ -44,8 +65,15 @@ class OrderAdmin(SimpleHistoryAdmin):
         return locale.currency(obj.selected_product.product_catalog.final_price())
 
 
+class TypeformDeliveryAdmin(admin.ModelAdmin):
+    list_display = ('id', 'token', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('token',)
+
+
 admin.site.register(ProductCatalog, ProductCatalogAdmin)
 admin.site.register(Product, ProductAdmin)
 admin.site.register(TypeformResponse, SimpleHistoryAdmin)
+admin.site.register(TypeformDelivery, TypeformDeliveryAdmin)
 admin.site.register(ProductCriteria, SimpleHistoryAdmin)
 admin.site.register(Order, OrderAdmin)
@@ -0,0 +1,258 @@
+import math
+import time
+import tracemalloc
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, List, Tuple
+from unittest import mock
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from django.conf import settings
+from django.db.models.signals import post_save
+from rest_framework.test import APIClient
+
+from backend.db.queries import QueryRecorder
+
+STEPS = ['webflow_to_typeform_redirect', 'typeform_webhook', 'selected_product_list',
+         'select_product', 'fetch_calendly_data', 'submit_customer_order']
+
+
+class FakeResponse(object):
+    status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+class Fakes(object):
+    """ Local stand-ins for Calendly, Slack and Segment, counting the calls
+        the funnel would have made. Calendly answers with the resources
+        registered in `calendly_resources`, built before the timed runs.
+        Slack counts SlackMessage rows queued to the outbox as well as
+        direct posts when SLACK_OUTBOX is off.
+    """
+
+    def __init__(self):
+        self.calls = {'calendly': 0, 'slack': 0, 'segment': 0}
+        self.calendly_resources = {}
+
+    def calendly_get(self, url):
+        self.calls['calendly'] += 1
+        return self.calendly_resources.pop(url)
+
+    def send_to_slack(self, channel, text):
+        self.calls['slack'] += 1
+        return FakeResponse()
+
+    def slack_message_saved(self, created, **kwargs):
+        if created:
+            self.calls['slack'] += 1
+
+    def identify(self, *args, **kwargs):
+        self.calls['segment'] += 1
+
+    def queue_identify(self, customer_id):
+        self.calls['segment'] += 1
+
+    @contextmanager
+    def install(self):
+        from app.helper.segment import identify_pipeline
+        from app.models import SlackMessage
+        from booking.client import CalendlyClient
+
+        # Plain functions, bound to the CalendlyClient like the methods they replace
+        def get(client, url):
+            return self.calendly_get(url)
+
+        def get_many(client, urls):
+            return [self.calendly_get(url) for url in urls]
+
+        post_save.connect(self.slack_message_saved, sender=SlackMessage, weak=False)
+        try:
+            with ExitStack() as stack:
+                stack.enter_context(mock.patch.object(CalendlyClient, 'get', get))
+                stack.enter_context(mock.patch.object(CalendlyClient, 'get_many', get_many))
+                stack.enter_context(mock.patch('app.helper.slack.send_to_slack', self.send_to_slack))
+                stack.enter_context(mock.patch('analytics.identify', self.identify))
+                # The identify pipeline would hand the customer to its own thread
+                stack.enter_context(mock.patch.object(identify_pipeline, 'add', self.queue_identify))
+                yield self
+        finally:
+            post_save.disconnect(self.slack_message_saved, sender=SlackMessage)
+
+
+def percentile(values: List[float], percent: float) -> float:
+    """ Nearest rank percentile. """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class FunnelBenchmark(object):
+    """ Drives the booking funnel in process, from the Webflow redirect to
+        the order submission, through the real URLs and middleware.
+
+        Every step commits like it does in production, so its COMMIT and
+        on_commit callbacks are part of what is measured, and the rows it
+        writes are kept: run it against a throwaway database, as the
+        benchmark_booking_funnel command does. Request payloads and fake
+        Calendly answers are built before each run, outside the timed and
+        traced region. Latency is measured without tracemalloc,
+        allocations are measured on separate runs.
+    """
+
+    def __init__(self, iterations: int = 20, warmup: int = 2, allocation_iterations: int = 5, seed: int = 20):
+        self.iterations = iterations
+        self.warmup = warmup
+        self.allocation_iterations = allocation_iterations
+        self.seed = seed
+        self.fakes = Fakes()
+        self.client = APIClient()
+        self.product_catalog_id = None
+
+    def seed_catalog(self) -> None:
+        from booking.models import ProductCatalog
+        from booking.tests.factories import ProductCatalogFactory
+
+        if not ProductCatalog.objects.exists():
+            ProductCatalogFactory.create_batch(self.seed)
+        self.product_catalog_id = ProductCatalog.objects.values_list('id', flat=True).first()
+
+    def check(self, response, step: str):
+        if response.status_code >= 400:
+            raise AssertionError(f'{step} returned {response.status_code}: {response.content[:500]}')
+        return response
+
+    def prepare(self) -> Dict:
+        """ Inputs of one funnel run, built with the test factories before
+            it starts so their cost is not charged to the steps.
+        """
+        from booking.tests.factories import (CalendlyEventResourceFactory, CalendlyInviteeResourceFactory,
+                                             SubmitBookingFormFactory, TypeformResponseDataFactory,
+                                             generate_calendly_scheduled_payload)
+
+        calendly_data = generate_calendly_scheduled_payload()
+        event_uri = calendly_data['payload']['event']['uri']
+        invitee_uri = calendly_data['payload']['invitee']['uri']
+        self.fakes.calendly_resources[event_uri] = {
+            'resource': CalendlyEventResourceFactory.create(uri=event_uri)}
+        self.fakes.calendly_resources[invitee_uri] = {
+            'resource': CalendlyInviteeResourceFactory.create(uri=invitee_uri)}
+
+        return {
+            'typeform_data': TypeformResponseDataFactory.create(),
+            'calendly_data': calendly_data,
+            'order_data': SubmitBookingFormFactory.create(),
+        }
+
+    def steps(self) -> List[Tuple[str, Callable]]:
+        """ One funnel run, as (name, callable) pairs where each callable
+            takes the inputs from prepare() and the state left by the
+            previous steps.
+        """
+
+        def webflow(state):
+            url_params = {'tank_type': 'tankless', 'power_type': 'gas', 'bathroom_coverage': '1'}
+            response = self.check(self.client.get(
+                f'/api/booking/webflow/?{urlencode(url_params)}'), 'webflow_to_typeform_redirect')
+            state['url_token'] = parse_qs(urlparse(response['Location']).query)['url_token'][0]
+
+        def typeform(state):
+            data = state['typeform_data']
+            data['form_response']['hidden'] = {'url_token': state['url_token']}
+            self.check(self.client.post('/api/booking/typeform/', data, format='json'), 'typeform_webhook')
+
+        def product_list(state):
+            self.check(self.client.get(
+                f"/api/booking/product/selected/{state['url_token']}"), 'selected_product_list')
+
+        def select(state):
+            response = self.check(self.client.post('/api/booking/select_product/', {
+                'url_token': state['url_token'],
+                'product_catalog_id': self.product_catalog_id,
+            }, format='json'), 'select_product')
+            state['selected_product_id'] = response.data
+
+        def calendly(state):
+            response = self.check(self.client.post('/api/booking/calendly/', {
+                'url_token': state['url_token'],
+                'calendly_data': state['calendly_data'],
+            }, format='json'), 'fetch_calendly_data')
+            state['customer_id'] = response.data
+
+        def order(state):
+            data = state['order_data']
+            data['selected_product'] = {'id': state['selected_product_id']}
+            data['customer']['id'] = state['customer_id']
+            self.check(self.client.post('/api/booking/customer_order/', data, format='json'),
+                       'submit_customer_order')
+
+        return list(zip(STEPS, [webflow, typeform, product_list, select, calendly, order]))
+
+    def run_once(self, samples: Dict[str, Dict[str, List]], allocations: bool = False) -> None:
+        state = self.prepare()
+        for name, step in self.steps():
+            recorder = QueryRecorder()
+            if allocations:
+                tracemalloc.start()
+            started_at = time.perf_counter()
+            with recorder.record():
+                step(state)
+            elapsed = time.perf_counter() - started_at
+            if allocations:
+                current, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                samples[name]['allocated_kb'].append(peak / 1024)
+            else:
+                samples[name]['latency_ms'].append(elapsed * 1000)
+                samples[name]['queries'].append(len(recorder.queries))
+
+    def run(self) -> Dict:
+        samples = {name: {'latency_ms': [], 'queries': [], 'allocated_kb': []} for name in STEPS}
+
+        with self.fakes.install():
+            self.seed_catalog()
+            for _ in range(self.warmup):
+                self.run_once({name: {'latency_ms': [], 'queries': [], 'allocated_kb': []} for name in STEPS})
+            for _ in range(self.iterations):
+                self.run_once(samples)
+            for _ in range(self.allocation_iterations):
+                self.run_once(samples, allocations=True)
+
+        steps = {}
+        for name in STEPS:
+            latency, queries, allocated = (samples[name]['latency_ms'], samples[name]['queries'],
+                                           samples[name]['allocated_kb'])
+            steps[name] = {
+                'p50_ms': round(percentile(latency, 50), 2),
+                'p95_ms': round(percentile(latency, 95), 2),
+                'p99_ms': round(percentile(latency, 99), 2),
+                'queries': max(queries) if queries else 0,
+                'allocated_kb': round(max(allocated), 1) if allocated else 0,
+            }
+
+        return {
+            'iterations': self.iterations,
+            'slack_outbox': settings.SLACK_OUTBOX,
+            'steps': steps,
+            'external_calls': self.fakes.calls,
+        }
+
+
+def compare_to_baseline(results: Dict, baseline: Dict, tolerance: float = 0.2) -> List[str]:
+    """ Describe every step that got slower than the baseline p95 by more
+        than `tolerance`, runs more queries, or allocates more than
+        `tolerance` above the baseline.
+    """
+    regressions = []
+    for name, step in results['steps'].items():
+        expected = baseline.get('steps', {}).get(name)
+        if expected is None:
+            continue
+        if step['p95_ms'] > expected['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {step['p95_ms']} ms, baseline {expected['p95_ms']} ms")
+        if step['queries'] > expected['queries']:
+            regressions.append(f"{name}: {step['queries']} queries, baseline {expected['queries']}")
+        if expected.get('allocated_kb') and step['allocated_kb'] > expected['allocated_kb'] * (1 + tolerance):
+            regressions.append(f"{name}: {step['allocated_kb']} KB allocated, baseline {expected['allocated_kb']} KB")
+    return regressions
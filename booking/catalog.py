@@ -0,0 +1,225 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterator, List, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.renderers import JSONRenderer
+
+from booking.models import (Product, ProductCatalog, ProductCatalogVersion,
+                            ProductCriteria, Relocation)
+from booking.serializers import ProductCatalogSerializer
+
+logger = logging.getLogger(__name__)
+
+# (tank_type, home_type, power_type, bathroom_coverage, relocation, stair_price)
+CriteriaKey = Tuple[str, str, str, int, str, int]
+
+
+def criteria_key(product_criteria: ProductCriteria) -> CriteriaKey:
+    return (
+        product_criteria.tank_type,
+        product_criteria.home_type,
+        product_criteria.power_type,
+        product_criteria.bathroom_coverage,
+        product_criteria.relocation,
+        product_criteria.stair_access * 100,
+    )
+
+
+def catalog_relocations(product_catalog: ProductCatalog) -> List[str]:
+    """ Relocation values a ProductCatalog row answers to, with the same
+        semantics as the SQL filter in get_products_from_criteria:
+        Relocation.NONE matches rows where desired_location == current_location,
+        any other relocation matches rows moving *to* that location.
+    """
+    if product_catalog.desired_location == product_catalog.current_location:
+        return [Relocation.NONE.value]
+    if product_catalog.desired_location == Relocation.NONE:
+        return []
+    return [product_catalog.desired_location]
+
+
+def catalog_keys(product_catalog: ProductCatalog) -> Iterator[CriteriaKey]:
+    product = product_catalog.product
+    for home_type in product_catalog.home_types or []:
+        for bathroom_coverage in product.bathroom_coverages or []:
+            for relocation in catalog_relocations(product_catalog):
+                yield (
+                    product.tank_type,
+                    home_type,
+                    product.power_type,
+                    bathroom_coverage,
+                    relocation,
+                    product_catalog.stair_price,
+                )
+
+
+def sort_products(product_catalogs: List[ProductCatalog]) -> List[ProductCatalog]:
+    return sorted(product_catalogs,
+                  key=lambda product: (-product.is_popular, product.final_price()))
+
+
+class CatalogVersion(object):
+    """ Version of the catalog as seen by this process.
+
+        Combines the shared ProductCatalogVersion row, re-read at most every
+        PRODUCT_CATALOG_VERSION_TTL seconds, with a local generation bumped by
+        model signals so writes made in this process are visible immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._shared = None
+        self._checked_at = 0.0
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+
+    def bump(self):
+        ProductCatalogVersion.bump()
+        with self._lock:
+            self._shared = None
+            self._generation += 1
+
+    def current(self) -> Tuple[int, int]:
+        now = time.monotonic()
+        if self._shared is None or now - self._checked_at > settings.PRODUCT_CATALOG_VERSION_TTL:
+            shared = ProductCatalogVersion.get_version()
+            with self._lock:
+                self._shared, self._checked_at = shared, now
+        return self._shared, self._generation
+
+
+catalog_version = CatalogVersion()
+
+
+class ProductMatchIndex(object):
+    """ Process-local lookup table from a ProductCriteria tuple to the ordered
+        list of matching ProductCatalog ids.
+
+        The index is built with a single query and swapped in as one tuple, so
+        readers always see a complete build. It is rebuilt on the next lookup
+        after the catalog version changes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        catalog_version.invalidate()
+
+    def build(self, version) -> Tuple[Tuple[int, int], Dict[CriteriaKey, Tuple[int, ...]], Dict[int, ProductCatalog]]:
+        product_catalogs = (
+            ProductCatalog.objects
+            .select_related('product')
+            .filter(product__isnull=False)
+            .order_by('product_id', 'id')
+        )
+
+        # DISTINCT ON (product): keep the lowest id per product for each key
+        matches = defaultdict(dict)
+        catalogs = {}
+        for product_catalog in product_catalogs:
+            catalogs[product_catalog.id] = product_catalog
+            for key in catalog_keys(product_catalog):
+                matches[key].setdefault(
+                    product_catalog.product_id, product_catalog)
+
+        entries = {
+            key: tuple(product_catalog.id for product_catalog in sort_products(
+                list(by_product.values())))
+            for key, by_product in matches.items()
+        }
+
+        logger.debug(
+            f'Product match index built: {len(catalogs)} catalogs, {len(entries)} criteria.')
+        return version, entries, catalogs
+
+    def get_state(self):
+        version = catalog_version.current()
+        state = self._state
+        if state is not None and state[0] == version:
+            return state
+
+        with self._lock:
+            state = self._state
+            if state is None or state[0] != version:
+                state = self.build(version)
+                self._state = state
+        return state
+
+    def get_ids(self, product_criteria: ProductCriteria) -> Tuple[int, ...]:
+        version, entries, catalogs = self.get_state()
+        return entries.get(criteria_key(product_criteria), ())
+
+    def get_products(self, product_criteria: ProductCriteria) -> List[ProductCatalog]:
+        version, entries, catalogs = self.get_state()
+        return [catalogs[id] for id in entries.get(criteria_key(product_criteria), ())]
+
+
+product_match_index = ProductMatchIndex()
+
+
+class ProductSelectionCache(object):
+    """ LRU cache of the rendered `product_catalog` JSON fragment served by
+        selected_product_list, keyed by (catalog version, criteria tuple).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def render(self, product_criteria: ProductCriteria) -> bytes:
+        product_catalogs = ProductCatalog.get_products_from_criteria(
+            product_criteria)
+        return JSONRenderer().render(
+            ProductCatalogSerializer(product_catalogs, many=True).data)
+
+    def get(self, product_criteria: ProductCriteria) -> bytes:
+        key = (catalog_version.current(), criteria_key(product_criteria))
+
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+
+        fragment = self.render(product_criteria)
+
+        with self._lock:
+            self._entries[key] = fragment
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.PRODUCT_SELECTION_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return fragment
+
+
+product_selection_cache = ProductSelectionCache()
+
+
+@receiver(post_save, sender=Product, dispatch_uid="invalidate_match_index_product_saved")
+@receiver(post_delete, sender=Product, dispatch_uid="invalidate_match_index_product_deleted")
+@receiver(post_save, sender=ProductCatalog, dispatch_uid="invalidate_match_index_catalog_saved")
+@receiver(post_delete, sender=ProductCatalog, dispatch_uid="invalidate_match_index_catalog_deleted")
+def invalidate_product_match_index(sender, instance, **kwargs):
+    # Once now so the writer sees its own change, and again after commit:
+    # a build from pre-commit data in between would be cached under the
+    # first generation
+    catalog_version.invalidate()
+    transaction.on_commit(catalog_version.invalidate)
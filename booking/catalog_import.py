@@ -0,0 +1,173 @@
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import transaction
+from simple_history.utils import bulk_create_with_history, bulk_update_with_history
+
+from booking.models import Product, ProductCatalog, SelectedProduct
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+
+PRODUCT_CATALOG_KEY_FIELDS = ('home_types', 'current_location', 'desired_location', 'stair_price')
+
+PRODUCT_CATALOG_FIELDS = ('is_popular', 'base_price', 'warranty', 'total_rebates',
+                          'socal_gas_rebates', 'federal_tax_credit')
+
+
+def normalize(model, data: dict) -> dict:
+    return {name: model._meta.get_field(name).to_python(value) for name, value in data.items()}
+
+
+def product_catalog_key(title: str, product_catalog_data: dict) -> Tuple:
+    return (title, tuple(product_catalog_data['home_types'] or ())) + tuple(
+        product_catalog_data[name] for name in PRODUCT_CATALOG_KEY_FIELDS[1:])
+
+
+class ProductCatalogImport(object):
+    """ Diff based import of (product_data, product_catalog_data) rows.
+
+        Existing products and catalogs are loaded once and compared in memory,
+        only the differences are written with bulk_create/bulk_update (plus
+        the matching bulk history rows) in a single transaction.
+
+        Products are matched on title, catalogs on product title, home types,
+        current/desired location and stair price. Products are only
+        created, an existing product keeps its fields like it does with the
+        row by row import. A matched catalog gets its price, warranty and
+        rebate fields updated in place unless a SelectedProduct points at
+        it: then, like the row by row import, a new catalog is added next
+        to it so past quotes keep their price. Catalogs missing from the sheet are only
+        deleted with `delete_missing`, and never while a SelectedProduct
+        still points at them.
+    """
+
+    def __init__(self, rows: Iterable[Tuple[dict, dict]], delete_missing: bool = False):
+        self.rows = rows
+        self.delete_missing = delete_missing
+        self.summary = {
+            'products_created': 0,
+            'products_existing': 0,
+            'created': 0,
+            'updated': 0,
+            'unchanged': 0,
+            'duplicated': 0,
+            'deleted': 0,
+            'kept': 0,
+        }
+
+    def load_sheet(self) -> Tuple[Dict[str, dict], Dict[Tuple, dict]]:
+        sheet_products = {}
+        sheet_catalogs = {}
+        for product_data, product_catalog_data in self.rows:
+            product_data = normalize(Product, product_data)
+            product_catalog_data = normalize(
+                ProductCatalog, product_catalog_data)
+
+            title = product_data.pop('title')
+            # The first row of a product defines it, like Product.objects.get did
+            sheet_products.setdefault(title, product_data)
+
+            key = product_catalog_key(title, product_catalog_data)
+            if key in sheet_catalogs:
+                self.summary['duplicated'] += 1
+            sheet_catalogs[key] = product_catalog_data
+        return sheet_products, sheet_catalogs
+
+    def diff_products(self, sheet_products: Dict[str, dict]) -> Tuple[Dict[str, Product], List[Product]]:
+        products = {product.title: product for product in Product.objects.all()}
+
+        to_create = []
+        for title, product_data in sheet_products.items():
+            if title in products:
+                self.summary['products_existing'] += 1
+                continue
+            product = Product(title=title, **product_data)
+            products[title] = product
+            to_create.append(product)
+
+        return products, to_create
+
+    def diff_product_catalogs(self, sheet_catalogs: Dict[Tuple, dict], products: Dict[str, Product]) -> Tuple[List[ProductCatalog], List[ProductCatalog], List[ProductCatalog]]:
+        existing = {}
+        for product_catalog in ProductCatalog.objects.select_related('product').filter(product__isnull=False):
+            key = product_catalog_key(product_catalog.product.title, {
+                name: getattr(product_catalog, name) for name in PRODUCT_CATALOG_KEY_FIELDS})
+            existing.setdefault(key, []).append(product_catalog)
+
+        selected = set(SelectedProduct.objects.filter(
+            product_catalog__isnull=False).values_list('product_catalog_id', flat=True))
+
+        to_create, to_update = [], []
+        for key, product_catalog_data in sheet_catalogs.items():
+            matches = existing.pop(key, [])
+
+            def is_unchanged(product_catalog):
+                return all(getattr(product_catalog, name) == product_catalog_data[name]
+                           for name in PRODUCT_CATALOG_FIELDS if name in product_catalog_data)
+
+            product_catalog = next(filter(is_unchanged, matches), None)
+            if product_catalog is None:
+                # A selected catalog is what the customer was quoted, like
+                # update_or_create it gets a new row next to it instead
+                product_catalog = next(
+                    (match for match in matches if match.id not in selected), None)
+                if product_catalog is None:
+                    to_create.append(ProductCatalog(
+                        product=products[key[0]], **product_catalog_data))
+                else:
+                    for name in PRODUCT_CATALOG_FIELDS:
+                        if name in product_catalog_data:
+                            setattr(product_catalog, name, product_catalog_data[name])
+                    to_update.append(product_catalog)
+            else:
+                self.summary['unchanged'] += 1
+
+            # Other rows with the same key are left to delete_missing
+            stale = [match for match in matches if match is not product_catalog]
+            if stale:
+                existing[key] = stale
+
+        to_delete = [product_catalog for product_catalogs in existing.values()
+                     for product_catalog in product_catalogs]
+        return to_create, to_update, to_delete
+
+    def run(self) -> dict:
+        sheet_products, sheet_catalogs = self.load_sheet()
+
+        with transaction.atomic():
+            products, products_to_create = self.diff_products(sheet_products)
+
+            if products_to_create:
+                bulk_create_with_history(
+                    products_to_create, Product, batch_size=BATCH_SIZE)
+
+            self.summary['products_created'] = len(products_to_create)
+
+            to_create, to_update, to_delete = self.diff_product_catalogs(
+                sheet_catalogs, products)
+
+            if to_create:
+                bulk_create_with_history(
+                    to_create, ProductCatalog, batch_size=BATCH_SIZE)
+            if to_update:
+                bulk_update_with_history(
+                    to_update, ProductCatalog, PRODUCT_CATALOG_FIELDS, batch_size=BATCH_SIZE)
+
+            self.summary['created'] = len(to_create)
+            self.summary['updated'] = len(to_update)
+
+            if to_delete and self.delete_missing:
+                selected = set(SelectedProduct.objects.filter(
+                    product_catalog__in=to_delete).values_list('product_catalog_id', flat=True))
+                deletable = [
+                    product_catalog.id for product_catalog in to_delete if product_catalog.id not in selected]
+                ProductCatalog.objects.filter(id__in=deletable).delete()
+                self.summary['deleted'] = len(deletable)
+                self.summary['kept'] = len(to_delete) - len(deletable)
+            else:
+                self.summary['kept'] = len(to_delete)
+
+        logger.debug(f'Product catalog import: {self.summary}')
+        return self.summary
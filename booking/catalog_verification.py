@@ -0,0 +1,123 @@
+import itertools
+import time
+from typing import Dict, Iterable, List
+
+from booking.catalog import ProductMatchIndex
+from booking.models import (BathroomCoverage, HomeType, PowerType,
+                            ProductCatalog, ProductCriteria, Relocation, TankType)
+
+CRITERIA_FIELDS = ('tank_type', 'home_type', 'power_type',
+                   'bathroom_coverage', 'relocation', 'stair_access')
+
+# These conditions should return more than zero results
+NON_ZERO_CONDITIONS = [{
+    'tank_type': [TankType.Tankless.value],
+    'home_type': [HomeType.SINGLE_FAMILY.value, HomeType.TOWNHOME.value, HomeType.CONDO.value],
+    'power_type': [PowerType.GAS.value],
+    'bathroom_coverage': BathroomCoverage.values,
+    'relocation': [Relocation.NONE.value],
+}, {
+    'tank_type': [TankType.Tank.value],
+    'home_type': [HomeType.SINGLE_FAMILY.value, HomeType.TOWNHOME.value, HomeType.CONDO.value],
+    'power_type': [PowerType.GAS.value, PowerType.ELECTRIC.value],
+    'bathroom_coverage': [BathroomCoverage.ONE.value, BathroomCoverage.TWO.value, BathroomCoverage.THREE.value],
+    'relocation': [Relocation.NONE.value],
+}, {
+    'tank_type': [TankType.Tank.value],
+    'home_type': [HomeType.SINGLE_FAMILY.value, HomeType.TOWNHOME.value, HomeType.CONDO.value],
+    'power_type': [PowerType.GAS.value, PowerType.ELECTRIC.value],
+    'bathroom_coverage': [BathroomCoverage.FOURORMORE.value],
+    'relocation': [Relocation.NONE.value],
+}]
+
+# These conditions should return zero results
+ZERO_CONDITIONS = [{
+    'tank_type': [TankType.Tankless.value],
+    'home_type': HomeType.values,
+    'power_type': [PowerType.ELECTRIC.value, PowerType.PROPANE.value],
+    'bathroom_coverage': BathroomCoverage.values,
+    'relocation': Relocation.values,
+}]
+
+
+def condition_matches(condition: dict, criteria: dict) -> bool:
+    return all(criteria[name] in values for name, values in condition.items())
+
+
+def is_sorted(product_catalogs: List[ProductCatalog]) -> bool:
+    """ Popular products first, then cheapest first within each group. """
+    sort_keys = [(-product_catalog.is_popular, product_catalog.final_price())
+                 for product_catalog in product_catalogs]
+    return all(sort_keys[i] <= sort_keys[i+1] for i in range(len(sort_keys) - 1))
+
+
+def is_distinct(product_catalogs: List[ProductCatalog]) -> bool:
+    product_ids = [product_catalog.product_id for product_catalog in product_catalogs]
+    return len(product_ids) == len(set(product_ids))
+
+
+def verify_catalog(stair_access: Iterable[bool] = (False,)) -> Dict:
+    """ Evaluate every criteria tuple against the catalog with the SQL
+        matching of ProductCatalog.query_products_from_criteria, check the
+        in-memory ProductMatchIndex against it, and return a JSON
+        serializable coverage report.
+
+        Runs one query per criteria tuple and nothing is written.
+    """
+    started_at = time.perf_counter()
+    version, entries, catalogs = ProductMatchIndex().build(version=None)
+
+    non_zero = [{'condition': condition, 'checked': 0, 'failed': []}
+                for condition in NON_ZERO_CONDITIONS]
+    zero = [{'condition': condition, 'checked': 0, 'failed': []}
+            for condition in ZERO_CONDITIONS]
+    sort_failures = []
+    index_mismatches = []
+    coverage = []
+
+    criteria_space = itertools.product(
+        TankType.values, HomeType.values, PowerType.values,
+        BathroomCoverage.values, Relocation.values, stair_access)
+
+    for values in criteria_space:
+        criteria = dict(zip(CRITERIA_FIELDS, values))
+        product_catalogs = ProductCatalog.query_products_from_criteria(
+            ProductCriteria(**criteria))
+        product_catalog_ids = [product_catalog.id for product_catalog in product_catalogs]
+
+        coverage.append({**criteria, 'product_catalog_ids': product_catalog_ids})
+
+        key = values[:-1] + (criteria['stair_access'] * 100,)
+        indexed = [catalogs[id] for id in entries.get(key, ())]
+        if not (is_sorted(indexed) and is_distinct(indexed)):
+            sort_failures.append(criteria)
+        if [product_catalog.id for product_catalog in indexed] != product_catalog_ids:
+            index_mismatches.append(criteria)
+
+        for result in non_zero:
+            if condition_matches(result['condition'], criteria):
+                result['checked'] += 1
+                if not product_catalogs:
+                    result['failed'].append(criteria)
+
+        for result in zero:
+            if condition_matches(result['condition'], criteria):
+                result['checked'] += 1
+                if product_catalogs:
+                    result['failed'].append(criteria)
+
+    passed = not sort_failures and not index_mismatches and not any(
+        result['failed'] for result in non_zero + zero)
+
+    return {
+        'passed': passed,
+        'product_catalogs': len(catalogs),
+        'criteria': len(coverage),
+        'matched_criteria': sum(1 for entry in coverage if entry['product_catalog_ids']),
+        'sort_failures': sort_failures,
+        'index_mismatches': index_mismatches,
+        'non_zero_conditions': non_zero,
+        'zero_conditions': zero,
+        'coverage': coverage,
+        'elapsed_ms': round((time.perf_counter() - started_at) * 1000, 2),
+    }
@@ -1,17 +1,113 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
 import requests
 from django.conf import settings
+from django.core.cache import caches
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='calendly')
+
+# Calendly resource cache metrics for this process
+cache_stats = {'hits': 0, 'negative_hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def count(name):
+    with _stats_lock:
+        cache_stats[name] += 1
+
+
+def get_session() -> requests.Session:
+    """ Process wide keep-alive session, so Calendly calls reuse pooled
+        TCP/TLS connections. Idempotent requests are retried with backoff.
+    """
+    global _session
+    if _session is not None:
+        return _session
+
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=settings.CALENDLY_RETRIES,
+                backoff_factor=0.2,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=['GET'],
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=settings.CALENDLY_POOL_SIZE, max_retries=retry)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _session = session
+    return _session
 
 
 class CalendlyClient(object):
+    def __init__(self, timeout=None, use_cache=True):
+        self.session = get_session()
+        self.timeout = timeout or (
+            settings.CALENDLY_CONNECT_TIMEOUT, settings.CALENDLY_READ_TIMEOUT)
+        self.cache = caches[settings.CALENDLY_CACHE] if use_cache else None
+
     def get_header(self):
         return {'Authorization': f"Bearer {settings.CALENDLY_API_KEY}",'Content-Type': 'application/json'}
 
+    def get_cache_key(self, url):
+        return f"calendly:{hashlib.sha256(url.encode('utf-8')).hexdigest()}"
+
     def get(self, url):
+        """ GET a Calendly resource by URI. Found resources are cached for
+            CALENDLY_CACHE_TTL seconds and 404s for CALENDLY_NEGATIVE_CACHE_TTL,
+            so listener retries and double submits don't call Calendly again.
+        """
+        if self.cache is not None:
+            cached = self.cache.get(self.get_cache_key(url))
+            if cached is not None:
+                status_code, data = cached
+                count('negative_hits' if status_code == 404 else 'hits')
+                return data
+            count('misses')
+
         headers = self.get_header()
-        response=requests.get(url, headers=headers)
-        return response.json()
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        data = response.json()
+
+        if self.cache is not None:
+            if response.status_code == 200:
+                self.cache.set(self.get_cache_key(url), (200, data),
+                               settings.CALENDLY_CACHE_TTL)
+            elif response.status_code == 404:
+                self.cache.set(self.get_cache_key(url), (404, data),
+                               settings.CALENDLY_NEGATIVE_CACHE_TTL)
+        return data
+
+    def invalidate(self, url):
+        if self.cache is not None:
+            self.cache.delete(self.get_cache_key(url))
 
     def post(self, url):
         headers = self.get_header()
-        response = requests.post(url, headers=headers)
-        return response.json()
\ No newline at end of file
+        response = self.session.post(url, headers=headers, timeout=self.timeout)
+        return response.json()
+
+    def get_many(self, urls: List[str]) -> List[dict]:
+        """ Fetch several resources concurrently over the shared pool,
+            results are returned in the order of `urls`.
+        """
+        return list(_executor.map(self.get, urls))
+
+    async def aget(self, url):
+        return await asyncio.get_running_loop().run_in_executor(_executor, self.get, url)
+
+    async def apost(self, url):
+        return await asyncio.get_running_loop().run_in_executor(_executor, self.post, url)
+
+    async def aget_many(self, urls: List[str]) -> List[dict]:
+        return list(await asyncio.gather(*[self.aget(url) for url in urls]))
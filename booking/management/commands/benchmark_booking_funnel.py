@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from booking.benchmark import FunnelBenchmark, compare_to_baseline
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the booking funnel in process, with Calendly, Slack and Segment replaced by local fakes. '
+            'It runs against a throwaway test database, created and destroyed around the run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=20,
+            help='Number of timed funnel runs.')
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Number of untimed funnel runs before measuring.')
+        parser.add_argument(
+            '--allocation-iterations', type=int, default=5,
+            help='Number of extra runs traced with tracemalloc to measure allocations.')
+        parser.add_argument(
+            '--output', metavar='FILE',
+            help='Write the JSON results to FILE instead of stdout.')
+        parser.add_argument(
+            '--baseline', metavar='FILE',
+            help='Compare the results against a baseline JSON written by --output and fail on regressions.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='With --baseline, allowed p95 latency and allocation increase, as a fraction.')
+
+    def handle(self, *args, **kwargs):
+        # Every step commits, the rows it writes go to a test database
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            results = FunnelBenchmark(
+                iterations=kwargs.get('iterations'),
+                warmup=kwargs.get('warmup'),
+                allocation_iterations=kwargs.get('allocation_iterations'),
+            ).run()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = json.dumps(results, indent=2)
+        if kwargs.get('output'):
+            with open(kwargs.get('output'), 'w') as file:
+                file.write(report)
+        else:
+            self.stdout.write(report)
+
+        if not kwargs.get('baseline'):
+            return
+
+        with open(kwargs.get('baseline')) as file:
+            baseline = json.load(file)
+
+        regressions = compare_to_baseline(
+            results, baseline, tolerance=kwargs.get('tolerance'))
+        if regressions:
+            raise CommandError('Booking funnel regressed:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
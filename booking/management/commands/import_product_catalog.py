@@ -5,8 +5,11 @@ import os
 from gspread import Client
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from booking.catalog import catalog_version
+from booking.catalog_import import ProductCatalogImport
 from booking.models import (ProductCatalog, Product)
 from app.helper import parseInt, isNum
+from app.helper.sheets import iter_records, write_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -142,11 +145,29 @@ class Command(BaseCommand):
 
         return product_data, product_catalog_data
 
-    def import_sheet(self, account: Client):
-        sheet = account.open_by_key(
+    def get_worksheet(self, account: Client):
+        return account.open_by_key(
             settings.G_PRODUCT_CATALOG_SHEET_ID).worksheet("Product Catalog")
-        records = sheet.get_all_records()
 
+    def get_records(self, account: Client):
+        return self.get_worksheet(account).get_all_records()
+
+    def bulk_import_records(self, records, delete_missing: bool = False):
+        rows = (self.map_record_to_product_data(record) for record in records)
+        summary = ProductCatalogImport(rows, delete_missing=delete_missing).run()
+
+        catalog_version.bump()
+
+        self.stdout.write(
+            f"Products: {summary['products_created']} created, {summary['products_existing']} existing\n"
+            f"Product catalogs: {summary['created']} created, {summary['updated']} updated, "
+            f"{summary['unchanged']} unchanged, {summary['deleted']} deleted, "
+            f"{summary['kept']} missing from sheet but kept, {summary['duplicated']} duplicated rows")
+
+    def import_sheet(self, account: Client):
+        self.import_records(self.get_records(account))
+
+    def import_records(self, records):
         results = []
         duplicated = []
         for record in records:
@@ -172,15 +193,48 @@ class Command(BaseCommand):
             else:
                 duplicated.append(product_catalog)
 
+        catalog_version.bump()
+
         logger.info(
             f'{len(results)}s product catalogs ({len(duplicated)}s duplicated) imported!')
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bulk', action='store_true',
+            help='Diff the sheet against the database and apply only the changes in bulk.')
+        parser.add_argument(
+            '--delete-missing', action='store_true',
+            help='With --bulk, delete catalogs missing from the sheet unless a customer selected them.')
+        parser.add_argument(
+            '--source', metavar='FILE',
+            help='Import from a .csv/.xlsx snapshot instead of the live Google Sheet.')
+        parser.add_argument(
+            '--snapshot', metavar='FILE',
+            help='Write the live Google Sheet to a .csv/.xlsx file and exit without importing.')
+
     def handle(self, *args, **kwargs):
-        account = self.authorize()
-        if not account:
-            logger.debug('Authorization Failed.')
+        source = kwargs.get('source')
+        if source:
+            records = iter_records(source)
+        else:
+            account = self.authorize()
+            if not account:
+                logger.debug('Authorization Failed.')
+                return
+
+            logger.debug('Authorized.')
+
+            if kwargs.get('snapshot'):
+                write_snapshot(kwargs['snapshot'],
+                               self.get_worksheet(account).get_all_values())
+                self.stdout.write(f"Snapshot written to {kwargs['snapshot']}")
+                return
+
+            records = self.get_records(account)
+
+        if kwargs.get('bulk'):
+            self.bulk_import_records(
+                records, delete_missing=kwargs.get('delete_missing'))
             return
 
-        logger.debug('Authorized.')
-
-        self.import_sheet(account)
+        self.import_records(records)
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+
+from booking.typeform import process_typeform_deliveries
+
+
+class Command(BaseCommand):
+    help = 'Apply stored Typeform webhook deliveries to their ProductCriteria, in the order they were received.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for deliveries instead of exiting once they are processed.')
+        parser.add_argument('--interval', type=float, default=2,
+                            help='Seconds to sleep between polls when nothing was processed.')
+
+    def handle(self, *args, **options):
+        while True:
+            processed, failed = process_typeform_deliveries(
+                batch_size=options['batch_size'])
+            if processed or failed:
+                self.stdout.write(f'{processed} processed, {failed} failed')
+                continue
+
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
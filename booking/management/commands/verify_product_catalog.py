@@ -1,9 +1,11 @@
 import curses
 import itertools
+import json
 import logging
 
 from typing import Dict, List, Tuple
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from booking.catalog_verification import verify_catalog
 from booking.models import (BathroomCoverage, HomeType,
                             PowerType, ProductCatalog, Relocation, TankType)
 from booking.tests.factories import CustomerLeadFactory, ProductCriteriaFactory
@@ -169,5 +171,36 @@ class Command(BaseCommand):
 
         verify_conditions()
 
+    def verify_headless(self, output: str = None, stair_access: bool = False):
+        report = verify_catalog(
+            stair_access=(False, True) if stair_access else (False,))
+        report_json = json.dumps(report, indent=2)
+
+        if output:
+            with open(output, 'w') as file:
+                file.write(report_json)
+        else:
+            self.stdout.write(report_json)
+
+        if not report['passed']:
+            raise CommandError(
+                f"Product catalog verification failed in {report['elapsed_ms']}ms")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--headless', action='store_true',
+            help='Check every criteria against the SQL matching and the match index without the curses UI or database writes, and print a JSON report.')
+        parser.add_argument(
+            '--output', metavar='FILE',
+            help='With --headless, write the JSON report to FILE instead of stdout.')
+        parser.add_argument(
+            '--stairs', action='store_true',
+            help='With --headless, also check criteria with stair access.')
+
     def handle(self, *args, **kwargs):
+        if kwargs.get('headless'):
+            self.verify_headless(
+                output=kwargs.get('output'), stair_access=kwargs.get('stairs'))
+            return
+
         self.verify_search_results()
@@ -1,15 +1,19 @@
 import uuid
+from typing import Optional
 import auto_prefetch
+from django.conf import settings
 from django.db import models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.db.models import JSONField
-from simple_history.models import HistoricalRecords
+from app.helper.history import BufferedHistoricalRecords
 
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 import pytz
-from datetime import datetime
+from datetime import datetime, timedelta
 from app.helper.slack import post_to_boom
 
 
@@ -21,6 +25,38 @@ class TypeformResponse(auto_prefetch.Model):
     hidden = JSONField()
 
 
+class TypeformDelivery(auto_prefetch.Model):
+    """ Raw Typeform webhook payload, stored by response token when
+        TYPEFORM_DEFERRED is on and applied by `manage.py process_typeform_deliveries`.
+    """
+    class Status(models.TextChoices):
+        Pending = "PENDING", _("Pending")
+        Processed = "DONE", _("Processed")
+        Failed = "FAILED", _("Failed")
+
+    token = models.TextField(unique=True)
+    # Lead the response is for, its deliveries are applied in order
+    url_token = models.CharField(max_length=255, blank=True)
+    payload = JSONField()
+    status = models.CharField(
+        max_length=8, choices=Status.choices, default=Status.Pending)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['url_token', 'id'], name='typeform_pending_lead_idx',
+                         condition=models.Q(status='PENDING')),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.id} {self.token} {self.status}"
+
+
 class CalendlyEvent(auto_prefetch.Model):
     uri = models.TextField()
     name = models.TextField()
@@ -43,6 +79,11 @@ class CalendlyInvitee(auto_prefetch.Model):
     event = auto_prefetch.ForeignKey(
         CalendlyEvent, on_delete=models.CASCADE)
 
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            models.Index(fields=['uuid'], name='calendly_invitee_uuid_idx'),
+        ]
+
     @classmethod
     def remove_old_calendly_invitee(cls, id):
         cls.objects.filter(id=id).delete()
@@ -132,7 +173,13 @@ class Product(auto_prefetch.Model):
     power_output_btu = models.CharField(
         max_length=255, blank=True, null=True)
     home_coverage = models.CharField(max_length=255)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
+
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            GinIndex(fields=['bathroom_coverages'], name='product_bathroom_gin'),
+            models.Index(fields=['tank_type', 'power_type'], name='product_tank_power_idx'),
+        ]
 
 
 # ProductCatalog includes any variable associated with price/value of a product
@@ -152,7 +199,12 @@ class ProductCatalog(auto_prefetch.Model):
     federal_tax_credit = models.IntegerField(blank=True, null=True)
     product = auto_prefetch.ForeignKey(
         Product, on_delete=models.CASCADE, null=True)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
+
+    class Meta(auto_prefetch.Model.Meta):
+        indexes = [
+            GinIndex(fields=['home_types'], name='catalog_home_types_gin'),
+        ]
 
     def relocation(self):
         if self.current_location == self.desired_location:
@@ -168,13 +220,26 @@ class ProductCatalog(auto_prefetch.Model):
 
     @classmethod
     def get_products_from_criteria(cls, product_criteria):
+        if settings.PRODUCT_MATCH_INDEX:
+            from booking.catalog import product_match_index
+            return product_match_index.get_products(product_criteria)
+
+        return cls.query_products_from_criteria(product_criteria)
+
+    @classmethod
+    def query_products_from_criteria(cls, product_criteria):
+        return sorted(cls.criteria_queryset(product_criteria),
+                      key=lambda product: (-product.is_popular, product.final_price()))
+
+    @classmethod
+    def criteria_queryset(cls, product_criteria):
         queryset = cls.objects
         desired_location = models.F('current_location')
         if product_criteria.relocation != Relocation.NONE:
             desired_location = product_criteria.relocation
             queryset = queryset.exclude(current_location=desired_location)
 
-        product_catalog_query_set = queryset.filter(
+        return queryset.filter(
             home_types__contains=[product_criteria.home_type],
             product__power_type=product_criteria.power_type,
             product__tank_type=product_criteria.tank_type,
@@ -182,10 +247,23 @@ class ProductCatalog(auto_prefetch.Model):
                 product_criteria.bathroom_coverage],
             desired_location=desired_location,
             stair_price=product_criteria.stair_access*100
-        ).all().distinct('product')
+        ).order_by('product', 'id').distinct('product')
 
-        return sorted(product_catalog_query_set,
-                      key=lambda product: (-product.is_popular, product.final_price()))
+
+class ProductCatalogVersion(auto_prefetch.Model):
+    """ Single row counter shared by all instances, bumped whenever the
+        catalog is imported or edited so process-local caches can expire.
+    """
+    version = models.IntegerField(default=0)
+
+    @classmethod
+    def get_version(cls) -> int:
+        return cls.objects.values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls) -> None:
+        if not cls.objects.update(version=models.F('version') + 1):
+            cls.objects.create(version=1)
 
 
 class ProductCriteria(auto_prefetch.Model):
@@ -205,7 +283,7 @@ class ProductCriteria(auto_prefetch.Model):
         TypeformResponse, on_delete=models.CASCADE, null=True)
     customer_lead = models.OneToOneField(
         CustomerLead, on_delete=models.CASCADE, null=True, related_name="product_criteria")
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def get_criteria_with_customer_lead(customer_lead):
         return ProductCriteria.objects.filter(customer_lead=customer_lead).first()
@@ -216,7 +294,7 @@ class SelectedProduct(auto_prefetch.Model):
         ProductCatalog, on_delete=models.CASCADE, null=True)
     customer_lead = models.OneToOneField(
         CustomerLead, on_delete=models.CASCADE, null=True, related_name="selected_product")
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
     def __str__(self) -> str:
         return f"{self.product_catalog.product.title}"
@@ -238,7 +316,7 @@ class Order(auto_prefetch.Model):
         'app.Appointment', on_delete=models.CASCADE)
     order_status = models.CharField(
         max_length=8, choices=OrderStatus.choices, default=OrderStatus.Ordered)
-    history = HistoricalRecords()
+    history = BufferedHistoricalRecords()
 
 
 @receiver(post_save, sender=Order, dispatch_uid="post_order_to_slack")
@@ -257,3 +335,23 @@ def post_order_saved(sender, instance, created, update_fields, **kwargs):
         f"{instance.customer.phone}\n"
     )
     post_to_boom(text=message)
+
+
+class OrderSubmission(auto_prefetch.Model):
+    """ Outcome of a submit_customer_order call by idempotency key, so
+        retries and double submits return the stored order.
+    """
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    order = auto_prefetch.ForeignKey(Order, on_delete=models.CASCADE, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.id} {self.idempotency_key} {self.order_id}"
+
+    def is_replay(self, replay_window: Optional[int] = None) -> bool:
+        """ Whether a submission with the same key returns this order,
+            `replay_window` seconds after it was made or for ever with None.
+        """
+        if self.order_id is None:
+            return False
+        return replay_window is None or self.created_at >= timezone.now() - timedelta(seconds=replay_window)
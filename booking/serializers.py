@@ -3,6 +3,7 @@ from typing import List, Tuple
 
 from app.models import Customer
 from booking.models import CalendlyEvent, CalendlyInvitee, ProductCatalog, ProductCriteria, SelectedProduct, TypeformResponse, Product, CustomerLead
+from booking.tokens import get_or_create_lead
 from rest_framework import serializers
 
 class TypeformSerializer(serializers.ModelSerializer):
@@ -12,8 +13,7 @@ class TypeformSerializer(serializers.ModelSerializer):
         fields = ['form_id', 'token', 'definition', 'variables', 'hidden']
 
     def map_hidden(self, hidden: dict[str, any]) -> int:
-        customer_lead = CustomerLead.get_customer_with_url_token(
-            url_token=hidden.get('url_token'))
+        customer_lead = get_or_create_lead(hidden.get('url_token'))
         if customer_lead:
             return customer_lead.id
         else:
@@ -1,7 +1,10 @@
+from .benchmark import *
 from .client import *
 from .customer_order import *
 from .product_catalog import *
 from .product_criteria import *
+from .product_match_index import *
+from .query_budget import *
 from .scheduling import *
 from .select_product import *
 from .url_token import *
@@ -0,0 +1,54 @@
+from django.test import SimpleTestCase, TransactionTestCase
+
+from app.models import SlackMessage
+from booking.benchmark import STEPS, FunnelBenchmark, compare_to_baseline, percentile
+
+
+class FunnelBenchmarkTests(SimpleTestCase):
+    def get_results(self, p95_ms=10.0, queries=5, allocated_kb=100.0):
+        return {'steps': {'select_product': {
+            'p50_ms': p95_ms, 'p95_ms': p95_ms, 'p99_ms': p95_ms,
+            'queries': queries, 'allocated_kb': allocated_kb,
+        }}}
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_within_tolerance(self):
+        baseline = self.get_results()
+
+        self.assertEqual(compare_to_baseline(
+            self.get_results(p95_ms=11.0), baseline, tolerance=0.2), [])
+
+    def test_regressions(self):
+        baseline = self.get_results()
+
+        regressions = compare_to_baseline(
+            self.get_results(p95_ms=20.0, queries=6, allocated_kb=200.0), baseline, tolerance=0.2)
+
+        self.assertEqual(len(regressions), 3)
+
+    def test_ignores_steps_missing_from_baseline(self):
+        self.assertEqual(compare_to_baseline(
+            self.get_results(p95_ms=20.0), {'steps': {}}), [])
+
+
+class FunnelBenchmarkRunTests(TransactionTestCase):
+    def test_run(self):
+        results = FunnelBenchmark(iterations=2, warmup=1, allocation_iterations=1, seed=3).run()
+
+        self.assertEqual(list(results['steps']), STEPS)
+        for name, step in results['steps'].items():
+            self.assertGreater(step['p95_ms'], 0, name)
+            self.assertGreater(step['allocated_kb'], 0, name)
+        # 4 funnel runs, each fetching the Calendly event and invitee and
+        # identifying the new customer after commit
+        self.assertEqual(results['external_calls']['calendly'], 8)
+        self.assertGreater(results['external_calls']['segment'], 0)
+        self.assertEqual(results['external_calls']['slack'], SlackMessage.objects.count())
+        self.assertGreater(results['steps']['submit_customer_order']['queries'], 0)
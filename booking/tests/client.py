@@ -20,3 +20,40 @@ class CalendlyClientTests(APITransactionTestCase):
         response_data = calendly_client.get(url=calendly_event_uri)
 
         self.assertEqual(response_data.get('resource').get('uri'), calendly_event_uri)
+
+    @responses.activate
+    def test_get_many(self):
+        calendly_data = generate_calendly_scheduled_payload()
+        calendly_event_uri = calendly_data.get('payload').get('event').get('uri')
+        calendly_invitee_uri = calendly_data.get('payload').get('invitee').get('uri')
+
+        responses.get(calendly_event_uri, json={"resource": {"uri": calendly_event_uri}})
+        responses.get(calendly_invitee_uri, json={"resource": {"uri": calendly_invitee_uri}})
+
+        calendly_client = CalendlyClient()
+        event_data, invitee_data = calendly_client.get_many(
+            [calendly_event_uri, calendly_invitee_uri])
+
+        self.assertEqual(event_data.get('resource').get('uri'), calendly_event_uri)
+        self.assertEqual(invitee_data.get('resource').get('uri'), calendly_invitee_uri)
+        self.assertIs(calendly_client.session, CalendlyClient().session)
+
+    @responses.activate
+    def test_get_is_cached(self):
+        calendly_data = generate_calendly_scheduled_payload()
+        calendly_event_uri = calendly_data.get('payload').get('event').get('uri')
+        calendly_invitee_uri = calendly_data.get('payload').get('invitee').get('uri')
+
+        responses.get(calendly_event_uri, json={"resource": {"uri": calendly_event_uri}})
+        responses.get(calendly_invitee_uri, status=404, json={"title": "Resource Not Found"})
+
+        calendly_client = CalendlyClient()
+        for _ in range(2):
+            self.assertEqual(calendly_client.get(url=calendly_event_uri).get('resource').get('uri'), calendly_event_uri)
+            self.assertEqual(calendly_client.get(url=calendly_invitee_uri).get('title'), "Resource Not Found")
+
+        self.assertEqual(len(responses.calls), 2)
+
+        calendly_client.invalidate(calendly_event_uri)
+        calendly_client.get(url=calendly_event_uri)
+        self.assertEqual(len(responses.calls), 3)
@@ -1,7 +1,11 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 from app.models import Appointment, Customer, Job, Address
-from booking.models import Order
+from booking.models import Order, OrderSubmission
 from booking.serializers import SelectedProductSerializer
 from booking.tests.factories import SelectedProductFactory, SubmitBookingFormFactory
 from django.db.models import signals
@@ -41,3 +45,62 @@ class CustomerOrderTests(APITransactionTestCase):
         order = Order.objects.first()
         self.assertEqual(order.customer.id, customer.id)
         self.assertEqual(order.appointment.id, appointment.id)
+
+    def submit(self, post_data, **kwargs):
+        return self.client.post(
+            "/api/booking/customer_order/", post_data, format="json", **kwargs)
+
+    def get_post_data(self):
+        signals.post_save.disconnect(
+            sender=Customer, dispatch_uid="emit_identify_to_segment")
+        signals.post_save.disconnect(
+            sender=Order, dispatch_uid="post_order_to_slack")
+
+        selected_product = SelectedProductFactory.create()
+        return SubmitBookingFormFactory.create(
+            selected_product=SelectedProductSerializer(selected_product).data
+        )
+
+    def test_replay_with_idempotency_key(self):
+        post_data = self.get_post_data()
+
+        first = self.submit(post_data, HTTP_IDEMPOTENCY_KEY="order-1")
+        second = self.submit(post_data, HTTP_IDEMPOTENCY_KEY="order-1")
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(Order.objects.count(), 1)
+        self.assertEqual(Appointment.objects.count(), 1)
+        self.assertEqual(Address.objects.count(), 2)
+
+    def test_replay_of_identical_payload(self):
+        post_data = self.get_post_data()
+
+        first = self.submit(post_data)
+        second = self.submit(post_data)
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_identical_payload_after_the_replay_window_is_a_new_order(self):
+        post_data = self.get_post_data()
+
+        self.submit(post_data)
+        OrderSubmission.objects.update(
+            created_at=timezone.now() - timedelta(seconds=settings.ORDER_REPLAY_WINDOW + 1))
+        response = self.submit(post_data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Job.objects.count(), 2)
+        self.assertEqual(OrderSubmission.objects.count(), 1)
+
+    def test_invalid_submission_writes_nothing(self):
+        post_data = self.get_post_data()
+        post_data["appointment"]["date"] = "not a date"
+
+        response = self.submit(post_data)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Address.objects.count(), 0)
+        self.assertEqual(Customer.objects.count(), 0)
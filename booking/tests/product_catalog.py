@@ -1,8 +1,14 @@
+import csv
+import os
+import tempfile
 import responses
 from django.core.management import call_command
 from django.test import TestCase
 
-from booking.tests.factories import CatalogWorksheetRowFactory
+from booking.catalog_import import ProductCatalogImport
+from booking.management.commands.import_product_catalog import Command as ImportProductCatalogCommand
+from booking.models import Product, ProductCatalog, SelectedProduct
+from booking.tests.factories import CatalogWorksheetRowFactory, SelectedProductFactory
 
 
 class ProductCatalogImportTest(TestCase):
@@ -49,3 +55,82 @@ class ProductCatalogImportTest(TestCase):
 
         call_command('import_product_catalog')
         return super().setUp()
+
+
+class ProductCatalogBulkImportTest(TestCase):
+    header = ['Product Title', 'Description', 'Type', 'Home Type', 'Power Source', 'Bathrooms in Home',
+              'Current Location', 'Desired Location', 'Presence of Stairs', 'Brand', 'Popular Choice',
+              'Base Price', 'Unit Type', 'Home Coverage (People)', 'Water Flow (GPM)', 'Power Output (BTU)',
+              'Warranty (Years)', 'Total Rebates', 'SoCal Gas Rebate', 'Federal Tax Credit']
+
+    def get_rows(self, records):
+        command = ImportProductCatalogCommand()
+        return [command.map_record_to_product_data(record) for record in records]
+
+    def test_bulk_import_diff(self):
+        records = [dict(zip(self.header, CatalogWorksheetRowFactory.create().values()))
+                   for _ in range(3)]
+
+        summary = ProductCatalogImport(self.get_rows(records)).run()
+        self.assertEqual(summary['created'] + summary['duplicated'], 3)
+        self.assertEqual(ProductCatalog.objects.count(), summary['created'])
+        self.assertEqual(Product.objects.count(), summary['products_created'])
+
+        summary = ProductCatalogImport(self.get_rows(records)).run()
+        self.assertEqual(summary['created'], 0)
+        self.assertEqual(summary['updated'], 0)
+
+        records[0]['Base Price'] = '$9,999'
+        summary = ProductCatalogImport(self.get_rows(records[:1])).run()
+        self.assertEqual(summary['updated'], 1)
+        self.assertEqual(summary['kept'], ProductCatalog.objects.count() - 1)
+        self.assertTrue(ProductCatalog.objects.filter(base_price=9999).exists())
+
+        summary = ProductCatalogImport(
+            self.get_rows(records[:1]), delete_missing=True).run()
+        self.assertEqual(ProductCatalog.objects.count(), 1)
+
+    def test_bulk_import_keeps_existing_products(self):
+        record = dict(zip(self.header, CatalogWorksheetRowFactory.create().values()))
+        ProductCatalogImport(self.get_rows([record])).run()
+        product = Product.objects.get()
+
+        record['Description'] = 'Changed in the sheet'
+        record['Base Price'] = '$9,999'
+        summary = ProductCatalogImport(self.get_rows([record])).run()
+
+        self.assertEqual(summary['products_created'], 0)
+        self.assertEqual(summary['products_existing'], 1)
+        self.assertEqual(Product.objects.get().description, product.description)
+        self.assertEqual(summary['updated'], 1)
+        self.assertEqual(ProductCatalog.objects.get().base_price, 9999)
+
+    def test_bulk_import_keeps_the_price_of_selected_catalogs(self):
+        record = dict(zip(self.header, CatalogWorksheetRowFactory.create().values()))
+        ProductCatalogImport(self.get_rows([record])).run()
+        selected = SelectedProductFactory.create(product_catalog=ProductCatalog.objects.get())
+        final_price = selected.product_catalog.final_price()
+
+        record['Base Price'] = '$9,999'
+        summary = ProductCatalogImport(self.get_rows([record])).run()
+
+        self.assertEqual((summary['created'], summary['updated']), (1, 0))
+        selected = SelectedProduct.objects.get(pk=selected.pk)
+        self.assertEqual(selected.product_catalog.final_price(), final_price)
+        self.assertTrue(ProductCatalog.objects.filter(base_price=9999).exists())
+
+        summary = ProductCatalogImport(self.get_rows([record])).run()
+        self.assertEqual((summary['created'], summary['updated'], summary['unchanged']), (0, 0, 1))
+
+    def test_import_from_csv_source(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'product_catalog.csv')
+            with open(path, 'w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(self.header)
+                for _ in range(3):
+                    writer.writerow(CatalogWorksheetRowFactory.create().values())
+
+            call_command('import_product_catalog', source=path, bulk=True)
+
+        self.assertGreater(ProductCatalog.objects.count(), 0)
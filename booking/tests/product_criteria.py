@@ -1,10 +1,15 @@
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 from booking.tests.factories import (
     ProductCriteriaFactory,
     TypeformResponseDataFactory,
     CustomerLeadFactory)
-from booking.models import TankType
+from booking.models import ProductCriteria, TankType, TypeformDelivery, TypeformResponse
+from booking.typeform import process_typeform_deliveries
 
 # Sample API post data from Typeform:
 # "form_response": {
@@ -89,3 +94,82 @@ class ProductCriteriaTests(APITransactionTestCase):
             "/api/booking/typeform/", bad_typeform_response_data, format="json")
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(TYPEFORM_DEFERRED=True)
+class DeferredTypeformTests(APITransactionTestCase):
+    def post(self, typeform_response_data):
+        return self.client.post(
+            "/api/booking/typeform/", typeform_response_data, format="json")
+
+    def test_redelivery_is_stored_once(self):
+        typeform_response_data = TypeformResponseDataFactory.create(
+            form_response__form_id="E",
+            form_response__token="F"
+        )
+
+        first = self.post(typeform_response_data)
+        second = self.post(typeform_response_data)
+
+        self.assertEqual(first.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(TypeformDelivery.objects.count(), 1)
+        self.assertEqual(TypeformResponse.objects.count(), 0)
+
+    def test_deliveries_are_applied_by_worker(self):
+        typeform_response_data = TypeformResponseDataFactory.create(
+            form_response__form_id="G",
+            form_response__token="H"
+        )
+        url_token = typeform_response_data.get(
+            'form_response').get('hidden').get('url_token')
+        customer_lead = CustomerLeadFactory.create(url_token=url_token)
+        ProductCriteriaFactory.create(customer_lead=customer_lead)
+        self.post(typeform_response_data)
+
+        processed, failed = process_typeform_deliveries()
+
+        self.assertEqual((processed, failed), (1, 0))
+        delivery = TypeformDelivery.objects.get(token="H")
+        self.assertEqual(delivery.status, TypeformDelivery.Status.Processed)
+        product_criteria = ProductCriteria.objects.get(customer_lead=customer_lead)
+        self.assertEqual(product_criteria.typeform_response.token, "H")
+        self.assertEqual(process_typeform_deliveries(), (0, 0))
+
+    def test_invalid_delivery_fails(self):
+        typeform_response_data = TypeformResponseDataFactory.create(
+            form_response__form_id="I",
+            form_response__token="J"
+        )
+        del typeform_response_data['form_response']['definition']
+        self.post(typeform_response_data)
+
+        self.assertEqual(process_typeform_deliveries(), (0, 1))
+        self.assertEqual(TypeformDelivery.objects.get(
+            token="J").status, TypeformDelivery.Status.Failed)
+
+    def test_retried_delivery_only_holds_back_its_lead(self):
+        for token, url_token in [('A1', 'lead-a'), ('A2', 'lead-a'), ('B1', 'lead-b')]:
+            TypeformDelivery.objects.create(
+                token=token, url_token=url_token, payload={'token': token})
+        applied = []
+
+        def apply(form_response):
+            if form_response['token'] == 'A1':
+                raise RuntimeError('database went away')
+            applied.append(form_response['token'])
+
+        with mock.patch('booking.typeform.apply_typeform_response', apply):
+            self.assertEqual(process_typeform_deliveries(), (1, 0))
+            self.assertEqual(applied, ['B1'])
+            retried = TypeformDelivery.objects.get(token='A1')
+            self.assertEqual(retried.attempts, 1)
+            self.assertGreater(retried.next_attempt_at, retried.received_at)
+
+            # Not due yet, A2 still waits behind it
+            self.assertEqual(process_typeform_deliveries(), (0, 0))
+
+            TypeformDelivery.objects.filter(token='A1').update(next_attempt_at=timezone.now())
+            self.assertEqual(process_typeform_deliveries(), (0, 0))
+            self.assertEqual(TypeformDelivery.objects.get(token='A1').attempts, 2)
+            self.assertEqual(applied, ['B1'])
@@ -0,0 +1,153 @@
+import itertools
+from unittest import mock
+
+from django.test import TestCase
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from booking.catalog import catalog_version, product_match_index, product_selection_cache
+from booking.catalog_verification import verify_catalog
+from booking.models import (BathroomCoverage, HomeType, PowerType,
+                            ProductCatalog, ProductCriteria, Relocation, TankType)
+from booking.serializers import ProductCatalogSerializer
+from booking.tests.factories import (CustomerLeadFactory, ProductCatalogFactory,
+                                     ProductCriteriaFactory, ProductFactory)
+
+
+class ProductMatchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        tankless_gas = ProductFactory.create(
+            tank_type=TankType.Tankless, power_type=PowerType.GAS, bathroom_coverages=[1, 2, 3])
+        tank_electric = ProductFactory.create(
+            tank_type=TankType.Tank, power_type=PowerType.ELECTRIC, bathroom_coverages=[3, 4])
+
+        for product in [tankless_gas, tank_electric]:
+            for is_popular, base_price, stair_price in [(True, 3000, 0), (False, 2000, 0), (False, 2500, 100)]:
+                ProductCatalogFactory.create(
+                    product=product,
+                    home_types=[HomeType.SINGLE_FAMILY, HomeType.CONDO],
+                    current_location=Relocation.NONE,
+                    desired_location=Relocation.NONE,
+                    is_popular=is_popular,
+                    base_price=base_price,
+                    stair_price=stair_price,
+                    total_rebates=0)
+
+        ProductCatalogFactory.create(
+            product=tankless_gas,
+            home_types=[HomeType.TOWNHOME],
+            current_location=Relocation.GARAGE,
+            desired_location=Relocation.BASEMENGT,
+            stair_price=0)
+        ProductCatalogFactory.create(
+            product=tank_electric,
+            home_types=[HomeType.TOWNHOME],
+            current_location=Relocation.GARAGE,
+            desired_location=Relocation.GARAGE,
+            stair_price=0)
+
+    def setUp(self):
+        product_match_index.invalidate()
+
+    def test_index_matches_query(self):
+        criteria_space = itertools.product(
+            TankType.values, HomeType.values, PowerType.values,
+            BathroomCoverage.values, Relocation.values, [False, True])
+
+        for tank_type, home_type, power_type, bathroom_coverage, relocation, stair_access in criteria_space:
+            product_criteria = ProductCriteria(
+                tank_type=tank_type, home_type=home_type, power_type=power_type,
+                bathroom_coverage=bathroom_coverage, relocation=relocation, stair_access=stair_access)
+
+            expected = [product.id for product in ProductCatalog.query_products_from_criteria(
+                product_criteria)]
+            self.assertEqual(
+                list(product_match_index.get_ids(product_criteria)), expected)
+
+    def test_index_lookup_without_queries(self):
+        product_criteria = ProductCriteria(
+            tank_type=TankType.Tankless, home_type=HomeType.SINGLE_FAMILY, power_type=PowerType.GAS,
+            bathroom_coverage=BathroomCoverage.ONE, relocation=Relocation.NONE, stair_access=False)
+        product_match_index.get_products(product_criteria)
+
+        with self.assertNumQueries(0):
+            products = ProductCatalog.get_products_from_criteria(product_criteria)
+            [product.product.title for product in products]
+
+    def test_verify_catalog_matches_the_sql_criteria(self):
+        report = verify_catalog(stair_access=(False, True))
+
+        self.assertEqual(report['criteria'], len(TankType.values) * len(HomeType.values) * len(PowerType.values)
+                         * len(BathroomCoverage.values) * len(Relocation.values) * 2)
+        self.assertEqual(report['sort_failures'], [])
+        self.assertEqual(report['index_mismatches'], [])
+        for entry in report['coverage']:
+            product_criteria = ProductCriteria(**{
+                name: value for name, value in entry.items() if name != 'product_catalog_ids'})
+            expected = [product.id for product in ProductCatalog.query_products_from_criteria(
+                product_criteria)]
+            self.assertEqual(entry['product_catalog_ids'], expected)
+
+    def test_verify_catalog_reports_index_mismatches(self):
+        with mock.patch('booking.catalog.ProductMatchIndex.build', return_value=((0, 0), {}, {})):
+            report = verify_catalog()
+
+        self.assertFalse(report['passed'])
+        self.assertEqual(len(report['index_mismatches']), report['matched_criteria'])
+        self.assertGreater(report['matched_criteria'], 0)
+
+    def test_index_rebuilds_on_catalog_change(self):
+        product_criteria = ProductCriteria(
+            tank_type=TankType.Tankless, home_type=HomeType.TOWNHOME, power_type=PowerType.GAS,
+            bathroom_coverage=BathroomCoverage.TWO, relocation=Relocation.BASEMENGT, stair_access=False)
+        self.assertEqual(len(product_match_index.get_ids(product_criteria)), 1)
+
+        ProductCatalog.objects.filter(home_types=[HomeType.TOWNHOME]).delete()
+
+        self.assertEqual(len(product_match_index.get_ids(product_criteria)), 0)
+
+
+class ProductSelectionCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        product = ProductFactory.create(
+            tank_type=TankType.Tankless, power_type=PowerType.GAS, bathroom_coverages=[1, 2])
+        cls.product_catalog = ProductCatalogFactory.create(
+            product=product,
+            home_types=[HomeType.SINGLE_FAMILY],
+            current_location=Relocation.NONE,
+            desired_location=Relocation.NONE,
+            stair_price=0)
+        cls.customer_lead = CustomerLeadFactory.create()
+        ProductCriteriaFactory.create(customer_lead=cls.customer_lead)
+
+    def setUp(self):
+        product_selection_cache.clear()
+
+    def get_selected_product_list(self):
+        response = self.client.get(
+            f"/api/booking/product/selected/{self.customer_lead.url_token}", format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_cached_response_matches_serializer(self):
+        first = self.get_selected_product_list()
+        hits = product_selection_cache.hits
+        second = self.get_selected_product_list()
+
+        self.assertEqual(product_selection_cache.hits, hits + 1)
+        self.assertEqual(first, second)
+        self.assertEqual(first['product_catalog'], [
+            dict(ProductCatalogSerializer(self.product_catalog).data)])
+        self.assertEqual(first['product_criteria']['customer_lead'], self.customer_lead.id)
+
+    def test_catalog_version_bump_invalidates(self):
+        self.get_selected_product_list()
+
+        ProductCatalog.objects.filter(id=self.product_catalog.id).update(base_price=1)
+        catalog_version.bump()
+
+        response = self.get_selected_product_list()
+        self.assertEqual(response['product_catalog'][0]['base_price'], 1)
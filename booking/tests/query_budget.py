@@ -0,0 +1,164 @@
+import re
+from urllib.parse import urlencode
+
+import responses
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from backend.db.queries import QueryBudgetExceeded, QueryRecorder, enforce_budget
+from backend.db.testing import QueryBudgetTestMixin
+from booking import urls
+from booking.models import CustomerLead, ProductCriteria
+from booking.serializers import ProductCriteriaSerializer, SelectedProductSerializer
+from booking.tests.factories import (CalendlyEventResourceFactory, CalendlyInviteeResourceFactory,
+                                     CustomerLeadFactory, ProductCatalogFactory, ProductCriteriaFactory,
+                                     SelectedProductFactory, SubmitBookingFormFactory,
+                                     TypeformResponseDataFactory, generate_calendly_scheduled_payload)
+
+
+class QueryBudgetTests(QueryBudgetTestMixin, APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer_lead = CustomerLeadFactory.create()
+        cls.product_criteria = ProductCriteriaFactory.create(
+            customer_lead=cls.customer_lead)
+        cls.product_catalog = ProductCatalogFactory.create()
+
+    def post_calendly_data(self):
+        calendly_data = generate_calendly_scheduled_payload()
+        event_uri = calendly_data['payload']['event']['uri']
+        invitee_uri = calendly_data['payload']['invitee']['uri']
+
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as mocked:
+            mocked.get(event_uri, json={'resource': CalendlyEventResourceFactory.create(uri=event_uri)})
+            mocked.get(invitee_uri, json={'resource': CalendlyInviteeResourceFactory.create(uri=invitee_uri)})
+            return self.client.post('/api/booking/calendly/', {
+                'url_token': self.customer_lead.url_token,
+                'calendly_data': calendly_data,
+            }, format='json')
+
+    def test_routes_have_budgets(self):
+        self.assertRoutesHaveBudgets(urls.urlpatterns)
+
+    def test_recorder_counts_duplicates(self):
+        with QueryRecorder().record() as recorder:
+            CustomerLead.objects.filter(id=self.customer_lead.id).exists()
+            CustomerLead.objects.filter(id=self.customer_lead.id).exists()
+
+        summary = recorder.summary()
+        self.assertEqual(summary['queries'], 2)
+        self.assertEqual(summary['duplicates'], 1)
+        self.assertIn('booking/tests/query_budget.py', recorder.queries[0].call_site)
+
+    @override_settings(QUERY_BUDGET_RAISE=True)
+    def test_only_routes_with_a_budget_raise(self):
+        summary = {'queries': 101, 'duplicates': 0, 'time_ms': 1.0, 'n_plus_one': []}
+
+        with self.assertLogs('backend.db.queries', 'WARNING'):
+            enforce_budget('pro_job_list', summary)
+        with self.assertRaises(QueryBudgetExceeded):
+            enforce_budget('select_product', summary)
+
+    def test_parameters_are_only_kept_with_call_sites(self):
+        with QueryRecorder(call_sites=False).record() as recorder:
+            CustomerLead.objects.filter(id=self.customer_lead.id).exists()
+            CustomerLead.objects.filter(id=self.customer_lead.id).exists()
+
+        self.assertIsNone(recorder.queries[0].params)
+        self.assertEqual(recorder.queries[0].call_site, 'unknown')
+        self.assertEqual(recorder.summary()['duplicates'], 1)
+
+    def test_recorder_detects_n_plus_one(self):
+        with QueryRecorder().record() as recorder:
+            for _ in range(5):
+                for product_criteria in ProductCriteria.objects.all():
+                    product_criteria.customer_lead
+
+        n_plus_one = recorder.summary()['n_plus_one']
+        self.assertTrue(any('booking_customerlead' in entry['sql'] for entry in n_plus_one))
+
+    def test_webflow_to_typeform_redirect(self):
+        url_params = {'power_type': 'gas', 'bathroom_coverage': '1', 'tank_type': 'tank'}
+
+        with self.assertQueryBudget('webflow_to_typeform_redirect'):
+            response = self.client.get(f'/api/booking/webflow/?{urlencode(url_params)}')
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_selected_product_list(self):
+        with self.assertQueryBudget('selected_product_list'):
+            response = self.client.get(
+                f'/api/booking/product/selected/{self.customer_lead.url_token}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_select_product(self):
+        post_data = {
+            'url_token': self.customer_lead.url_token,
+            'product_catalog_id': self.product_catalog.id,
+        }
+
+        with self.assertQueryBudget('select_product'):
+            response = self.client.post('/api/booking/select_product/', post_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_update_product_criteria(self):
+        post_data = ProductCriteriaSerializer(self.product_criteria).data
+
+        with self.assertQueryBudget('update_product_criteria'):
+            response = self.client.post(
+                '/api/booking/update_product_criteria/', post_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_typeform_webhook(self):
+        typeform_response_data = TypeformResponseDataFactory.create(
+            form_response__form_id="A",
+            form_response__token="B")
+        customer_lead = CustomerLeadFactory.create(
+            url_token=typeform_response_data['form_response']['hidden']['url_token'])
+        ProductCriteriaFactory.create(customer_lead=customer_lead)
+
+        with self.assertQueryBudget('typeform_webhook'):
+            response = self.client.post('/api/booking/typeform/', typeform_response_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_fetch_calendly_data(self):
+        with self.assertQueryBudget('fetch_calendly_data'):
+            response = self.post_calendly_data()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_get_customer_from_calendly_invitee(self):
+        self.post_calendly_data()
+        self.customer_lead.refresh_from_db()
+
+        with self.assertQueryBudget('get_customer_from_calendly_invitee'):
+            response = self.client.get(
+                f'/api/booking/calendly_invitee/{self.customer_lead.calendly_invitee.uuid}')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_handle_reschedule_calendly_data(self):
+        self.post_calendly_data()
+
+        with responses.RequestsMock(assert_all_requests_are_fired=False) as mocked, self.assertQueryBudget('handle_reschedule_calendly_data'):
+            mocked.post(re.compile('https://api.calendly.com/scheduled_events/'), json={})
+            response = self.client.post('/api/booking/calendly/reschedule/', {
+                'url_token': self.customer_lead.url_token,
+            }, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_customer_order(self):
+        post_data = SubmitBookingFormFactory.create(
+            selected_product=SelectedProductSerializer(SelectedProductFactory.create()).data)
+
+        with self.assertQueryBudget('customer_order'):
+            response = self.client.post('/api/booking/customer_order/', post_data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -1,8 +1,13 @@
 from typing import Tuple
-from urllib.parse import urlencode
+from urllib.parse import parse_qs, urlencode, urlparse
+from django.test import override_settings
+from django.urls import resolve, reverse
 from httplib2 import Response
+from rest_framework import status
 from rest_framework.test import APITransactionTestCase
 from booking.models import CustomerLead, ProductCriteria
+from booking.tests.factories import TypeformResponseDataFactory
+from booking.tokens import get_or_create_lead, read_lead_token
 from booking.views import TANK_TYPEFORM_ID, TANKLESS_TYPEFORM_ID
 
 # Sample API post data from Webflow, before Typeform:
@@ -66,3 +71,56 @@ class CustomerUrlTokenTests(APITransactionTestCase):
         self.assertEqual(product_criteria.tank_type, "tankless")
         customer_lead = CustomerLead.objects.first()
         self.assertEqual(product_criteria.customer_lead.id, customer_lead.id)
+
+
+@override_settings(SIGNED_LEAD_TOKENS=True)
+class SignedLeadTokenTests(APITransactionTestCase):
+    def redirect(self, tank_type="tank"):
+        url_params = {
+            "power_type": "gas",
+            "bathroom_coverage": "1",
+            "tank_type": tank_type,
+        }
+        response = self.client.get(
+            f'/api/booking/webflow/?{urlencode(url_params)}', follow=False)
+        return parse_qs(urlparse(response['Location']).query)['url_token'][0]
+
+    def test_redirect_does_not_write(self):
+        url_token = self.redirect()
+
+        self.assertEqual(CustomerLead.objects.count(), 0)
+        self.assertEqual(ProductCriteria.objects.count(), 0)
+        self.assertEqual(read_lead_token(url_token)['tank_type'], "tank")
+        self.assertNotEqual(url_token, self.redirect())
+
+    def test_first_webhook_creates_lead(self):
+        url_token = self.redirect(tank_type="tank")
+        typeform_response_data = TypeformResponseDataFactory.create(
+            form_response__hidden={"url_token": url_token})
+
+        response = self.client.post(
+            "/api/booking/typeform/", typeform_response_data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        customer_lead = CustomerLead.objects.get(url_token=url_token)
+        product_criteria = ProductCriteria.objects.get(customer_lead=customer_lead)
+        self.assertEqual(product_criteria.tank_type, "tank")
+
+    def test_product_selection_url_accepts_signed_tokens(self):
+        url_token = self.redirect(tank_type="tank")
+        self.client.post("/api/booking/typeform/", TypeformResponseDataFactory.create(
+            form_response__hidden={"url_token": url_token}), format="json")
+
+        url = reverse("selected_product_list", args=[url_token])
+        self.assertEqual(resolve(url).kwargs["url_token"], url_token)
+
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["product_criteria"]["tank_type"], "tank")
+
+    def test_tampered_token_is_rejected(self):
+        url_token = self.redirect()
+
+        self.assertIsNone(get_or_create_lead(url_token + "x"))
+        self.assertEqual(CustomerLead.objects.count(), 0)
@@ -0,0 +1,52 @@
+import base64
+import uuid
+from typing import Optional
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+
+from booking.models import CustomerLead, ProductCriteria
+
+LEAD_TOKEN_SALT = 'booking.lead_token'
+
+
+def make_lead_token(tank_type: str) -> str:
+    """ HMAC signed url_token carrying the Webflow tank type, so the
+        redirect doesn't have to create the CustomerLead. The nonce keeps
+        tokens unique per click. The signed value is base64url encoded so
+        the token stays a slug, it is part of the product selection URL.
+    """
+    signed = signing.dumps({
+        'tank_type': tank_type,
+        'nonce': uuid.uuid4().hex[:12],
+    }, salt=LEAD_TOKEN_SALT, compress=True)
+    return base64.urlsafe_b64encode(signed.encode()).decode().rstrip('=')
+
+
+def read_lead_token(url_token: str) -> Optional[dict]:
+    try:
+        signed = base64.urlsafe_b64decode(url_token + '=' * (-len(url_token) % 4)).decode()
+        return signing.loads(signed, salt=LEAD_TOKEN_SALT, max_age=settings.LEAD_TOKEN_MAX_AGE)
+    except (ValueError, signing.BadSignature):
+        return None
+
+
+def get_or_create_lead(url_token: str) -> Optional[CustomerLead]:
+    """ CustomerLead for the url_token, created with its ProductCriteria the
+        first time a valid signed token is seen.
+    """
+    customer_lead = CustomerLead.get_customer_with_url_token(url_token)
+    if customer_lead is not None or not url_token:
+        return customer_lead
+
+    lead_token = read_lead_token(url_token)
+    if lead_token is None:
+        return None
+
+    with transaction.atomic():
+        customer_lead, created = CustomerLead.objects.get_or_create(url_token=url_token)
+        if created:
+            ProductCriteria.objects.create(
+                customer_lead=customer_lead, tank_type=lead_token['tank_type'])
+    return customer_lead
@@ -0,0 +1,138 @@
+import logging
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from booking.models import ProductCriteria, TypeformDelivery
+from booking.serializers import ProductCriteriaSerializer, TypeformSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def apply_typeform_response(form_response: dict) -> ProductCriteriaSerializer:
+    """ Store the TypeformResponse and map its variables onto the lead's
+        ProductCriteria.
+
+    Raises:
+        ValidationError: the form response or the mapped criteria are invalid
+    """
+    serializer = TypeformSerializer(data=form_response)
+    serializer.is_valid(raise_exception=True)
+
+    typeform_response = serializer.save()
+
+    product_criteria_data = serializer.map_variables(
+        serializer.validated_data.get('variables'))
+
+    customer_lead_id = serializer.map_hidden(
+        serializer.validated_data.get('hidden'))
+    product_criteria_data['customer_lead'] = customer_lead_id
+    product_criteria = ProductCriteria.objects.get(
+        customer_lead=customer_lead_id)
+
+    product_criteria_data['typeform_response'] = typeform_response.id
+    product_criteria_serializer = ProductCriteriaSerializer(
+        instance=product_criteria,
+        data=product_criteria_data)
+    product_criteria_serializer.is_valid(raise_exception=True)
+    product_criteria_serializer.save()
+
+    return product_criteria_serializer
+
+
+def store_typeform_delivery(form_response: dict) -> None:
+    """ Keep the raw payload once per Typeform token, redeliveries of the
+        same response are dropped by the unique token.
+    """
+    url_token = (form_response.get('hidden') or {}).get('url_token') or ''
+    TypeformDelivery.objects.bulk_create([
+        TypeformDelivery(token=form_response['token'], url_token=url_token, payload=form_response),
+    ], ignore_conflicts=True)
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(settings.TYPEFORM_RETRY_BASE_DELAY * 2 ** (attempts - 1),
+                                 settings.TYPEFORM_RETRY_MAX_DELAY))
+
+
+def process_next_typeform_delivery() -> Optional[str]:
+    """ Apply the oldest due TypeformDelivery that no earlier pending
+        delivery of the same lead is waiting in front of, and mark it, in
+        one transaction.
+
+    Returns:
+        the new status, Pending when it will be retried, or None when
+        nothing is due
+    """
+    Status = TypeformDelivery.Status
+    now = timezone.now()
+    earlier = TypeformDelivery.objects.filter(
+        status=Status.Pending, url_token=OuterRef('url_token'), id__lt=OuterRef('id'))
+
+    with transaction.atomic():
+        delivery = (
+            TypeformDelivery.objects
+            .select_for_update(skip_locked=True)
+            .filter(status=Status.Pending, next_attempt_at__lte=now)
+            .filter(Q(url_token='') | ~Exists(earlier))
+            .order_by('id')
+            .first()
+        )
+        if delivery is None:
+            return None
+
+        delivery.attempts += 1
+        try:
+            with transaction.atomic():
+                apply_typeform_response(delivery.payload)
+            delivery.status = Status.Processed
+            delivery.processed_at = timezone.now()
+        except (ValidationError, ObjectDoesNotExist) as error:
+            delivery.status = Status.Failed
+            delivery.last_error = str(error)
+            logger.error(f'Typeform delivery {delivery.token} failed: {error}')
+        except Exception as error:
+            delivery.last_error = str(error)
+            if delivery.attempts >= settings.TYPEFORM_MAX_ATTEMPTS:
+                delivery.status = Status.Failed
+                logger.exception(f'Typeform delivery {delivery.token} failed.')
+            else:
+                delivery.next_attempt_at = now + get_retry_delay(delivery.attempts)
+                logger.warning(f'Typeform delivery {delivery.token} will be retried: {error}')
+
+        delivery.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'processed_at'])
+    return delivery.status
+
+
+def process_typeform_deliveries(batch_size=50) -> Tuple[int, int]:
+    """ Apply up to `batch_size` pending TypeformDeliveries, each in its
+        own transaction that also marks it, so a crash re-runs at most the
+        delivery in progress (at least once).
+
+        Deliveries of one lead are applied in the order they were
+        received, those of different leads independently, and rows are
+        locked with SKIP LOCKED so several workers can run side by side.
+        Invalid payloads are marked as failed right away. Other errors are
+        retried with exponential backoff, holding back only the later
+        deliveries of the same lead, until TYPEFORM_MAX_ATTEMPTS.
+
+    Returns:
+        (processed, failed): number of deliveries applied and given up on
+    """
+    processed = failed = 0
+    for _ in range(batch_size):
+        result = process_next_typeform_delivery()
+        if result is None:
+            break
+        if result == TypeformDelivery.Status.Processed:
+            processed += 1
+        elif result == TypeformDelivery.Status.Failed:
+            failed += 1
+
+    return processed, failed
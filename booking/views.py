@@ -1,14 +1,25 @@
-from typing import List
+import hashlib
+import json
+from typing import List, Optional, Tuple
 from urllib.parse import urlencode, urlparse
-from django.http import HttpResponseRedirect, HttpRequest
+from django.http import HttpResponse, HttpResponseRedirect, HttpRequest
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import redirect
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.decorators import api_view
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from app.models import Customer, Job, JobNote
-from booking.serializers import CalendlyEventSerializer, CalendlyInviteeSerializer, CustomerLeadSerializer, ProductCatalogSerializer, TypeformSerializer, ProductCriteriaSerializer
-from booking.models import CalendlyEvent, CalendlyInvitee, Order, ProductCatalog, ProductCriteria, CustomerLead, SelectedProduct
+from app.helper.history import buffered_history
+from app.models import Appointment, Customer, Job, JobNote
+from booking.serializers import CalendlyEventSerializer, CalendlyInviteeSerializer, CustomerLeadSerializer, ProductCriteriaSerializer
+from booking.models import CalendlyEvent, CalendlyInvitee, Order, OrderSubmission, ProductCatalog, ProductCriteria, CustomerLead, SelectedProduct
+from booking.catalog import product_selection_cache
 from booking.client import CalendlyClient
+from booking.tokens import make_lead_token
+from booking.typeform import apply_typeform_response, store_typeform_delivery
 from pro.serializers import AppointmentSerializer, CustomerAddressSerializer, CustomerSerializer, AddressSerializer, JobAddressSerializer
 from config.settings import TANK_TYPEFORM_ID, TANKLESS_TYPEFORM_ID
 
@@ -30,13 +41,22 @@ def webflow_to_typeform_redirect(request: HttpRequest) -> HttpResponseRedirect:
         form_id = TANK_TYPEFORM_ID if tank_type == 'tank' else TANKLESS_TYPEFORM_ID
         redirect_base_url = f'https://form.typeform.com/to/{form_id}'
 
-        customer_lead = CustomerLead.objects.create()
-        ProductCriteria.objects.create(
-            customer_lead=customer_lead, tank_type=tank_type)
+        power_type = request.GET.get('power_type')
+        bathroom_coverage = request.GET.get('bathroom_coverage')
+
+        if settings.SIGNED_LEAD_TOKENS:
+            # The lead is created by the first Typeform webhook carrying the token
+            url_token = make_lead_token(tank_type)
+        else:
+            customer_lead = CustomerLead.objects.create()
+            ProductCriteria.objects.create(
+                customer_lead=customer_lead, tank_type=tank_type)
+            url_token = customer_lead.url_token
+
         url_params = {
-            'power_type': request.GET.get('power_type'),
-            'bathroom_coverage': request.GET.get('bathroom_coverage'),
-            'url_token': customer_lead.url_token,
+            'power_type': power_type,
+            'bathroom_coverage': bathroom_coverage,
+            'url_token': url_token,
         }
         redirect_url = f'{redirect_base_url}?{urlencode(url_params)}'
         return redirect(redirect_url)
@@ -47,6 +67,8 @@ def typeform_webhook(request: HttpRequest):
     """ Serialize and store customer's Typeform Response.
         First validate form response data, then store TypeformResponse.
         Lastly validate ProductCriteria data, and store ProductCriteria.
+        With TYPEFORM_DEFERRED, only the raw payload is stored here and
+        the rest is done by `manage.py process_typeform_deliveries`.
 
     Args:
         request (HttpRequest): POST request from Typeform webhook
@@ -55,31 +77,19 @@ def typeform_webhook(request: HttpRequest):
         redirect: redirection to external url with params
     """
     if request.method == 'POST':
-        serializer = TypeformSerializer(data=request.data['form_response'])
-
-        if not serializer.is_valid():
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-        typeform_response = serializer.save()
-
-        product_criteria_data = serializer.map_variables(
-            serializer.validated_data.get('variables'))
-
-        customer_lead_id = serializer.map_hidden(
-            serializer.validated_data.get('hidden'))
-        product_criteria_data['customer_lead'] = customer_lead_id
-        product_criteria = ProductCriteria.objects.get(
-            customer_lead=customer_lead_id)
-
-        product_criteria_data['typeform_response'] = typeform_response.id
-        product_criteria_serializer = ProductCriteriaSerializer(
-            instance=product_criteria,
-            data=product_criteria_data)
+        form_response = request.data.get('form_response') or {}
 
-        if not product_criteria_serializer.is_valid():
-            return Response(product_criteria_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if settings.TYPEFORM_DEFERRED:
+            # Answer before Typeform's timeout, redeliveries are deduplicated by token
+            if not form_response.get('token'):
+                return Response({'token': ['This field is required.']}, status=status.HTTP_400_BAD_REQUEST)
+            store_typeform_delivery(form_response)
+            return Response(status=status.HTTP_202_ACCEPTED)
 
-        product_criteria_serializer.save()
+        try:
+            product_criteria_serializer = apply_typeform_response(form_response)
+        except ValidationError as error:
+            return Response(error.detail, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(product_criteria_serializer.data, status=status.HTTP_201_CREATED)
 
@@ -106,15 +116,18 @@ def selected_product_list(request: HttpRequest, url_token: str) -> List[ProductC
     if product_criteria == None:
         return Response("Product Criteria Doesn't Exist", status=status.HTTP_400_BAD_REQUEST)
 
-    product_catalog_query_set = ProductCatalog.get_products_from_criteria(
-        product_criteria)
+    # product_catalog only depends on the criteria and the catalog version,
+    # so it is served pre-rendered and spliced next to the per-lead criteria
+    product_catalog_json = product_selection_cache.get(product_criteria)
 
-    product_catalog_data = ProductCatalogSerializer(
-        product_catalog_query_set, many=True).data
+    product_criteria_json = JSONRenderer().render(
+        ProductCriteriaSerializer(product_criteria).data)
 
-    product_criteria_data = ProductCriteriaSerializer(product_criteria).data
+    content = b''.join([
+        b'{"product_catalog":', product_catalog_json,
+        b',"product_criteria":', product_criteria_json, b'}'])
 
-    return Response({"product_catalog": product_catalog_data, "product_criteria": product_criteria_data}, status=status.HTTP_200_OK)
+    return HttpResponse(content, content_type='application/json', status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -176,9 +189,7 @@ def fetch_calendly_data(request: HttpRequest) -> Response:
     Returns:
         Response: id of updated ProductCriteria and status
     """
-    def fetch_and_save_event(event_url, client) -> CalendlyEvent:
-        scheduled_event_data = client.get(url=event_url)
-
+    def save_event(scheduled_event_data) -> CalendlyEvent:
         scheduled_event_serializer = CalendlyEventSerializer(
             data=scheduled_event_data.get('resource'))
         if (not scheduled_event_serializer.is_valid()):
@@ -186,9 +197,7 @@ def fetch_calendly_data(request: HttpRequest) -> Response:
 
         return scheduled_event_serializer.save()
 
-    def fetch_and_save_invitee(invitee_url, client, calendly_event) -> CalendlyInvitee:
-        calendly_invitee_data = client.get(url=invitee_url)
-
+    def save_invitee(calendly_invitee_data, calendly_event) -> CalendlyInvitee:
         calendly_invitee = calendly_invitee_data.get('resource')
         calendly_invitee['uuid'] = urlparse(
             calendly_invitee.get('uri')).path.split('/')[-1]
@@ -233,11 +242,14 @@ def fetch_calendly_data(request: HttpRequest) -> Response:
 
     calendly_client = CalendlyClient()
 
-    calendly_event = fetch_and_save_event(
-        event_url=event_url, client=calendly_client)
+    # The event and the invitee are independent, fetch them in one round trip
+    scheduled_event_data, calendly_invitee_data = calendly_client.get_many(
+        [event_url, invitee_url])
 
-    calendly_invitee = fetch_and_save_invitee(
-        invitee_url=invitee_url, client=calendly_client, calendly_event=calendly_event)
+    calendly_event = save_event(scheduled_event_data)
+
+    calendly_invitee = save_invitee(
+        calendly_invitee_data, calendly_event=calendly_event)
 
     customer_lead = create_customer_lead_from_calendly_invitee(
         calendly_invitee=calendly_invitee, url_token=url_token)
@@ -255,6 +267,7 @@ def handle_reschedule_calendly_data(request: HttpRequest) -> Response:
             return
         cancel_url = customer_lead.calendly_invitee.event.uri + "/cancellation"
         scheduled_event_data = client.post(url=cancel_url)
+        client.invalidate(customer_lead.calendly_invitee.event.uri)
         CustomerLead.reset_calendly_invitee(url_token)
         CalendlyInvitee.remove_old_calendly_invitee(
             customer_lead.calendly_invitee.id)
@@ -286,17 +299,44 @@ def get_customer_from_calendly_invitee(request: HttpRequest, invitee_uuid: str)
     return Response(CustomerSerializer(customer).data, status=status.HTTP_200_OK)
 
 
+def get_idempotency_key(request: HttpRequest) -> Tuple[str, Optional[int]]:
+    """ Idempotency-Key header or `idempotency_key` field. Without one, the
+        payload itself is the key, so a double click or a retry of the
+        same form counts as one submission, but only for
+        ORDER_REPLAY_WINDOW seconds: the same form sent later is a new order.
+
+    Returns:
+        (key, seconds a replay is accepted for, None for no limit)
+    """
+    key = request.headers.get('Idempotency-Key') or request.data.get('idempotency_key')
+    replay_window = None
+    if not key:
+        key = json.dumps(request.data, sort_keys=True, default=str)
+        replay_window = settings.ORDER_REPLAY_WINDOW
+    return hashlib.sha256(str(key).encode('utf-8')).hexdigest(), replay_window
+
+
 @api_view(['POST'])
 def submit_customer_order(request: HttpRequest) -> Response:
     """ Endpoint to submit the customer order.
         Used on Summary page.
 
+        Everything is validated before the first write and written in one
+        transaction. The order is stored by idempotency key, replays return
+        it without writing again.
+
     Args:
         request (HttpRequest): request triggered by Summary page load
 
     Returns:
         Response: Confirmation of update and status
     """
+    idempotency_key, replay_window = get_idempotency_key(request)
+    submission = OrderSubmission.objects.filter(
+        idempotency_key=idempotency_key, order__isnull=False).first()
+    if submission is not None and submission.is_replay(replay_window):
+        return Response(submission.order_id, status=status.HTTP_200_OK)
+
     customer_data = request.data.get('customer')
     appointment_data = request.data.get('appointment')
     selected_product_data = request.data.get('selected_product')
@@ -313,8 +353,6 @@ def submit_customer_order(request: HttpRequest) -> Response:
     if not customer_address_serializer.is_valid():
         return Response(customer_address_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    customer_address = customer_address_serializer.save()
-
     try:
         customer = Customer.objects.get(pk=customer_data.get('id'))
         customer_serializer = CustomerSerializer(customer, data=customer_data)
@@ -324,45 +362,53 @@ def submit_customer_order(request: HttpRequest) -> Response:
     if not customer_serializer.is_valid():
         return Response(customer_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    customer_serializer.validated_data['address'] = customer_address
-    customer = customer_serializer.save()
-
     appointment_serializer = AppointmentSerializer(data=appointment_data)
     if not appointment_serializer.is_valid():
         return Response(appointment_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    appointment = appointment_serializer.save()
-
     job_address_serializer = JobAddressSerializer(data=address_data)
     if not job_address_serializer.is_valid():
         return Response(job_address_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    job_address = job_address_serializer.save()
-
-    job, job_created = Job.objects.update_or_create(
-        customer=customer,
-        appointment=appointment,
-        defaults={
-            'address': job_address
-        }
-    )
+    selected_product = SelectedProduct.objects.get(
+        pk=selected_product_data.get('id'))
 
-    if customer_data.get('gate_code') != "":
-        job_note_text = f"GATE CODE: {customer_data.get('gate_code')}"
-        JobNote.objects.create(
-            job=job,
-            note=job_note_text
+    with transaction.atomic(), buffered_history():
+        # A concurrent duplicate blocks on the unique key until the first
+        # submission commits, then replays its order
+        submission, created = OrderSubmission.objects.select_for_update().get_or_create(
+            idempotency_key=idempotency_key)
+        if submission.is_replay(replay_window):
+            return Response(submission.order_id, status=status.HTTP_200_OK)
+        # Past its replay window, the submission is taken over by this one
+        submission.created_at = timezone.now()
+
+        customer_serializer.validated_data['address'] = customer_address_serializer.save()
+        customer = customer_serializer.save()
+
+        appointment = Appointment.objects.create(**appointment_serializer.validated_data)
+
+        job = Job.objects.create(
+            customer=customer,
+            appointment=appointment,
+            address=job_address_serializer.save(),
         )
 
-    selected_product = SelectedProduct.objects.get(
-        pk=selected_product_data.get('id'))
+        if customer_data.get('gate_code') != "":
+            JobNote.objects.create(
+                job=job,
+                note=f"GATE CODE: {customer_data.get('gate_code')}",
+            )
+
+        order, order_created = Order.objects.update_or_create(
+            customer=customer,
+            defaults={
+                'appointment': appointment,
+                'selected_product': selected_product
+            }
+        )
 
-    order, order_created = Order.objects.update_or_create(
-        customer=customer,
-        defaults={
-            'appointment': appointment,
-            'selected_product': selected_product
-        }
-    )
+        submission.order = order
+        submission.save(update_fields=['order', 'created_at'])
 
     return Response(order.id, status=status.HTTP_200_OK)
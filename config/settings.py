@@ -79,6 +79,9 @@ else:
     GS_CREDENTIALS = service_account.Credentials.from_service_account_file(
         GS_CREDENTIALS_PATH
     )
+    # Resumable uploads to GCS in 4 MB chunks instead of reading the whole
+    # file into memory for a single request, a multiple of 256 KB
+    GS_BLOB_CHUNK_SIZE = 4 * 1024 * 1024
 
     # Google Cloud Storage For Product Image
     GCS_PRODUCT_IMAGE = env("GCS_PRODUCT_IMAGE_PATH")
@@ -124,6 +127,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     # "request_logging.middleware.LoggingMiddleware",
+    "backend.db.queries.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -246,6 +250,29 @@ if os.getenv("USE_CLOUD_SQL_AUTH_PROXY", None):
     DATABASES["default"]["HOST"] = "127.0.0.1"
     DATABASES["default"]["PORT"] = 5432
 
+# Database connection reuse:
+# "persistent" keeps one connection per thread for DB_CONN_MAX_AGE seconds,
+# "pooled" shares a pool of connections across threads (use it under ASGI,
+# where sync views don't run on long lived threads) and "none" connects per
+# request. Idle persistent connections are pinged after
+# DB_HEALTH_CHECK_INTERVAL seconds before being reused.
+DB_CONNECTION_MODE = env("DB_CONNECTION_MODE", default="persistent")
+DB_HEALTH_CHECK_INTERVAL = env.int("DB_HEALTH_CHECK_INTERVAL", default=30)
+
+if DB_CONNECTION_MODE == "pooled" and "test" not in sys.argv:
+    # Idle pooled connections would keep the test database from being dropped
+    DATABASES["default"]["ENGINE"] = "backend.db"
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["POOL"] = {
+        "MAX_SIZE": env.int("DB_POOL_MAX_SIZE", default=10),
+        "TIMEOUT": env.int("DB_POOL_TIMEOUT", default=10),
+        "HEALTH_CHECK_INTERVAL": DB_HEALTH_CHECK_INTERVAL,
+    }
+elif DB_CONNECTION_MODE == "persistent":
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+
 
 # if is_in_cloud_rn:
 #     CACHES = {
@@ -269,6 +296,22 @@ if os.getenv("USE_CLOUD_SQL_AUTH_PROXY", None):
 #     }
 
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Use "django.core.cache.backends.db.DatabaseCache" to share it across
+    # instances, after `manage.py createcachetable`
+    "calendly": {
+        "BACKEND": env("CALENDLY_CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": "calendly_cache",
+        "OPTIONS": {
+            "MAX_ENTRIES": 2000,
+        },
+    },
+}
+
+
 # SESSION_ENGINE = "django.contrib.sessions.backends.cache"
 # SESSION_CACHE_ALIAS = "default"
 
@@ -423,6 +466,25 @@ G_PRODUCT_CATALOG_SHEET_ID = "1nfCT-xEXJYAc8wXecUIcqRhC4UM50J1AIK3_jLphZWg"
 
 # Google Storage
 GCP_BASE_URL = env("REACT_APP_GCS_BASE_URL")
+# Photos annotated on each job of the job lists (Job.with_summaries)
+JOB_LIST_PHOTO_COUNT = 3
+# Longest side in pixels of the resized copies of JobPhoto/CustomerPhoto
+PHOTO_VARIANTS = {"thumb": 150, "medium": 1024}
+PHOTO_VARIANT_FORMATS = ["webp", "jpeg"]
+PHOTO_VARIANT_QUALITY = 80
+PHOTO_VARIANT_MAX_ATTEMPTS = 5
+# Seconds a generate_photo_variants worker holds the photos it claimed for
+PHOTO_VARIANT_LEASE = env.int("PHOTO_VARIANT_LEASE", default=10 * 60)
+
+# History
+# Skip historical records for saves that change no tracked field
+HISTORY_DIFF = env.bool("HISTORY_DIFF", default=False)
+# Months of history kept by archive_history, older rows go to HISTORY_ARCHIVE_DIR
+HISTORY_RETENTION_MONTHS = env.int("HISTORY_RETENTION_MONTHS", default=24)
+HISTORY_ARCHIVE_DIR = env("HISTORY_ARCHIVE_DIR", default=os.path.join(BASE_DIR, "history_archive"))
+# History tables partitioned by month with partition_history
+HISTORY_PARTITIONED_MODELS = ["app.Address", "app.Customer", "app.Job", "booking.Order",
+                              "booking.ProductCriteria", "booking.SelectedProduct"]
 
 # Sendgrid
 EMAIL_BACKEND = "sgbackend.SendGridBackend"
@@ -431,10 +493,28 @@ DEFAULT_FROM_EMAIL = "no-reply@homebreeze.com"
 DEFAULT_FROM_DOMAIN = "HomeBreeze.com"
 
 MAX_UPLOAD_SIZE = 50242880
-DATA_UPLOAD_MAX_MEMORY_SIZE = 50242880
+# Request bodies other than files, uploaded files are spooled to disk by
+# StreamingUploadHandler and checked against MAX_UPLOAD_SIZE as they stream
+DATA_UPLOAD_MAX_MEMORY_SIZE = env.int("DATA_UPLOAD_MAX_MEMORY_SIZE", default=2621440)
+FILE_UPLOAD_HANDLERS = ["app.helper.uploads.StreamingUploadHandler"]
+# Resumable uploads (app.views.UploadSessionListView)
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_SESSION_MAX_AGE = timedelta(days=2)
+# Time a completion holds its session for while the parts are joined and stored
+UPLOAD_COMPLETE_LEASE = timedelta(minutes=10)
 
 # Calendly
 CALENDLY_API_KEY = env("CALENDLY_API_KEY")
+CALENDLY_CONNECT_TIMEOUT = env.float("CALENDLY_CONNECT_TIMEOUT", default=3.05)
+CALENDLY_READ_TIMEOUT = env.float("CALENDLY_READ_TIMEOUT", default=10)
+CALENDLY_RETRIES = env.int("CALENDLY_RETRIES", default=2)
+CALENDLY_POOL_SIZE = env.int("CALENDLY_POOL_SIZE", default=10)
+# Cache alias for fetched Calendly resources, "calendly" is local memory unless
+# CALENDLY_CACHE_BACKEND points it at the database cache table
+CALENDLY_CACHE = "calendly"
+CALENDLY_CACHE_TTL = env.int("CALENDLY_CACHE_TTL", default=300)
+CALENDLY_NEGATIVE_CACHE_TTL = env.int("CALENDLY_NEGATIVE_CACHE_TTL", default=30)
 
 # Twilio
 TWILIO_ACCOUNT_SID = env("TWILIO_ACCOUNT_SID")
@@ -443,16 +523,75 @@ TWILIO_ACCOUNT_NUMBER = env("TWILIO_ACCOUNT_NUMBER")
 
 # Segment
 SEGMENT_WRITE_KEY = env("REACT_APP_SEGMENT_WRITE_KEY")
+# Coalesce Customer identify calls and send them from a background thread.
+# Pending identifies only live in process memory and are lost when an
+# instance shuts down, so this stays opt-in.
+SEGMENT_IDENTIFY_PIPELINE = env.bool("SEGMENT_IDENTIFY_PIPELINE", default=False)
+SEGMENT_IDENTIFY_WINDOW = env.float("SEGMENT_IDENTIFY_WINDOW", default=5)
+SEGMENT_IDENTIFY_BATCH_SIZE = 100
+SEGMENT_IDENTIFY_MAX_PENDING = 10000
 
 # Slack Notification
 # SLACK_TOKEN = env("SLACK_TOKEN")
 # SLACK_CHANNEL = "#boom"
 SLACK_CUSTOMER_AND_JOBS_WEBHOOK = env("SLACK_CUSTOMER_AND_JOBS_WEBHOOK")
 SLACK_BOOM = env("SLACK_BOOM")
+# Queue messages in the SlackMessage outbox, delivered by `manage.py send_slack_messages`
+SLACK_OUTBOX = env.bool("SLACK_OUTBOX", default=True)
+SLACK_TIMEOUT = env.float("SLACK_TIMEOUT", default=5)
+SLACK_MAX_ATTEMPTS = env.int("SLACK_MAX_ATTEMPTS", default=8)
+# Seconds a worker holds claimed messages for, longer than a batch of posts
+SLACK_LEASE = env.int("SLACK_LEASE", default=5 * 60)
+SLACK_RETRY_BASE_DELAY = 30
+SLACK_RETRY_MAX_DELAY = 60 * 60
+
+# Product Selection
+# Serve get_products_from_criteria from the in-process match index instead of SQL
+PRODUCT_MATCH_INDEX = env.bool("PRODUCT_MATCH_INDEX", default=True)
+# Seconds between checks of the shared catalog version bumped by imports and admin edits
+PRODUCT_CATALOG_VERSION_TTL = env.int("PRODUCT_CATALOG_VERSION_TTL", default=10)
+# Max rendered product_catalog fragments kept per process (LRU)
+PRODUCT_SELECTION_CACHE_SIZE = env.int("PRODUCT_SELECTION_CACHE_SIZE", default=2048)
+
+# Query budgets per URL name, checked by QueryBudgetMiddleware.
+# Over budget requests are logged, and raise QueryBudgetExceeded under tests
+# for the URL names listed here.
+# None means no limit; n_plus_one is the number of statements allowed to
+# repeat QUERY_N_PLUS_ONE_THRESHOLD times from the same call site.
+QUERY_BUDGET_ENABLED = env.bool("QUERY_BUDGET_ENABLED", default=True)
+QUERY_BUDGET_RAISE = "test" in sys.argv
+QUERY_N_PLUS_ONE_THRESHOLD = env.int("QUERY_N_PLUS_ONE_THRESHOLD", default=5)
+# Record the project line and parameters of each query, walks the stack on every query
+QUERY_CALL_SITES = env.bool("QUERY_CALL_SITES", default=DEBUG or QUERY_BUDGET_RAISE)
+QUERY_BUDGET_DEFAULT = {"queries": 100, "duplicates": None, "n_plus_one": None}
+QUERY_BUDGETS = {
+    "webflow_to_typeform_redirect": {"queries": 10, "duplicates": 0, "n_plus_one": 0},
+    "typeform_webhook": {"queries": 20, "duplicates": 2, "n_plus_one": 0},
+    "fetch_calendly_data": {"queries": 30, "duplicates": 4, "n_plus_one": 0},
+    "handle_reschedule_calendly_data": {"queries": 30, "duplicates": 4, "n_plus_one": 0},
+    "get_customer_from_calendly_invitee": {"queries": 10, "duplicates": 0, "n_plus_one": 0},
+    "selected_product_list": {"queries": 6, "duplicates": 0, "n_plus_one": 0},
+    "select_product": {"queries": 12, "duplicates": 1, "n_plus_one": 0},
+    "update_product_criteria": {"queries": 12, "duplicates": 1, "n_plus_one": 0},
+    "customer_order": {"queries": 50, "duplicates": 4, "n_plus_one": 0},
+}
 
 # Typeform
 TANK_TYPEFORM_ID = env("TANK_TYPEFORM_ID")
 TANKLESS_TYPEFORM_ID = env("TANKLESS_TYPEFORM_ID")
+# Store webhook payloads as TypeformDelivery rows and answer right away,
+# they are applied by `manage.py process_typeform_deliveries`
+TYPEFORM_DEFERRED = env.bool("TYPEFORM_DEFERRED", default=False)
+TYPEFORM_MAX_ATTEMPTS = env.int("TYPEFORM_MAX_ATTEMPTS", default=5)
+TYPEFORM_RETRY_BASE_DELAY = 30
+TYPEFORM_RETRY_MAX_DELAY = 60 * 60
+# Redirect from Webflow with a signed url_token instead of creating the
+# CustomerLead up front, the lead is created by the first Typeform webhook
+SIGNED_LEAD_TOKENS = env.bool("SIGNED_LEAD_TOKENS", default=False)
+LEAD_TOKEN_MAX_AGE = env.int("LEAD_TOKEN_MAX_AGE", default=60 * 60 * 24 * 30)
+# Seconds an order submitted without an Idempotency-Key is replayed for
+# identical payloads, a double click or retry, instead of creating another
+ORDER_REPLAY_WINDOW = env.int("ORDER_REPLAY_WINDOW", default=60 * 5)
 
 ADMIN_URL = env("ADMIN_URL")
 
@@ -1,3 +1,3 @@
-from django.contrib.auth.models import Group
+from accounts.models import bootstrap_pro_group
 
-pro_group, created = Group.objects.get_or_create(name='pro')
\ No newline at end of file
+bootstrap_pro_group()
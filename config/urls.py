@@ -27,6 +27,7 @@ urlpatterns = [
     path('', RedirectView.as_view(url='app/sadmin/')),
     path("app/sadmin/", admin.site.urls, name="admin"),
     path("api/booking/", include("booking.urls")),
+    path("api/", include("app.urls")),
     path('api/pro/', include(pro_urls)),
     path("", include(core_urls)),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)